@@ -24,7 +24,7 @@ from numpy import (
 # https://numpy.org/devdocs/reference/arrays.scalars.html#numpy.clongdouble
 from numpy import clongdouble as complex256
 import numpy as np
-from pint import UnitRegistry
+from pint import UnitRegistry, set_application_registry
 
 from ._version import get_versions
 
@@ -88,6 +88,9 @@ __version__ = get_versions()['version']
 ureg = UnitRegistry() # pylint: disable=invalid-name
 """Single Pint unit registry that should be used by all PISA code"""
 
+# Quantities are unpickled with the application registry, make sure that is ours
+set_application_registry(ureg)
+
 Q_ = ureg.Quantity # pylint: disable=invalid-name
 """Shortcut for Quantity that uses central PISA Pint unit regeistry"""
 
@@ -297,4 +300,4 @@ sys.stderr.write("<< "+"; ".join(ini_msgs)+" >>\n")
 del ini_msgs
 
 # Clean up imported names
-del os, sys, np, UnitRegistry, get_versions
+del os, sys, np, UnitRegistry, set_application_registry, get_versions
@@ -10,6 +10,8 @@ from copy import deepcopy
 from functools import partial
 from operator import setitem
 from itertools import product
+import os
+import pickle
 import re
 import sys
 import time
@@ -33,16 +35,22 @@ from pisa.core.param import ParamSet, Param
 from pisa.core.pipeline import Pipeline
 from pisa.utils.comparisons import recursiveEquality, FTYPE_PREC, ALLCLOSE_KW
 from pisa.utils.log import logging, set_verbosity
-from pisa.utils.fileio import to_file
+from pisa.utils.parallel import ReplicaPool
+from pisa.utils.fileio import from_file, to_file
+from pisa.utils.hdf import append_columns, from_hdf
 from pisa.utils.random_numbers import get_random_state
 from pisa.utils.stats import (METRICS_TO_MAXIMIZE, METRICS_TO_MINIMIZE,
                               LLH_METRICS, CHI2_METRICS, weighted_chi2,
                               it_got_better, is_metric_to_maximize)
 
 __all__ = ['MINIMIZERS_USING_SYMM_GRAD', 'MINIMIZERS_ACCEPTING_CONSTRS',
+           'MINIMIZERS_ACCEPTING_GRAD',
            'scipy_constraints_to_callables', 'get_nlopt_inequality_constraint_funcs',
            'set_minimizer_defaults', 'validate_minimizer_settings',
-           'Counter', 'Analysis', 'BasicAnalysis']
+           'draw_pseudo_data', 'pseudo_data_to_dist',
+           'Counter', 'FiniteDiffGradient', 'Analysis', 'BasicAnalysis',
+           'test_finite_diff_gradient', 'test_fit_trials',
+           'test_generalized_poisson_fit', 'test_scan', 'test_mcmc_sampling']
 
 __author__ = 'J.L. Lanfranchi, P. Eller, S. Wren, E. Bourbeau, A. Trettin, T. Ehrhardt'
 
@@ -69,6 +77,10 @@ MINIMIZERS_USING_SYMM_GRAD = ('l-bfgs-b', 'slsqp')
 """Minimizers that use symmetrical steps on either side of a point to compute
 gradients. See https://github.com/scipy/scipy/issues/4916"""
 
+MINIMIZERS_ACCEPTING_GRAD = ('l-bfgs-b', 'slsqp', 'trust-constr')
+"""Local scipy minimizers that can use the gradients computed by
+`FiniteDiffGradient` (see the `gradient` option of the minimizer settings)"""
+
 MINIMIZERS_ACCEPTING_CONSTRS = ('cobyla', 'slsqp', 'trust-constr', 'cobyqa')
 """Minimizers that allow constraints to be passed. According to
 scipy docs, cobyla and slsqp require dictionaries, whereas
@@ -194,9 +206,6 @@ def make_scipy_constraint_dict(constr_type, fun, jac=None, args=None):
 def merge_mapsets_together(mapset_list=None):
     '''Handle merging of multiple MapSets, when they come in
     the shape of a dict
-
-    TODO: might not be required any longer (see various comments on
-    generalized_poisson_llh)
     '''
 
     if isinstance(mapset_list[0], Mapping):
@@ -218,6 +227,126 @@ def merge_mapsets_together(mapset_list=None):
     return new_dict
 
 
+GENERALIZED_POISSON_KEYS = ('weights', 'llh_alphas', 'llh_betas', 'n_mc_events')
+"""Output keys of each pipeline that `generalized_poisson_llh` requires (these
+are provided by the `likelihood.generalized_llh_params` stage)"""
+
+
+def get_generalized_poisson_dist(hypo_maker):
+    """Get the per-dataset inputs to `generalized_poisson_llh` from all
+    pipelines of a DistributionMaker. Each pipeline is run only once, and its
+    output binning is used.
+
+    Parameters
+    ----------
+    hypo_maker : DistributionMaker
+
+    Returns
+    -------
+    generalized_poisson_dist : OrderedDict of MapSets
+        One MapSet for each of `GENERALIZED_POISSON_KEYS`, containing the maps
+        of all datasets
+
+    empty_bins : np.ndarray
+        Indices of the bins without any MC events in any of the datasets
+
+    """
+    mapset_list = []
+    for pipeline in hypo_maker:
+        pipeline.run()
+        pipeline.data.representation = pipeline.output_binning
+        mapset_list.append(OrderedDict(
+            (key, pipeline.data.get_mapset(key, fast=pipeline.fast_maps))
+            for key in GENERALIZED_POISSON_KEYS
+        ))
+    generalized_poisson_dist = merge_mapsets_together(mapset_list=mapset_list)
+    n_mc_events = np.sum(
+        [m.hist.ravel() for m in generalized_poisson_dist['n_mc_events']], axis=0
+    )
+    empty_bins = np.flatnonzero(n_mc_events == 0)
+    return generalized_poisson_dist, empty_bins
+
+
+def draw_pseudo_data(asimov_dist, trials, seed=0):
+    """Draw the Poisson-fluctuated pseudo-data of many pseudo-experiments
+    (trials) at once from a single expectation.
+
+    Every trial has its own, independent random stream, given by
+    ``get_random_state([seed, trial])``, such that it can be reproduced on its
+    own irrespective of which other trials are drawn along with it. For a
+    single MapSet, the pseudo-data of a trial is the same as
+    ``asimov_dist.fluctuate(method='poisson', random_state=[seed, trial])``.
+
+    Parameters
+    ----------
+    asimov_dist : MapSet or sequence of MapSets
+        Expectation
+
+    trials : int or sequence of int
+        Indices of the trials in [0, 2**17), or their number (trials 0, 1, ...)
+
+    seed : int
+        Common seed of all trials, in [0, 2**15)
+
+    Returns
+    -------
+    counts : np.ndarray of shape (number of trials, number of bins)
+        Bins of all maps, in order (nan where the expectation is nan)
+
+    """
+    if isinstance(trials, int):
+        trials = range(trials)
+    expected = _flatten_dist(asimov_dist)
+    valid = ~np.isnan(expected)
+    counts = np.full((len(trials), expected.size), np.nan)
+    for i, trial in enumerate(trials):
+        random_state = get_random_state([seed, int(trial)])
+        counts[i, valid] = random_state.poisson(expected[valid])
+    return counts
+
+
+def pseudo_data_to_dist(counts, asimov_dist):
+    """Turn the pseudo-data `counts` of a single trial, as drawn by
+    `draw_pseudo_data` from `asimov_dist`, into a data distribution with
+    the same structure as `asimov_dist` (and Poisson errors w.r.t. it).
+    """
+    if isinstance(asimov_dist, MapSet):
+        return _unflatten_dist(counts, asimov_dist)
+    dists = []
+    start = 0
+    for mapset in asimov_dist:
+        stop = start + sum(m.hist.size for m in mapset)
+        dists.append(_unflatten_dist(counts[start:stop], mapset))
+        start = stop
+    return dists
+
+
+def _flatten_dist(dist):
+    """Nominal values of all bins of a MapSet or sequence of MapSets"""
+    mapsets = [dist] if isinstance(dist, MapSet) else dist
+    return np.concatenate(
+        [m.nominal_values.ravel() for mapset in mapsets for m in mapset]
+    )
+
+
+def _unflatten_dist(counts, mapset):
+    """MapSet with the bins of `counts`, shaped like `mapset`"""
+    maps = []
+    start = 0
+    for m in mapset:
+        stop = start + m.hist.size
+        with np.errstate(invalid='ignore'):
+            error_hist = np.sqrt(m.nominal_values)
+        maps.append(Map(
+            name=m.name, hist=counts[start:stop].reshape(m.shape),
+            error_hist=error_hist, binning=m.binning, tex=m.tex,
+            full_comparison=m.full_comparison,
+        ))
+        start = stop
+    return MapSet(maps=maps, name=mapset.name, tex=mapset.tex,
+                  collate_by_name=mapset.collate_by_name)
+
+
 def set_minimizer_defaults(minimizer_settings):
     """Fill in default values for minimizer settings.
 
@@ -555,6 +684,17 @@ def update_param_values_detector(
                             update_nominal_values, update_range, update_is_fixed)
     hypo_maker.init_params()
 
+def _restore_params(hypo_maker, params):
+    """Reset values, nominal values, ranges and fixed states of `hypo_maker`'s
+    params to those of `params` without replacing any memory references."""
+    if hypo_maker.__class__.__name__ == "Detectors":
+        update_param_values_detector(hypo_maker, params,
+                                     update_nominal_values=True,
+                                     update_range=True, update_is_fixed=True)
+    else:
+        update_param_values(hypo_maker, params, update_nominal_values=True,
+                            update_range=True, update_is_fixed=True)
+
 # TODO: move this to a central location prob. in utils
 class Counter():
     """Simple counter object for use as a minimizer callback."""
@@ -569,6 +709,7 @@ class Counter():
 
     def __iadd__(self, inc):
         self._count += inc
+        return self
 
     def reset(self):
         """Reset counter"""
@@ -604,6 +745,129 @@ class BoundedRandomDisplacement():
         x = np.clip(x, *self.bounds)  # bounds are automatically broadcast
         return x
 
+class FiniteDiffGradient():
+    """
+    Finite-difference gradient of a function of parameters rescaled to [0, 1],
+    such as `BasicAnalysis._minimizer_callable`, for use by gradient-based
+    minimizers.
+
+    The 2 * N perturbed points of an N-dimensional gradient are independent, so
+    they are evaluated concurrently in a `ReplicaPool`, each worker holding a
+    replica of the hypo maker `func` refers to (as of the creation of this
+    object). Central differences are used, apart from close to the bounds,
+    where the second-order one-sided formulas are used instead. If `adaptive`,
+    the step size in each dimension is re-estimated from every evaluation to
+    balance the truncation error (assuming the third derivative to be of the
+    order of the second one in the unit interval) and the numerical noise of
+    `func`.
+
+    Parameters
+    ----------
+    func : callable
+        Takes an array of rescaled parameter values and returns a float. Must
+        set all parameters it depends on, see `ReplicaPool`.
+    ndim : int
+        Number of parameters
+    num_workers : int or None
+        Number of worker processes. If None or <= 1, all points are evaluated
+        sequentially in the current process.
+    step : float
+        Initial step size
+    min_step, max_step : float
+        Range of the adapted step sizes (`max_step` must not exceed 0.25)
+    adaptive : bool
+        Whether to adapt the step sizes
+    precision : float
+        Relative numerical precision of `func`
+
+    """
+    def __init__(self, func, ndim, num_workers=None, step=1e-4, min_step=1e-7,
+                 max_step=0.1, adaptive=True, precision=5*FTYPE_PREC):
+        if not 0 < min_step <= step <= max_step <= 0.25:
+            raise ValueError("Require 0 < min_step <= step <= max_step <= 0.25")
+        self.func = func
+        self.steps = np.full(ndim, step, dtype=np.float64)
+        self.min_step = min_step
+        self.max_step = max_step
+        self.adaptive = adaptive
+        self.precision = precision
+        self.num_evals = 0
+        self._pool = ReplicaPool(self._eval_points, num_workers=num_workers)
+
+    def _eval_points(self, points):
+        return [self.func(x) for x in points]
+
+    def _eval_batch(self, points):
+        """Evaluate `func` at all `points`, with contiguous chunks of points
+        being distributed over the workers"""
+        self.num_evals += len(points)
+        chunks = np.array_split(points, self._pool.num_workers)
+        return np.concatenate(self._pool.map([c for c in chunks if len(c) > 0]))
+
+    def gradient(self, x, f0=None):
+        """Gradient of `func` at `x`.
+
+        Parameters
+        ----------
+        x : sequence of float
+        f0 : float or None
+            `func(x)`, if known already; otherwise it is evaluated along with
+            the perturbed points
+
+        Returns
+        -------
+        grad : np.ndarray
+
+        """
+        x = np.asarray(x, dtype=np.float64)
+        ndim = x.size
+        h = self.steps
+        # +1: forward, -1: backward, 0: central differences
+        direction = np.where(x + h > 1, -1, np.where(x - h < 0, 1, 0))
+
+        # f1 is evaluated at x + direction * h (x + h for central differences)
+        # and f2 at x + 2 * direction * h (x - h for central differences)
+        idx = np.arange(ndim)
+        points = np.tile(x, (2*ndim, 1))
+        points[idx, idx] += np.where(direction == 0, 1, direction) * h
+        points[ndim + idx, idx] += np.where(direction == 0, -1, 2*direction) * h
+        if f0 is None:
+            values = self._eval_batch(np.vstack([points, x]))
+            f0 = values[-1]
+        else:
+            values = self._eval_batch(points)
+        f1, f2 = values[:ndim], values[ndim:2*ndim]
+
+        grad = np.where(
+            direction == 0,
+            (f1 - f2) / (2*h),
+            direction * (-3*f0 + 4*f1 - f2) / (2*h)
+        )
+        second_diff = np.where(direction == 0, f1 - 2*f0 + f2, f0 - 2*f1 + f2)
+
+        if self.adaptive:
+            noise = self.precision * max(abs(f0), 1.)
+            curvature = np.abs(second_diff) / h**2
+            with np.errstate(divide='ignore'):
+                opt_steps = np.cbrt(3 * noise / curvature)
+            # keep the step if the function is (numerically) linear, and
+            # only change it gradually
+            new_steps = np.where(np.abs(second_diff) > noise, opt_steps, h)
+            new_steps = np.clip(new_steps, h / 10, h * 10)
+            self.steps = np.clip(new_steps, self.min_step, self.max_step)
+
+        return grad
+
+    def close(self):
+        """Shut down the worker processes"""
+        self._pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 class HypoFitResult():
     """Holds all relevant information about a fit result."""
 
@@ -631,6 +895,7 @@ class HypoFitResult():
         self.metric_val = metric_val
         # deepcopy done in setter function
         self.params = None
+        self.param_selections = None
         self.hypo_asimov_dist = None
         if hypo_maker is not None:
             self.params = hypo_maker.params
@@ -638,6 +903,7 @@ class HypoFitResult():
             # Record the distribution with the optimal param values
             self.hypo_asimov_dist = hypo_maker.get_outputs(return_sum=True)
         self.detailed_metric_info = None
+        self.minimizer_time = None
         if minimizer_time is not None:
             self.minimizer_time = minimizer_time * ureg.sec
         self.num_distributions_generated = num_distributions_generated
@@ -665,13 +931,7 @@ class HypoFitResult():
                 ) for i in range(len(data_dist))]
             else: # DistributionMaker object with regular binning
                 if metric[0] == 'generalized_poisson_llh':
-                    raise NotImplementedError(
-                        "generalized_poisson_llh isn't correctly implemented any longer!"
-                    )
-                    # FIXME: these `output_mode` and `force_standard_output` kwargs were removed in
-                    # https://github.com/icecube/pisa/commit/7a4e875aa7bdc52ea64a5270e9808d866d1395f3
-                    generalized_poisson_dist = hypo_maker.get_outputs(return_sum=False, force_standard_output=False)
-                    generalized_poisson_dist = merge_mapsets_together(mapset_list=generalized_poisson_dist)
+                    generalized_poisson_dist, _ = get_generalized_poisson_dist(hypo_maker)
                 else:
                     generalized_poisson_dist = None
 
@@ -986,12 +1246,13 @@ class BasicAnalysis():
 
     NLOPT can be dropped in place of `scipy` and `iminuit` by writing a dictionary with
     ``"method": "nlopt"`` and choosing the algorithm by its name of the form
-    ``NLOPT_{G,L}{N}_XXXX``. PISA supports all of the derivative-free global
+    ``NLOPT_{G,L}{N,D}_XXXX``. PISA supports all of the derivative-free global
     (https://nlopt.readthedocs.io/en/latest/NLopt_Algorithms/#global-optimization) and
     local
     (https://nlopt.readthedocs.io/en/latest/NLopt_Algorithms/#local-derivative-free-optimization)
-    algorithms. Algorithms requiring gradients such as BFGS are not supported. To use
-    the Nelder-Mead algorithm, for example, the following settings could be used:
+    algorithms. Algorithms requiring gradients such as BFGS are supplied with numerical
+    gradients (see "Gradients" below). To use the Nelder-Mead algorithm, for example,
+    the following settings could be used:
     ::
         nlopt_settings = {
             "method": "nlopt",
@@ -1062,8 +1323,7 @@ class BasicAnalysis():
 
     Some global searches, like evolutionary strategies, use local subsidiary minimizers.
     These can be defined just as above by passing a dictionary with the settings to the
-    `local_optimizer` keyword. Note that, again, only gradient-free methods are
-    supported. Here is an example for the "Multi-Level single linkage" (MLSL) algorithm,
+    `local_optimizer` keyword. Here is an example for the "Multi-Level single linkage" (MLSL) algorithm,
     using PRAXIS as the local optimizer:
     ::
         "method_kwargs": {
@@ -1082,6 +1342,42 @@ class BasicAnalysis():
             "population": 100,
         }
 
+    **Parallel execution**
+
+    The `grid_scan`, `best_of` and `octants` methods accept a `num_workers` option
+    in their `method_kwargs`. If it is larger than one, the independent sub-fits are
+    run in that many forked worker processes, each of which holds a replica of the
+    (already set up) hypo maker and uses `PISA_NUM_THREADS` threads. The workers
+    are forked only once per hypo maker and number of workers, and are re-used by
+    all later fits (see `close_replica_pools`); only the starting parameters and
+    fit settings are sent to them, so the latter must be picklable (otherwise, new
+    workers are forked for the call). Every sub-fit then starts from the state the
+    hypo maker is in when entering the method, and results are collected in the
+    same order as when running sequentially. Nested methods always run
+    sequentially inside a worker.
+    ::
+        method_kwargs = {
+            "grid": {...},
+            "num_workers": 16,
+        }
+
+    **Gradients**
+
+    Gradient-based minimizers can be supplied with finite-difference gradients of the
+    metric computed by `FiniteDiffGradient`, which evaluates all perturbed hypotheses
+    of a gradient concurrently in `num_workers` forked worker processes (each holding
+    a replica of the hypo maker) and adapts the step sizes in the rescaled parameter
+    space. The gradient options are given as the `gradient` entry of the
+    `method_kwargs` of `iminuit` and `nlopt` (where it is optional and only used by
+    `NLOPT_{G,L}D_XXXX` algorithms) or, in the format of the other settings, of the
+    `scipy` minimizer settings (only for the minimizers in `MINIMIZERS_ACCEPTING_GRAD`):
+    ::
+        minimizer_settings = {
+            "method": {"value": "l-bfgs-b", "desc": "..."},
+            "options": {"value": {...}, "desc": {...}},
+            "gradient": {"value": {"num_workers": 8, "step": 1e-4}, "desc": "..."},
+        }
+
     **Custom fitting methods**
 
     Custom fitting methods are added by subclassing the analysis. The fit function
@@ -1147,6 +1443,75 @@ class BasicAnalysis():
         self._nit = 0
         self.pprint = True
         self.blindness = False
+        self._replica_pools = []
+
+    def _get_replica_pool(self, hypo_maker, num_workers):
+        """Get the pool of `num_workers` worker processes holding replicas of
+        `hypo_maker`, which is forked when it is first requested and re-used
+        afterwards (see `close_replica_pools`)."""
+        for maker, workers, pid, pool in self._replica_pools:
+            # a pool inherited by a forked worker cannot be used there
+            if maker is hypo_maker and workers == num_workers and pid == os.getpid():
+                return pool
+        pool = ReplicaPool(partial(self._run_on_replica, hypo_maker),
+                           num_workers=num_workers)
+        self._replica_pools.append((hypo_maker, num_workers, os.getpid(), pool))
+        return pool
+
+    def _run_on_replica(self, hypo_maker, task_arg):
+        """Bring `hypo_maker` into the state described by `task_arg` and call
+        the analysis method it names on it."""
+        selections, params, (pprint, blindness), func_name, kwargs = task_arg
+        if selections and hypo_maker.param_selections != selections:
+            hypo_maker.select_params(selections)
+        _restore_params(hypo_maker, params)
+        self.pprint, self.blindness = pprint, blindness
+        return getattr(self, func_name)(hypo_maker=hypo_maker, **kwargs)
+
+    def _map_on_replicas(self, hypo_maker, all_params, func_name, all_kwargs,
+                         num_workers):
+        """Call the analysis method `func_name` once for each element of
+        `all_params` and `all_kwargs`, with the parameters set to those of
+        `all_params`, on the replicas of `hypo_maker` held by `num_workers`
+        worker processes. Our own `hypo_maker` is left untouched.
+
+        Returns
+        -------
+        results : list
+            Return values of `func_name`, in order
+
+        """
+        task_args = [
+            (hypo_maker.param_selections, params, (self.pprint, self.blindness),
+             func_name, kwargs)
+            for params, kwargs in zip(all_params, all_kwargs)
+        ]
+        try:
+            pickle.dumps(task_args)
+        except (pickle.PicklingError, AttributeError, TypeError) as err:
+            # e.g. settings containing lambda functions, which can only reach
+            # the workers by forking them anew
+            logging.warning(f"Cannot send fit settings to the replica workers"
+                            f" ({err}), forking new workers for this call")
+            with ReplicaPool(lambda i: self._run_on_replica(hypo_maker, task_args[i]),
+                             num_workers=min(num_workers, len(task_args))) as pool:
+                return pool.map(range(len(task_args)))
+        return self._get_replica_pool(hypo_maker, num_workers).map(task_args)
+
+    def close_replica_pools(self):
+        """Shut down the worker processes holding replicas of hypo makers.
+
+        The workers for a hypo maker are forked when it is first fit with
+        `num_workers` > 1 and re-used by all later fits. Before every sub-fit,
+        they take over the parameter selection as well as the values, nominal
+        values, ranges and fixed states of the parameters, but no other
+        changes to the hypo maker (e.g. of priors or of stage attributes) made
+        after forking. Call this method after such changes or when done.
+        """
+        for _, _, pid, pool in self._replica_pools:
+            if pid == os.getpid():
+                pool.close()
+        self._replica_pools = []
 
     # TODO: Defer sub-fits to cluster
     def fit_recursively(
@@ -1224,10 +1589,18 @@ class BasicAnalysis():
 
             # Get the metric value at this initial point
             # This is for returning as part of the "fit" results
-            initial_metric_val = (
-                data_dist.metric_total(expected_values=hypo_asimov_dist, metric=metric[0])
-                + hypo_maker.params.priors_penalty(metric=metric[0])
-            )
+            if metric[0] == 'generalized_poisson_llh':
+                # same inputs as in `_minimizer_callable`
+                generalized_poisson_dist, empty_bins = get_generalized_poisson_dist(hypo_maker)
+                initial_metric_val = data_dist.maps[0].metric_total(
+                    expected_values=generalized_poisson_dist, metric=metric[0],
+                    metric_kwargs={'empty_bins': empty_bins}
+                )
+            else:
+                initial_metric_val = data_dist.metric_total(
+                    expected_values=hypo_asimov_dist, metric=metric[0]
+                )
+            initial_metric_val += hypo_maker.params.priors_penalty(metric=metric[0])
 
             # Return fit results, even though didn't technically fit
             return HypoFitResult(
@@ -1257,6 +1630,10 @@ class BasicAnalysis():
                      method_kwargs, local_fit_kwargs):
         """
         A simple global optimization scheme that searches mixing angle octants.
+
+        If `num_workers` > 1 is given in `method_kwargs`, the two octants are fit
+        simultaneously by replicas of the hypo maker in separate worker processes
+        (see `close_replica_pools`).
         """
         angle_name = method_kwargs["angle"]
         if angle_name not in hypo_maker.params.free.names:
@@ -1293,36 +1670,67 @@ class BasicAnalysis():
             hypo_maker, angle_name, inflection_point, tolerance=tolerance
         )
 
-        # Fit the first octant
-        # In this case it is OK to replace the memory reference, we will reinstate it
-        # later.
-        hypo_maker.update_params(ang_case1)
-        best_fit_info = self.fit_recursively(
-            data_dist, hypo_maker, metric, external_priors_penalty,
-            local_fit_kwargs["method"], local_fit_kwargs["method_kwargs"],
-            local_fit_kwargs["local_fit_kwargs"]
-        )
+        num_workers = method_kwargs.get("num_workers", None)
+        if num_workers is not None and num_workers > 1:
+            # Both octants are fit at the same time by replicas of the hypo maker,
+            # each starting from the state it is in right now.
+            start_params = deepcopy(hypo_maker.params)
+            all_params = []
+            for octant_idx, ang_case in enumerate((ang_case1, ang_case2)):
+                if octant_idx == 1 and reset_free:
+                    hypo_maker.reset_free()
+                octant_params = deepcopy(hypo_maker.params)
+                octant_params.update(deepcopy(ang_case))
+                all_params.append(octant_params)
+            _restore_params(hypo_maker, start_params)
+
+            logging.info(f'checking both octants of {angle_name} in parallel')
+            fit_kwargs = dict(
+                data_dist=data_dist, metric=metric,
+                external_priors_penalty=external_priors_penalty,
+                method=local_fit_kwargs["method"],
+                method_kwargs=local_fit_kwargs["method_kwargs"],
+                local_fit_kwargs=local_fit_kwargs["local_fit_kwargs"],
+            )
+            best_fit_info, new_fit_info = self._map_on_replicas(
+                hypo_maker, all_params, "fit_recursively", [fit_kwargs] * 2,
+                num_workers
+            )
+            if not self.blindness:
+                logging.info("found best fits at angles "
+                             f"{best_fit_info.params[angle_name].value} and "
+                             f"{new_fit_info.params[angle_name].value}")
+        else:
+            # Fit the first octant
+            # In this case it is OK to replace the memory reference, we will
+            # reinstate it later.
+            hypo_maker.update_params(ang_case1)
+            best_fit_info = self.fit_recursively(
+                data_dist, hypo_maker, metric, external_priors_penalty,
+                local_fit_kwargs["method"], local_fit_kwargs["method_kwargs"],
+                local_fit_kwargs["local_fit_kwargs"]
+            )
 
-        if not self.blindness:
-            logging.info(f"found best fit at angle {best_fit_info.params[angle_name].value}")
-        logging.info(f'checking other octant of {angle_name}')
+            if not self.blindness:
+                logging.info(f"found best fit at angle {best_fit_info.params[angle_name].value}")
+            logging.info(f'checking other octant of {angle_name}')
 
-        if reset_free:
-            hypo_maker.reset_free()
-        else:
-            for param in minimizer_start_params:
-                hypo_maker.params[param.name].value = param.value
+            if reset_free:
+                hypo_maker.reset_free()
+            else:
+                for param in minimizer_start_params:
+                    hypo_maker.params[param.name].value = param.value
 
-        # Fit the second octant
-        hypo_maker.update_params(ang_case2)
-        new_fit_info = self.fit_recursively(
-            data_dist, hypo_maker, metric, external_priors_penalty,
-            local_fit_kwargs["method"], local_fit_kwargs["method_kwargs"],
-            local_fit_kwargs["local_fit_kwargs"]
-        )
+            # Fit the second octant
+            hypo_maker.update_params(ang_case2)
+            new_fit_info = self.fit_recursively(
+                data_dist, hypo_maker, metric, external_priors_penalty,
+                local_fit_kwargs["method"], local_fit_kwargs["method_kwargs"],
+                local_fit_kwargs["local_fit_kwargs"]
+            )
 
-        if not self.blindness:
-            logging.info(f"found best fit at angle {new_fit_info.params[angle_name].value}")
+            if not self.blindness:
+                logging.info(f"found best fit at angle {new_fit_info.params[angle_name].value}")
 
 
         # We must not forget to reset the range of the angle to its original value!
@@ -1369,25 +1777,51 @@ class BasicAnalysis():
 
         The specialty here is that `local_fit_kwargs` is a list, where each element
         defines one fit.
+
+        If `num_workers` > 1 is given in `method_kwargs`, the fits are distributed
+        over that many worker processes holding replicas of the hypo maker (see
+        `close_replica_pools`). Each of them then starts from the state the hypo
+        maker is in when entering this method.
         """
 
         logging.info(f"running several manually configured fits to choose optimum")
 
         reset_free = True
-        if method_kwargs is not None and "reset_free" in method_kwargs.keys():
-            reset_free = method_kwargs["reset_free"]
+        num_workers = None
+        if method_kwargs is not None:
+            reset_free = method_kwargs.get("reset_free", reset_free)
+            num_workers = method_kwargs.get("num_workers", num_workers)
 
-        all_fit_results = []
-        for i, fit_kwargs in enumerate(local_fit_kwargs):
+        if num_workers is not None and num_workers > 1:
+            start_params = deepcopy(hypo_maker.params)
             if reset_free:
                 hypo_maker.reset_free()
-            logging.info(f"Beginning fit {i+1} / {len(local_fit_kwargs)}")
-            new_fit_info = self.fit_recursively(
-                data_dist, hypo_maker, metric, external_priors_penalty,
-                fit_kwargs["method"], fit_kwargs["method_kwargs"],
-                fit_kwargs["local_fit_kwargs"]
+            fit_params = deepcopy(hypo_maker.params)
+            _restore_params(hypo_maker, start_params)
+
+            logging.info(f"Running {len(local_fit_kwargs)} fits in parallel")
+            all_fit_results = self._map_on_replicas(
+                hypo_maker, [fit_params] * len(local_fit_kwargs), "fit_recursively",
+                [dict(data_dist=data_dist, metric=metric,
+                      external_priors_penalty=external_priors_penalty,
+                      method=fit_kwargs["method"],
+                      method_kwargs=fit_kwargs["method_kwargs"],
+                      local_fit_kwargs=fit_kwargs["local_fit_kwargs"])
+                 for fit_kwargs in local_fit_kwargs],
+                num_workers
             )
-            all_fit_results.append(new_fit_info)
+        else:
+            all_fit_results = []
+            for i, fit_kwargs in enumerate(local_fit_kwargs):
+                if reset_free:
+                    hypo_maker.reset_free()
+                logging.info(f"Beginning fit {i+1} / {len(local_fit_kwargs)}")
+                new_fit_info = self.fit_recursively(
+                    data_dist, hypo_maker, metric, external_priors_penalty,
+                    fit_kwargs["method"], fit_kwargs["method_kwargs"],
+                    fit_kwargs["local_fit_kwargs"]
+                )
+                all_fit_results.append(new_fit_info)
 
         all_fit_metric_vals = [fit_info.metric_val for fit_info in all_fit_results]
         # Take the one with the best fit
@@ -1398,6 +1832,13 @@ class BasicAnalysis():
 
         logging.info(f"Found best fit being index {best_idx} with metric "
                      f"{all_fit_metric_vals[best_idx]}")
+        if num_workers is not None and num_workers > 1:
+            # the fits did not touch our own hypo maker, so we bring it into the
+            # best fit state here
+            if hypo_maker.__class__.__name__ == "Detectors":
+                update_param_values_detector(hypo_maker, all_fit_results[best_idx].params)
+            else:
+                update_param_values(hypo_maker, all_fit_results[best_idx].params)
         return all_fit_results[best_idx]
 
     def _fit_condition(self, data_dist, hypo_maker, metric,
@@ -1443,6 +1884,12 @@ class BasicAnalysis():
 
         Alternatively, the parameters used for the grid can be fixed in the fit at each
         grid point, and only the very best fit is then freed up to be refined.
+
+        If `num_workers` > 1 is given in `method_kwargs`, the grid points are
+        distributed over that many worker processes holding replicas of the hypo
+        maker (see `close_replica_pools`).
+        Each fit then starts from the state the hypo maker is in when entering this
+        method (after resetting free parameters if `reset_free` is True).
         """
 
         assert "grid" in method_kwargs.keys()
@@ -1482,9 +1929,12 @@ class BasicAnalysis():
         # when we return from the scan, we want to set all parameters free again that
         # were free to begin with
         originally_free = hypo_maker.params.free.names
-        all_fit_results = []
         grid_shape = scan_mesh[0].shape
-        for grid_idx in np.ndindex(grid_shape):
+        grid_indices = list(np.ndindex(grid_shape))
+        num_workers = method_kwargs.get("num_workers", None)
+
+        def set_grid_point(i):
+            grid_idx = grid_indices[i]
             point = {name: mesh[grid_idx] for name, mesh in zip(grid_params, scan_mesh)}
             logging.info(f"working on grid point {point}")
             if reset_free:
@@ -1503,12 +1953,35 @@ class BasicAnalysis():
                     update_param_values_detector(hypo_maker, mod_param, update_is_fixed=True)
                 else:
                     update_param_values(hypo_maker, mod_param, update_is_fixed=True)
-            new_fit_info = self.fit_recursively(
-                data_dist, hypo_maker, metric, external_priors_penalty,
-                local_fit_kwargs["method"], local_fit_kwargs["method_kwargs"],
-                local_fit_kwargs["local_fit_kwargs"]
+
+        fit_kwargs = dict(
+            data_dist=data_dist, metric=metric,
+            external_priors_penalty=external_priors_penalty,
+            method=local_fit_kwargs["method"],
+            method_kwargs=local_fit_kwargs["method_kwargs"],
+            local_fit_kwargs=local_fit_kwargs["local_fit_kwargs"],
+        )
+        if num_workers is not None and num_workers > 1:
+            # the starting points of all fits are set up here and then sent
+            # to the replicas
+            start_params = deepcopy(hypo_maker.params)
+            all_params = []
+            for i in range(len(grid_indices)):
+                _restore_params(hypo_maker, start_params)
+                set_grid_point(i)
+                all_params.append(deepcopy(hypo_maker.params))
+            _restore_params(hypo_maker, start_params)
+            all_fit_results = self._map_on_replicas(
+                hypo_maker, all_params, "fit_recursively",
+                [fit_kwargs] * len(all_params), num_workers
             )
-            all_fit_results.append(new_fit_info)
+        else:
+            all_fit_results = []
+            for i in range(len(grid_indices)):
+                set_grid_point(i)
+                all_fit_results.append(
+                    self.fit_recursively(hypo_maker=hypo_maker, **fit_kwargs)
+                )
         for param in originally_free:
             hypo_maker.params[param].is_fixed = False
 
@@ -1529,15 +2002,23 @@ class BasicAnalysis():
 
         best_fit_result = all_fit_results[best_idx]
 
-        if do_refined_fit:
+        if do_refined_fit or (num_workers is not None and num_workers > 1):
+            if num_workers is not None and num_workers > 1:
+                # our own hypo maker has not been touched by the fits, so the
+                # values of the (possibly fixed) grid params have to be set, too
+                best_fit_params = best_fit_result.params
+            else:
+                best_fit_params = best_fit_result.params.free
             if hypo_maker.__class__.__name__ == "Detectors":
-                update_param_values_detector(hypo_maker, best_fit_result.params.free)
+                update_param_values_detector(hypo_maker, best_fit_params)
             else:
-                update_param_values(hypo_maker, best_fit_result.params.free)
+                update_param_values(hypo_maker, best_fit_params)
             # the params stored in the best fit may come from a grid point where
             # parameters were fixed, so we free them up again
             for param in originally_free:
                 hypo_maker.params[param].is_fixed = False
+
+        if do_refined_fit:
             logging.info("Refining best fit result...")
             # definitely don't want to reset the parameters here, that would defeate
             # the entire purpose...
@@ -1996,10 +2477,18 @@ class BasicAnalysis():
             logging.info(msg)
 
             # Get the metric value at this initial point (for the returned data)
-            initial_metric_val = (
-                data_dist.metric_total(expected_values=hypo_asimov_dist, metric=metric[0])
-                + hypo_maker.params.priors_penalty(metric=metric[0])
-            )
+            if metric[0] == 'generalized_poisson_llh':
+                # same inputs as in `_minimizer_callable`
+                generalized_poisson_dist, empty_bins = get_generalized_poisson_dist(hypo_maker)
+                initial_metric_val = data_dist.maps[0].metric_total(
+                    expected_values=generalized_poisson_dist, metric=metric[0],
+                    metric_kwargs={'empty_bins': empty_bins}
+                )
+            else:
+                initial_metric_val = data_dist.metric_total(
+                    expected_values=hypo_asimov_dist, metric=metric[0]
+                )
+            initial_metric_val += hypo_maker.params.priors_penalty(metric=metric[0])
 
             # Return fit results, even though didn't technically fit
             return HypoFitResult(
@@ -2021,17 +2510,38 @@ class BasicAnalysis():
         # iterates, no matter what you do
         #
         if global_method is None:
-            optimize_result = optimize.minimize(
-                fun=self._minimizer_callable,
-                x0=x0,
-                args=(hypo_maker, data_dist, metric, counter, fit_history,
-                      flip_x0, external_priors_penalty),
-                bounds=bounds,
-                constraints=constrs,
-                method=minimizer_settings['method']['value'],
-                options=minimizer_settings['options']['value'],
-                callback=self._minimizer_callback
-            )
+            fun, jac, gradient = self._minimizer_callable, None, None
+            if "gradient" in minimizer_settings:
+                if minimizer_method not in MINIMIZERS_ACCEPTING_GRAD:
+                    raise ValueError(
+                        f"Minimizer {minimizer_method} does not use gradients;"
+                        f" use one of {MINIMIZERS_ACCEPTING_GRAD}"
+                    )
+                gradient = self._get_gradient(
+                    minimizer_settings["gradient"]["value"], hypo_maker,
+                    data_dist, metric, flip_x0, external_priors_penalty
+                )
+                def fun(x, *args):
+                    metric_val = self._minimizer_callable(x, *args)
+                    return metric_val, gradient.gradient(x, metric_val)
+                jac = True
+            try:
+                optimize_result = optimize.minimize(
+                    fun=fun,
+                    x0=x0,
+                    args=(hypo_maker, data_dist, metric, counter, fit_history,
+                          flip_x0, external_priors_penalty),
+                    jac=jac,
+                    bounds=bounds,
+                    constraints=constrs,
+                    method=minimizer_settings['method']['value'],
+                    options=minimizer_settings['options']['value'],
+                    callback=self._minimizer_callback
+                )
+            finally:
+                if gradient is not None:
+                    counter += gradient.num_evals
+                    gradient.close()
         elif global_method == "differential_evolution":
             optimize_result = optimize.differential_evolution(
                 func=self._minimizer_callable,
@@ -2302,7 +2812,19 @@ class BasicAnalysis():
                 return np.nan
             return self._minimizer_callable(x, *args)
 
-        m = Minuit(loss_func, x0)
+        gradient = None
+        grad_func = None
+        if method_kwargs.get("gradient") is not None:
+            gradient = self._get_gradient(
+                method_kwargs["gradient"], hypo_maker, data_dist, metric, flip_x0,
+                external_priors_penalty
+            )
+            def grad_func(x):
+                if np.any(~np.isfinite(x)):
+                    return np.full(len(x), np.nan)
+                return gradient.gradient(x)
+
+        m = Minuit(loss_func, x0, grad=grad_func)
         m.limits = bounds
         # only initial step size, not very important
         if "errors" in method_kwargs.keys():
@@ -2338,13 +2860,18 @@ class BasicAnalysis():
         # is badly behaved. We don't want to completely crash in that case.
         m.throw_nan = False
         # actually run the minimization!
-        if simplex:
-            logging.info("Running SIMPLEX")
-            m.simplex()
-
-        if migrad:
-            logging.info("Running MIGRAD")
-            m.migrad()
+        try:
+            if simplex:
+                logging.info("Running SIMPLEX")
+                m.simplex()
+
+            if migrad:
+                logging.info("Running MIGRAD")
+                m.migrad()
+        finally:
+            if gradient is not None:
+                counter += gradient.num_evals
+                gradient.close()
 
         end_t = time.time()
         if self.pprint:
@@ -2433,7 +2960,7 @@ class BasicAnalysis():
 
     def _fit_nlopt(self, data_dist, hypo_maker, metric,
                    external_priors_penalty, method_kwargs, local_fit_kwargs):
-        """Run any of the (gradient-free) NLOPT optimizers to modify hypo dist maker's
+        """Run any of the NLOPT optimizers to modify hypo dist maker's
         free params until the data_dist is most likely to have come from this
         hypothesis.
 
@@ -2505,14 +3032,21 @@ class BasicAnalysis():
         args=(hypo_maker, data_dist, metric, counter, fit_history,
               flip_x0, external_priors_penalty)
 
+        gradient = None
+        if self._nlopt_uses_gradient(method_kwargs):
+            gradient = self._get_gradient(
+                method_kwargs.get("gradient", {}), hypo_maker, data_dist, metric,
+                flip_x0, external_priors_penalty
+            )
+
         def loss_func(x, grad):
             if np.any(~np.isfinite(x)):
                 logging.warning(f"NLOPT tried evaluating at invalid parameters: {x}")
                 return np.nan
+            metric_val = self._minimizer_callable(x, *args)
             if grad.size > 0:
-                raise RuntimeError("Gradients cannot be calculated, use a gradient-free"
-                                   " optimization routine instead.")
-            return self._minimizer_callable(x, *args)
+                grad[:] = gradient.gradient(x, metric_val)
+            return metric_val
 
         opt = self._define_nlopt_opt(method_kwargs, loss_func, hypo_maker)
 
@@ -2524,7 +3058,12 @@ class BasicAnalysis():
 
         logging.info(f"Starting optimization using {opt.get_algorithm_name()}")
 
-        xopt = opt.optimize(x0)
+        try:
+            xopt = opt.optimize(x0)
+        finally:
+            if gradient is not None:
+                counter += gradient.num_evals
+                gradient.close()
 
         end_t = time.time()
         if self.pprint:
@@ -2617,10 +3156,7 @@ class BasicAnalysis():
             raise ValueError("Need to specify the algorithm to use.")
         alg_name_splits = method_kwargs["algorithm"].split("_")
         if not alg_name_splits[0] == "NLOPT":
-            raise ValueError("Algorithm name should be specified as `NLOPT_{G,L}N_XXX`")
-        if len(alg_name_splits[1]) > 1 and alg_name_splits[1][1] == "D":
-            raise ValueError("Only gradient-free algorithms (NLOPT_GN or NLOPT_LN) are "
-                             "supported.")
+            raise ValueError("Algorithm name should be specified as `NLOPT_{G,L}{N,D}_XXX`")
 
         algorithm = getattr(nlopt, "_".join(alg_name_splits[1:]))
         x0 = np.array(hypo_maker.params.free._rescaled_values)
@@ -2669,6 +3205,33 @@ class BasicAnalysis():
 
         return opt
 
+    @staticmethod
+    def _nlopt_uses_gradient(method_kwargs):
+        """Whether the NLOPT algorithm defined by `method_kwargs` or any of its
+        subsidiary optimizers requires gradients (i.e., is `NLOPT_{G,L}D_XXX`)"""
+        alg_name_splits = method_kwargs["algorithm"].split("_")
+        if len(alg_name_splits) > 1 and alg_name_splits[1][1:2] == "D":
+            return True
+        if "local_optimizer" in method_kwargs:
+            return BasicAnalysis._nlopt_uses_gradient(method_kwargs["local_optimizer"])
+        return False
+
+    def _get_gradient(self, gradient_kwargs, hypo_maker, data_dist, metric, flip_x0,
+                      external_priors_penalty):
+        """Set up the `FiniteDiffGradient` of `_minimizer_callable` for the current
+        fit, with the options `gradient_kwargs`. Its workers are forked here, so
+        they hold replicas of `hypo_maker` as of this call."""
+        def func(scaled_param_vals):
+            # distributions generated for the gradient are counted separately,
+            # and the perturbed points are not recorded in the fit history
+            return self._minimizer_callable(
+                scaled_param_vals, hypo_maker, data_dist, metric, Counter(), [],
+                flip_x0, external_priors_penalty
+            )
+        return FiniteDiffGradient(
+            func, len(hypo_maker.params.free), **gradient_kwargs
+        )
+
     def _pprint_header(self, free_p, external_priors_penalty, metric):
         # Display any units on top
         r = re.compile(r'(^[+0-9.eE-]* )|(^[+0-9.eE-]*$)')
@@ -2767,18 +3330,12 @@ class BasicAnalysis():
         # Get the map set
         try:
             if metric[0] == 'generalized_poisson_llh':
-                raise NotImplementedError(
-                    "generalized_poisson_llh isn't correctly implemented any longer!"
-                )
-                # FIXME: these `output_mode` and `force_standard_output` kwargs were removed in
-                # https://github.com/icecube/pisa/commit/7a4e875aa7bdc52ea64a5270e9808d866d1395f3
-                hypo_asimov_dist = hypo_maker.get_outputs(return_sum=False, output_mode='binned', force_standard_output=False)
-                hypo_asimov_dist = merge_mapsets_together(mapset_list=hypo_asimov_dist)
+                hypo_asimov_dist, empty_bins = get_generalized_poisson_dist(hypo_maker)
                 data_dist = data_dist.maps[0] # Extract the map from the MapSet
-                metric_kwargs = {'empty_bins':hypo_maker.empty_bin_indices}
+                metric_kwargs = {'empty_bins': empty_bins}
             else:
                 hypo_asimov_dist = hypo_maker.get_outputs(return_sum=True)
-                # TODO: can be removed? (see same commit as above)
+                # TODO: can be removed?
                 if isinstance(hypo_asimov_dist, OrderedDict):
                     hypo_asimov_dist = hypo_asimov_dist['weights']
                 metric_kwargs = {}
@@ -2889,9 +3446,11 @@ class BasicAnalysis():
         self._nit += 1
 
     def MCMC_sampling(self, data_dist, hypo_maker, metric, nwalkers, burnin, nsteps,
-                      return_burn_in=False, random_state=None, sampling_algorithm=None):
-        """Performs MCMC sampling. Only supports serial (single CPU) execution at the 
-        moment. See issue #830.
+                      return_burn_in=False, random_state=None, sampling_algorithm=None,
+                      num_workers=None, checkpoint_file=None, checkpoint_interval=100):
+        """Performs MCMC sampling. The log-likelihood of all walkers that are
+        moved at once is evaluated in a single (vectorized) call, optionally
+        distributed over a pool of worker processes. See issue #830.
 
         Parameters
         ----------
@@ -2922,7 +3481,8 @@ class BasicAnalysis():
             Also return the steps of the burn in phase. Default is False.
 
         random_state : None or type accepted by utils.random_numbers.get_random_state
-            Random state of the walker starting points. Default is None.
+            Random state of the walker starting points and of the sampler.
+            Default is None.
             
         sampling_algorithm : None or emcee.moves object
             Sampling algorithm used by the emcee sampler. None means to use the default which
@@ -2930,6 +3490,19 @@ class BasicAnalysis():
             See https://emcee.readthedocs.io/en/stable/user/moves/#moves-user to learn more
             about the emcee sampling algorithms.
 
+        num_workers : None or int
+            If > 1, the walkers are evaluated by that many worker processes, each
+            holding a replica of `hypo_maker` (see `ReplicaPool`). The chain does not
+            depend on the number of workers.
+
+        checkpoint_file : None or str
+            If given, the chain and the state of the sampler are written to this
+            (pickle) file every `checkpoint_interval` steps. If the file exists, the
+            sampling is resumed from it, and the starting points are ignored.
+
+        checkpoint_interval : int
+            Number of steps between checkpoints
+
         Returns
         -------
 
@@ -2976,48 +3549,94 @@ class BasicAnalysis():
             )
             return sign*metric_val
 
+        def eval_walkers(scaled_param_vals_batch):
+            return [func(scaled_param_vals, bounds, data_dist, hypo_maker, metric)
+                    for scaled_param_vals in scaled_param_vals_batch]
+
+        pool = ReplicaPool(eval_walkers, num_workers=num_workers)
+
+        def vectorized_func(scaled_param_vals_batch):
+            """Evaluate `func` for each row, with contiguous chunks of rows
+            being distributed over the workers"""
+            chunks = np.array_split(scaled_param_vals_batch, pool.num_workers)
+            return np.concatenate(pool.map([c for c in chunks if len(c) > 0]))
+
         sampler = emcee.EnsembleSampler(
-            nwalkers, ndim, func,
+            nwalkers, ndim, vectorized_func,
             moves=sampling_algorithm,
-            args=[bounds, data_dist, hypo_maker, metric]
+            vectorize=True,
         )
 
-        if self.pprint:
-            sys.stdout.write('Burn in')
-            sys.stdout.flush()
-        pos, prob, state = sampler.run_mcmc(p0, burnin, progress=self.pprint)
-        
-        if return_burn_in:
-            flatchain_burnin = sampler.flatchain
-            scaled_chain_burnin = np.full_like(flatchain_burnin, np.nan, dtype=FTYPE)
-            param_copy_burnin = ParamSet(hypo_maker.params.free)
-
-            for s, sample in enumerate(flatchain_burnin):
+        # chains of the burn in phase and of the main sampling, each of shape
+        # (steps, nwalkers, ndim)
+        chains = {
+            'burnin': np.empty((0, nwalkers, ndim)),
+            'main': np.empty((0, nwalkers, ndim)),
+        }
+        # the sampler continues with the random state after drawing the
+        # starting points, such that the chain is reproducible
+        state = emcee.State(p0, random_state=rs.get_state())
+        if checkpoint_file is not None and os.path.isfile(checkpoint_file):
+            checkpoint = from_file(checkpoint_file, fmt='pckl')
+            if checkpoint['chains']['burnin'].shape[1:] != (nwalkers, ndim):
+                raise ValueError(
+                    f'Checkpoint "{checkpoint_file}" is for a different number'
+                    ' of walkers or free params'
+                )
+            logging.info(f'Resuming MCMC sampling from "{checkpoint_file}"')
+            chains = checkpoint['chains']
+            state = emcee.State(*checkpoint['state'])
+
+        def write_checkpoint(state):
+            checkpoint = dict(
+                chains=chains,
+                state=(state.coords, state.log_prob, state.blobs, state.random_state),
+            )
+            # write to a temporary file first, such that an interruption
+            # never leaves behind a corrupted checkpoint
+            tmp_file = checkpoint_file + '.tmp'
+            to_file(checkpoint, tmp_file, fmt='pckl', warn=False)
+            os.replace(tmp_file, checkpoint_file)
+
+        def run_phase(phase, state, num_steps):
+            while len(chains[phase]) < num_steps:
+                num_steps_todo = num_steps - len(chains[phase])
+                if checkpoint_file is not None:
+                    num_steps_todo = min(num_steps_todo, checkpoint_interval)
+                sampler.reset()
+                state = sampler.run_mcmc(state, num_steps_todo, progress=self.pprint)
+                chains[phase] = np.concatenate([chains[phase], sampler.get_chain()])
+                if checkpoint_file is not None:
+                    write_checkpoint(state)
+            return state
+
+        with pool:
+            if self.pprint:
+                sys.stdout.write('Burn in')
+                sys.stdout.flush()
+            state = run_phase('burnin', state, burnin)
+
+            if self.pprint:
+                sys.stdout.write('Main sampling')
+                sys.stdout.flush()
+            run_phase('main', state, nsteps)
+
+        def to_scaled_chain(chain):
+            flatchain = chain.reshape(-1, ndim)
+            scaled_chain = np.full_like(flatchain, np.nan, dtype=FTYPE)
+            param_copy = ParamSet(hypo_maker.params.free)
+
+            for s, sample in enumerate(flatchain):
                 for dim, rescaled_val in enumerate(sample):
-                    param = param_copy_burnin[dim]
+                    param = param_copy[dim]
                     param._rescaled_value = rescaled_val
                     val = param.value.m
-                    scaled_chain_burnin[s, dim] = val
-
-        sampler.reset()
-        if self.pprint:
-            sys.stdout.write('Main sampling')
-            sys.stdout.flush()
-        sampler.run_mcmc(pos, nsteps, progress=self.pprint)
-
-        flatchain = sampler.flatchain
-        scaled_chain = np.full_like(flatchain, np.nan, dtype=FTYPE)
-        param_copy = ParamSet(hypo_maker.params.free)
-
-        for s, sample in enumerate(flatchain):
-            for dim, rescaled_val in enumerate(sample):
-                param = param_copy[dim]
-                param._rescaled_value = rescaled_val
-                val = param.value.m
-                scaled_chain[s, dim] = val
+                    scaled_chain[s, dim] = val
+            return scaled_chain
 
+        scaled_chain = to_scaled_chain(chains['main'])
         if return_burn_in:
-            return scaled_chain, scaled_chain_burnin
+            return scaled_chain, to_scaled_chain(chains['burnin'])
         else:
             return scaled_chain
 
@@ -3038,6 +3657,7 @@ class Analysis(BasicAnalysis):
         self._nit = 0
         self.pprint = True
         self.blindness = False
+        self._replica_pools = []
 
     def fit_hypo(self, data_dist, hypo_maker, metric, minimizer_settings,
                  hypo_param_selections=None, reset_free=True,
@@ -3257,24 +3877,20 @@ class Analysis(BasicAnalysis):
             else: # DistributionMaker object with MultiDimBinning
 
                 if 'generalized_poisson_llh' == metric[0]:
-                    raise NotImplementedError(
-                        "generalized_poisson_llh isn't correctly implemented any longer!"
-                    )
-                    # FIXME: these `output_mode` and `force_standard_output` kwargs were removed in
-                    # https://github.com/icecube/pisa/commit/7a4e875aa7bdc52ea64a5270e9808d866d1395f3
-                    hypo_asimov_dist = hypo_maker.get_outputs(return_sum=False, output_mode='binned', force_standard_output=False)
-                    hypo_asimov_dist = merge_mapsets_together(mapset_list=hypo_asimov_dist)
-                    data_dist = data_dist.maps[0] # Extract the map from the MapSet
-                    metric_kwargs = {'empty_bins':hypo_maker.empty_bin_indices}
+                    # Keep `data_dist` and `hypo_asimov_dist` for the detailed metric info
+                    expected_values, empty_bins = get_generalized_poisson_dist(hypo_maker)
+                    actual_values = data_dist.maps[0] # Extract the map from the MapSet
+                    metric_kwargs = {'empty_bins': empty_bins}
                 else:
                     hypo_asimov_dist = hypo_maker.get_outputs(return_sum=True)
                     if isinstance(hypo_asimov_dist, HypoFitResult):
                         hypo_asimov_dist = hypo_asimov_dist['weights']
+                    actual_values, expected_values = data_dist, hypo_asimov_dist
                     metric_kwargs = {}
 
                 metric_val = (
-                    data_dist.metric_total(expected_values=hypo_asimov_dist,
-                                           metric=metric[0], metric_kwargs=metric_kwargs)
+                    actual_values.metric_total(expected_values=expected_values,
+                                               metric=metric[0], metric_kwargs=metric_kwargs)
                     + hypo_maker.params.priors_penalty(metric=metric[0])
                 )
                 if external_priors_penalty is not None:
@@ -3297,38 +3913,34 @@ class Analysis(BasicAnalysis):
             # Okay, if blind analysis is being performed, reset the values so
             # the user can't find them in the object
             hypo_maker.reset_free()
-            fit_info.metric_val = ParamSet()
+            fit_info.params = ParamSet()
         else:
-            fit_info.metric_val = deepcopy(hypo_maker.params)
+            fit_info.params = deepcopy(hypo_maker.params)
+        fit_info.param_selections = hypo_maker.param_selections
         if hypo_maker.__class__.__name__ == "Detectors":
             fit_info.detailed_metric_info = [fit_info.get_detailed_metric_info(
                 data_dist=data_dist[i], hypo_asimov_dist=hypo_asimov_dist[i],
                 params=hypo_maker.distribution_makers[i].params, metric=metric[i],
-                other_metrics=other_metrics, detector_name=hypo_maker.det_names[i]
+                other_metrics=other_metrics, detector_name=hypo_maker.det_names[i],
+                hypo_maker=hypo_maker,
             ) for i in range(len(data_dist))]
         elif isinstance(data_dist, list): # DistributionMaker object with VarBinning
             fit_info.detailed_metric_info = [fit_info.get_detailed_metric_info(
                 data_dist=data_dist[i], hypo_asimov_dist=hypo_asimov_dist[i],
                 params=hypo_maker.params, metric=metric[0], other_metrics=other_metrics,
-                detector_name=hypo_maker.detector_name
+                detector_name=hypo_maker.detector_name, hypo_maker=hypo_maker,
             ) for i in range(len(data_dist))]
         else: # DistributionMaker object with MultiDimBinning
 
             if 'generalized_poisson_llh' == metric[0]:
-                raise NotImplementedError(
-                    "generalized_poisson_llh isn't correctly implemented any longer!"
-                )
-                # FIXME: these `output_mode` and `force_standard_output` kwargs were removed in
-                # https://github.com/icecube/pisa/commit/7a4e875aa7bdc52ea64a5270e9808d866d1395f3
-                generalized_poisson_dist = hypo_maker.get_outputs(return_sum=False, force_standard_output=False)
-                generalized_poisson_dist = merge_mapsets_together(mapset_list=generalized_poisson_dist)
+                generalized_poisson_dist, _ = get_generalized_poisson_dist(hypo_maker)
             else:
                 generalized_poisson_dist = None
 
             fit_info.detailed_metric_info = fit_info.get_detailed_metric_info(
                 data_dist=data_dist, hypo_asimov_dist=hypo_asimov_dist, generalized_poisson_hypo=generalized_poisson_dist,
                 params=hypo_maker.params, metric=metric[0], other_metrics=other_metrics,
-                detector_name=hypo_maker.detector_name
+                detector_name=hypo_maker.detector_name, hypo_maker=hypo_maker,
             )
 
         fit_info.minimizer_time = 0 * ureg.sec
@@ -3349,7 +3961,7 @@ class Analysis(BasicAnalysis):
     def scan(self, data_dist, hypo_maker, metric, hypo_param_selections=None,
              param_names=None, steps=None, values=None, only_points=None,
              outer=True, profile=True, minimizer_settings=None, outfile=None,
-             debug_mode=1, **kwargs):
+             debug_mode=1, num_workers=None, **kwargs):
         """Set hypo maker parameters named by `param_names` according to
         either values specified by `values` or number of steps specified by
         `steps`, and return the `metric` indicating how well the data
@@ -3461,6 +4073,14 @@ class Analysis(BasicAnalysis):
             detailed enough for some simple debugging (1). Any other value for
             `debug_mode` will be set to 2.
 
+        num_workers : None or int
+            If > 1, the scan points are distributed over this many worker
+            processes, each holding a replica of `hypo_maker` (see
+            `close_replica_pools`). Results are still returned (and written to
+            `outfile`, after every batch of `num_workers` points) in the order
+            of the scan points, and `hypo_maker` is left in the state of the
+            last point, as without workers.
+
         """
 
         if debug_mode not in (0, 1, 2):
@@ -3538,14 +4158,16 @@ class Analysis(BasicAnalysis):
 
         results = {'steps': {}, 'results': []}
         results['steps'] = {pname: [] for pname in param_names}
+        positions = []
         for i, pos in enumerate(loopfunc(*steplist)):
             if points_acc and i not in points_acc:
                 continue
+            positions.append(pos)
 
+        def set_point(point_idx):
             msg = ''
-            for (pname, val) in pos:
+            for (pname, val) in positions[point_idx]:
                 params[pname].value = val
-                results['steps'][pname].append(val)
                 if isinstance(val, float):
                     msg += '%s = %.2f '%(pname, val)
                 elif isinstance(val, ureg.Quantity):
@@ -3557,62 +4179,46 @@ class Analysis(BasicAnalysis):
             logging.info('Working on point ' + msg)
             hypo_maker.update_params(params)
 
-            # TODO: consistent treatment of hypo_param_selections and scanning
-            if not profile or not hypo_maker.params.free:
-                logging.info('Not optimizing since `profile` set to False or'
-                             ' no free parameters found...')
-                best_fit = self.nofit_hypo(
-                    data_dist=data_dist,
-                    hypo_maker=hypo_maker,
-                    hypo_param_selections=hypo_param_selections,
-                    hypo_asimov_dist=hypo_maker.get_outputs(return_sum=True),
-                    metric=metric,
-                    **{k: v for k,v in kwargs.items() if k not in ["pprint","reset_free","check_octant"]}
-                )
-            else:
-                logging.info('Starting optimization since `profile` requested.')
-                best_fit, _ = self.fit_hypo(
-                    data_dist=data_dist,
-                    hypo_maker=hypo_maker,
-                    hypo_param_selections=hypo_param_selections,
-                    metric=metric,
-                    minimizer_settings=minimizer_settings,
-                    **kwargs
-                )
-                # TODO: serialisation!
-                for k in best_fit.minimizer_metadata:
-                    if k in ['hess', 'hess_inv']:
-                        logging.debug("deleting %s", k)
-                        del best_fit.minimizer_metadata[k]
-
-            best_fit.metric_val = deepcopy(
-                best_fit.metric_val.serializable_state
-            )
-            if isinstance(best_fit.hypo_asimov_dist, Sequence):
-                best_fit.hypo_asimov_dist = [deepcopy(
-                    best_fit.hypo_asimov_dist[i].serializable_state
-                ) for i in range(len(best_fit.hypo_asimov_dist))]
-            else:
-                best_fit.hypo_asimov_dist = deepcopy(
-                    best_fit.hypo_asimov_dist.serializable_state
-                )
-
-            # decide which information to retain based on chosen debug mode
-            if debug_mode == 0 or debug_mode == 1:
-                try:
-                    del best_fit['fit_history']
-                    del best_fit.hypo_asimov_dist
-                except KeyError:
-                    pass
-
-            if debug_mode == 0:
-                # torch the woods!
-                try:
-                    del best_fit.minimizer_metadata
-                    del best_fit.minimizer_time
-                except KeyError:
-                    pass
+        point_kwargs = dict(
+            data_dist=data_dist, hypo_param_selections=hypo_param_selections,
+            metric=metric, profile=profile, minimizer_settings=minimizer_settings,
+            debug_mode=debug_mode, **kwargs
+        )
+        if num_workers is not None and num_workers > 1:
+            # The points are fit by replicas of `hypo_maker`, one batch at a
+            # time, such that intermediate results can still be stored
+            start_params = deepcopy(params)
+            num_points = len(positions)
+            batches = [range(i, min(i + num_workers, num_points))
+                       for i in range(0, num_points, num_workers)]
+
+            def fit_results():
+                for batch in batches:
+                    all_params = []
+                    for point_idx in batch:
+                        set_point(point_idx)
+                        all_params.append(deepcopy(params))
+                    _restore_params(hypo_maker, start_params)
+                    batch_results = self._map_on_replicas(
+                        hypo_maker, all_params, '_fit_scan_point',
+                        [point_kwargs] * len(all_params), num_workers
+                    )
+                    if batch[-1] == num_points - 1 and batch_results[-1].params:
+                        # leave `hypo_maker` at the last point (unless its
+                        # params are hidden by a blind fit), like a sequential
+                        # scan
+                        hypo_maker.select_params(hypo_param_selections)
+                        _restore_params(hypo_maker, batch_results[-1].params)
+                    yield from batch_results
+        else:
+            def fit_results():
+                for point_idx in range(len(positions)):
+                    set_point(point_idx)
+                    yield self._fit_scan_point(hypo_maker=hypo_maker, **point_kwargs)
 
+        for pos, best_fit in zip(positions, fit_results()):
+            for (pname, val) in pos:
+                results['steps'][pname].append(val)
             results['results'].append(best_fit)
             if outfile is not None:
                 # store intermediate results
@@ -3620,6 +4226,183 @@ class Analysis(BasicAnalysis):
 
         return results
 
+    def _fit_scan_point(self, data_dist, hypo_maker, hypo_param_selections,
+                        metric, profile, minimizer_settings, debug_mode,
+                        **kwargs):
+        """Fit (if `profile` is True) or evaluate `hypo_maker` at the current
+        point of a `scan`, and strip the result according to `debug_mode`."""
+        # TODO: consistent treatment of hypo_param_selections and scanning
+        if not profile or not hypo_maker.params.free:
+            logging.info('Not optimizing since `profile` set to False or'
+                         ' no free parameters found...')
+            best_fit = self.nofit_hypo(
+                data_dist=data_dist,
+                hypo_maker=hypo_maker,
+                hypo_param_selections=hypo_param_selections,
+                hypo_asimov_dist=hypo_maker.get_outputs(return_sum=True),
+                metric=metric,
+                **{k: v for k,v in kwargs.items() if k not in ["pprint","reset_free","check_octant"]}
+            )
+        else:
+            logging.info('Starting optimization since `profile` requested.')
+            best_fit, _ = self.fit_hypo(
+                data_dist=data_dist,
+                hypo_maker=hypo_maker,
+                hypo_param_selections=hypo_param_selections,
+                metric=metric,
+                minimizer_settings=minimizer_settings,
+                **kwargs
+            )
+            # TODO: serialisation!
+            for k in best_fit.minimizer_metadata:
+                if k in ['hess', 'hess_inv']:
+                    logging.debug("deleting %s", k)
+                    del best_fit.minimizer_metadata[k]
+
+        # decide which information to retain based on chosen debug mode (the
+        # attributes are part of the state of `best_fit`, so they are emptied
+        # instead of deleted)
+        if debug_mode == 0 or debug_mode == 1:
+            best_fit.fit_history = None
+            best_fit.hypo_asimov_dist = None
+
+        if debug_mode == 0:
+            # torch the woods!
+            best_fit.minimizer_metadata = None
+            best_fit.minimizer_time = None
+
+        return best_fit
+
+    def fit_trials(self, asimov_dist, hypo_maker, fit_settings, trials, outfile,
+                   seed=0, num_workers=None, batch_size=None):
+        """Fit the pseudo-data of many pseudo-experiments (trials) drawn from
+        a single expectation, e.g. for Feldman-Cousins style studies.
+
+        The pseudo-data of a batch of trials is drawn at once (see
+        `draw_pseudo_data`), the fits are distributed over a pool of worker
+        processes, each holding a replica of `hypo_maker`, and the results of
+        each batch are appended to a column-wise HDF5 file (see
+        `pisa.utils.hdf.append_columns`), which holds one row per trial with
+        the columns
+
+            * "trial" : index of the trial
+            * "<label>/metric_val" : best fit metric value
+            * "<label>/success" : whether the minimizer reported success
+            * "<label>/params/<name>" : best fit value of each free parameter
+              (in the parameter's units)
+            * "<label>/num_distributions_generated"
+            * "<label>/minimizer_time" : in seconds
+
+        for every fit `label`. Trials that are already in `outfile` are
+        skipped, such that an interrupted study can be continued by calling
+        this method again.
+
+        Parameters
+        ----------
+        asimov_dist : MapSet or sequence of MapSets
+            Expectation from which the pseudo-data is drawn
+
+        hypo_maker : Detectors or DistributionMaker
+            Generates the expectation distributions of the fits. Its
+            parameters are restored to their state at the time of calling
+            this method before every fit.
+
+        fit_settings : Mapping
+            Label -> keyword arguments of `fit_hypo` (apart from `data_dist`
+            and `hypo_maker`) of every fit to perform per trial, e.g. ..
+            ::
+
+                {
+                    "nh": dict(hypo_param_selections="nh", metric="mod_chi2",
+                               minimizer_settings=minimizer_settings),
+                    "ih": dict(hypo_param_selections="ih", metric="mod_chi2",
+                               minimizer_settings=minimizer_settings),
+                }
+
+            Live-updates of the minimizer progress are disabled unless
+            `pprint` is given.
+
+        trials : int or sequence of int
+            Indices of the trials, or their number (see `draw_pseudo_data`)
+
+        outfile : str
+            HDF5 file to store the results to
+
+        seed : int
+            Seed of the pseudo-data (see `draw_pseudo_data`). Must be the same
+            as for the trials already in `outfile`.
+
+        num_workers : None or int
+            If > 1, the trials are fit by this many worker processes (see
+            `ReplicaPool`). The results do not depend on the number of
+            workers.
+
+        batch_size : None or int
+            Number of trials per batch, i.e., between writes to `outfile`.
+            Defaults to ten trials per worker.
+
+        Returns
+        -------
+        results : OrderedDict
+            All columns in `outfile` (see `pisa.utils.hdf.from_hdf`)
+
+        """
+        if isinstance(trials, int):
+            trials = range(trials)
+        if batch_size is None:
+            batch_size = 10 * max(1, num_workers or 1)
+
+        done = set()
+        if os.path.isfile(outfile):
+            existing = from_hdf(outfile)
+            if existing.attrs.get('seed') != seed:
+                raise ValueError(
+                    f'Trials in "{outfile}" were drawn with seed'
+                    f' {existing.attrs.get("seed")}, not {seed}'
+                )
+            done = set(existing['trial'].tolist())
+        todo = [int(trial) for trial in trials if trial not in done]
+        logging.info(f'Fitting {len(todo)} trials ({len(done)} already in'
+                     f' "{outfile}")')
+
+        start_params = deepcopy(hypo_maker.params)
+
+        def fit_trial(task_arg):
+            trial, counts = task_arg
+            data_dist = pseudo_data_to_dist(counts, asimov_dist)
+            row = OrderedDict(trial=trial)
+            for label, fit_kwargs in fit_settings.items():
+                _restore_params(hypo_maker, start_params)
+                fit_kwargs = dict(fit_kwargs)
+                fit_kwargs.setdefault('pprint', False)
+                best_fit, _ = self.fit_hypo(
+                    data_dist=data_dist, hypo_maker=hypo_maker, **fit_kwargs
+                )
+                row[f'{label}/metric_val'] = best_fit.metric_val
+                row[f'{label}/success'] = bool(
+                    best_fit.minimizer_metadata.get('success', True)
+                )
+                for param in best_fit.params.free:
+                    row[f'{label}/params/{param.name}'] = param.value.m
+                row[f'{label}/num_distributions_generated'] = (
+                    best_fit.num_distributions_generated
+                )
+                row[f'{label}/minimizer_time'] = best_fit.minimizer_time.m_as('s')
+            return row
+
+        with ReplicaPool(fit_trial, num_workers=num_workers) as pool:
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                counts = draw_pseudo_data(asimov_dist, batch, seed=seed)
+                rows = pool.map(list(zip(batch, counts)))
+                num_rows = append_columns(
+                    {name: [row[name] for row in rows] for name in rows[0]},
+                    outfile, attrs={'seed': seed}
+                )
+                logging.info(f'{num_rows} trials in "{outfile}"')
+
+        return from_hdf(outfile)
+
 def test_basic_analysis(pprint=False):
     """Test recursive fit strategies with BasicAnalysis."""
 
@@ -3931,6 +4714,36 @@ def test_basic_analysis(pprint=False):
         if p.nominal_value is not None:
             assert p.nominal_value == original_nom_vals[p.name], msg
 
+    # Fitting the grid points in worker processes must give the same results, in
+    # the same order, as fitting them one after the other
+    grid_scan["method_kwargs"]["refined_fit"] = None
+    dm.reset_free()
+    seq_fit_info = ana.fit_recursively(data_dist, dm, "chi2", None, **grid_scan)
+    grid_scan["method_kwargs"]["num_workers"] = 2
+    dm.reset_free()
+    par_fit_info = ana.fit_recursively(data_dist, dm, "chi2", None, **grid_scan)
+    assert par_fit_info.metric_val == seq_fit_info.metric_val
+    assert par_fit_info.params == seq_fit_info.params
+    assert dm.params == par_fit_info.params
+
+    # The same holds for the octants, which are fit by the replicas forked for
+    # the grid scan above
+    octants = OrderedDict(
+        method="octants",
+        method_kwargs={"angle": "theta23", "inflection_point": 45 * ureg.deg},
+        local_fit_kwargs=local_simplex,
+    )
+    dm.reset_free()
+    seq_fit_info = ana.fit_recursively(data_dist, dm, "chi2", None, **octants)
+    octants["method_kwargs"]["num_workers"] = 2
+    dm.reset_free()
+    par_fit_info = ana.fit_recursively(data_dist, dm, "chi2", None, **octants)
+    assert par_fit_info.metric_val == seq_fit_info.metric_val
+    assert par_fit_info.params == seq_fit_info.params
+    assert dm.params == par_fit_info.params
+    assert len(ana._replica_pools) == 1 # pylint: disable=protected-access
+    ana.close_replica_pools()
+
     logging.info('<< PASS : test_basic_analysis >>')
 
 
@@ -4287,8 +5100,277 @@ def test_global_scipy_minimization(pprint=False):
     logging.info('<< PASS : test_global_scipy_minimization >>')
 
 
+def test_finite_diff_gradient(pprint=False):
+    """Test `FiniteDiffGradient` on an analytic function and use it in fits with
+    gradient-based minimizers."""
+    from pisa.core.distribution_maker import DistributionMaker
+
+    weights = np.array([1., 30., 500., 2.])
+    minimum = np.array([0.3, 1., 0., 0.6])
+    def func(x):
+        return np.sum(weights*(x - minimum)**2) + np.sum(np.sin(5*x))
+    def grad(x):
+        return 2*weights*(x - minimum) + 5*np.cos(5*x)
+
+    for num_workers in (None, 2):
+        with FiniteDiffGradient(func, 4, num_workers=num_workers) as gradient:
+            # includes points at and close to the bounds
+            for x in ([0.2, 0.99999, 0.00002, 0.5], [0.5, 1., 0., 0.5]):
+                x = np.array(x)
+                assert np.allclose(gradient.gradient(x), grad(x), atol=1e-5)
+                assert np.allclose(gradient.gradient(x, func(x)), grad(x), atol=1e-5)
+        assert gradient.num_evals == 2*(9 + 8)
+
+    dm = DistributionMaker('settings/pipeline/fast_example.cfg')
+    dm.select_params('nh')
+    data_dist = dm.get_outputs(return_sum=True)
+
+    ana = BasicAnalysis()
+    ana.pprint = pprint
+    fits = [
+        OrderedDict(
+            method="scipy",
+            method_kwargs={
+                "method": {"value": "l-bfgs-b", "desc": ""},
+                "options": {"value": {"ftol": 1e-10}, "desc": {}},
+                "gradient": {"value": {"num_workers": 2}, "desc": ""},
+            },
+            local_fit_kwargs=None
+        ),
+        OrderedDict(
+            method="nlopt",
+            method_kwargs={"algorithm": "NLOPT_LD_LBFGS", "ftol_rel": 1e-10},
+            local_fit_kwargs=None
+        ),
+        OrderedDict(
+            method="iminuit",
+            method_kwargs={"gradient": {"num_workers": 2}},
+            local_fit_kwargs=None
+        ),
+    ]
+    for fit in fits:
+        dm.reset_free()
+        dm.params.aeff_scale.value = 1.1
+        dm.params.theta23.value = 47 * ureg.deg
+        best_fit = ana.fit_recursively(data_dist, dm, "chi2", None, **fit)
+        assert best_fit.minimizer_metadata["success"], fit["method"]
+        # data is the Asimov distribution of the true params
+        assert best_fit.metric_val < 1e-3, (fit["method"], best_fit.metric_val)
+        logging.info(f'{fit["method"]}: {best_fit.metric_val:.3e} after'
+                     f' {best_fit.num_distributions_generated} distributions')
+
+    logging.info('<< PASS : test_finite_diff_gradient >>')
+
+
+def test_fit_trials(pprint=False):
+    """Test drawing pseudo-data of many trials at once and fitting them."""
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from pisa.core.distribution_maker import DistributionMaker
+
+    dm = DistributionMaker('settings/pipeline/fast_example.cfg')
+    dm.select_params('nh')
+    asimov_dist = dm.get_outputs(return_sum=True)
+
+    # every trial can be reproduced on its own
+    counts = draw_pseudo_data(asimov_dist, [3, 7], seed=5)
+    assert counts.shape == (2, sum(m.hist.size for m in asimov_dist))
+    assert np.array_equal(draw_pseudo_data(asimov_dist, 8, seed=5)[[3, 7]], counts)
+    fluctuated = asimov_dist.fluctuate(method='poisson', random_state=[5, 7])
+    assert pseudo_data_to_dist(counts[1], asimov_dist) == fluctuated
+
+    # only fit one parameter, to save time
+    dm.params.fix(['theta23', 'delta_index'])
+    fit_settings = {
+        'nh': dict(
+            hypo_param_selections='nh', metric='mod_chi2', check_octant=False,
+            minimizer_settings=from_file(
+                'settings/minimizer/l-bfgs-b_ftol2e-5_gtol1e-5_eps1e-4_maxiter200.json'
+            ),
+            pprint=pprint,
+        )
+    }
+    ana = Analysis()
+    temp_dir = mkdtemp()
+    try:
+        outfile = os.path.join(temp_dir, 'trials.hdf5')
+        ana.fit_trials(asimov_dist, dm, fit_settings, 3, outfile, seed=2,
+                       num_workers=2, batch_size=2)
+        # continue with one more trial
+        results = ana.fit_trials(asimov_dist, dm, fit_settings, 4, outfile,
+                                 seed=2, num_workers=2, batch_size=2)
+        assert np.array_equal(results['trial'], np.arange(4))
+        assert results['nh']['success'].dtype == bool
+        assert np.all(np.isfinite(results['nh']['metric_val']))
+        assert results['nh']['params']['aeff_scale'].shape == (4,)
+
+        # results don't depend on the number of workers
+        serial_results = ana.fit_trials(
+            asimov_dist, dm, fit_settings, [2], os.path.join(temp_dir, 'serial.hdf5'),
+            seed=2
+        )
+        assert serial_results['nh']['metric_val'][0] == results['nh']['metric_val'][2]
+
+        try:
+            ana.fit_trials(asimov_dist, dm, fit_settings, 5, outfile, seed=6)
+        except ValueError:
+            pass
+        else:
+            assert False
+    finally:
+        rmtree(temp_dir)
+
+    logging.info('<< PASS : test_fit_trials >>')
+
+
+def test_generalized_poisson_fit(pprint=False):
+    """Test fitting with the `generalized_poisson_llh` metric end to end,
+    including the shortcut taken if the initial hypo matches the data."""
+    from pisa.core.distribution_maker import DistributionMaker
+
+    # the toy events are drawn with the global numpy random state
+    np.random.seed(0)
+    dm = DistributionMaker('pisa/stages/data/super_simple_pipeline.cfg')
+    dm.params.mu.range = (10 * ureg.dimensionless, 30 * ureg.dimensionless)
+    asimov_dist = dm.get_outputs(return_sum=True)
+    generalized_poisson_dist, empty_bins = get_generalized_poisson_dist(dm)
+
+    def metric_at_nominal(data_dist):
+        return data_dist.maps[0].metric_total(
+            expected_values=generalized_poisson_dist,
+            metric='generalized_poisson_llh',
+            metric_kwargs={'empty_bins': empty_bins},
+        )
+
+    fit_kwargs = dict(
+        metric='generalized_poisson_llh', check_octant=False, pprint=pprint,
+        minimizer_settings=from_file(
+            'settings/minimizer/l-bfgs-b_ftol2e-9_gtol1e-5_eps1e-7_maxiter200.json'
+        ),
+    )
+    ana = Analysis()
+
+    # nothing to fit on the Asimov data
+    best_fit, _ = ana.fit_hypo(asimov_dist, dm, **fit_kwargs)
+    assert best_fit.minimizer_metadata['nit'] == 0
+    assert np.isclose(best_fit.metric_val, metric_at_nominal(asimov_dist))
+
+    # the llh is maximised on fluctuated data
+    data_dist = asimov_dist.fluctuate(method='poisson', random_state=0)
+    best_fit, _ = ana.fit_hypo(data_dist, dm, **fit_kwargs)
+    assert best_fit.minimizer_metadata['success']
+    assert best_fit.num_distributions_generated > 0
+    assert best_fit.metric_val >= metric_at_nominal(data_dist)
+    assert abs(best_fit.params.mu.value.m - 20) < 1
+
+    logging.info('<< PASS : test_generalized_poisson_fit >>')
+
+
+def test_scan(pprint=False):
+    """Test that a scan distributed over worker processes gives the same
+    results, and leaves the hypo maker in the same state, as a sequential
+    scan, with and without profiling."""
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from pisa.core.distribution_maker import DistributionMaker
+
+    dm = DistributionMaker('settings/pipeline/fast_example.cfg')
+    dm.select_params('nh')
+    data_dist = dm.get_outputs(return_sum=True)
+    minimizer_settings = {
+        "method": {"value": "L-BFGS-B", "desc": ""},
+        "options": {"value": {"ftol": 1e-1, "eps": 1e-6}, "desc": {}},
+    }
+
+    ana = Analysis()
+    ana.pprint = pprint
+    temp_dir = mkdtemp()
+    try:
+        for profile in (False, True):
+            results = []
+            for num_workers in (None, 2):
+                dm.params.unfix('theta23')
+                dm.reset_free()
+                outfile = os.path.join(temp_dir, f'scan_{num_workers}.json')
+                scan = ana.scan(
+                    data_dist, dm, 'chi2', hypo_param_selections='nh',
+                    param_names='theta23', values=[[40., 45., 50.] * ureg.deg],
+                    profile=profile, minimizer_settings=minimizer_settings,
+                    outfile=outfile, num_workers=num_workers, pprint=pprint,
+                    check_octant=False,
+                )
+                assert os.path.isfile(outfile)
+                results.append(
+                    ([fit.metric_val for fit in scan['results']], dm.params)
+                )
+            (seq_vals, seq_params), (par_vals, par_params) = results
+            assert len(seq_vals) == 3
+            assert par_vals == seq_vals, (profile, seq_vals, par_vals)
+            assert par_params == seq_params, profile
+    finally:
+        rmtree(temp_dir)
+        ana.close_replica_pools()
+
+    logging.info('<< PASS : test_scan >>')
+
+
+def test_mcmc_sampling(pprint=False):
+    """Test that MCMC sampling interrupted after a checkpoint and resumed
+    gives the same chain as uninterrupted sampling, irrespective of the
+    number of workers."""
+    try:
+        import emcee # pylint: disable=unused-import
+    except ImportError:
+        logging.warning('emcee not installed, skipping test_mcmc_sampling')
+        return
+    from shutil import rmtree
+    from tempfile import mkdtemp
+    from pisa.core.distribution_maker import DistributionMaker
+
+    dm = DistributionMaker('settings/pipeline/fast_example.cfg')
+    dm.select_params('nh')
+    data_dist = dm.get_outputs(return_sum=True)
+    # only sample one parameter, to save time
+    dm.params.fix(['theta23', 'delta_index'])
+
+    ana = Analysis()
+    ana.pprint = pprint
+    kwargs = dict(
+        data_dist=data_dist, hypo_maker=dm, metric='llh', nwalkers=4,
+        burnin=3, random_state=0, return_burn_in=True,
+    )
+    chain, chain_burnin = ana.MCMC_sampling(nsteps=5, **kwargs)
+    assert chain.shape == (5 * 4, 1)
+    assert chain_burnin.shape == (3 * 4, 1)
+
+    temp_dir = mkdtemp()
+    try:
+        for num_workers in (None, 2):
+            checkpoint_file = os.path.join(temp_dir, f'chain_{num_workers}.pckl')
+            # interrupted after the second checkpoint of the main sampling
+            ana.MCMC_sampling(nsteps=4, num_workers=num_workers,
+                              checkpoint_file=checkpoint_file,
+                              checkpoint_interval=2, **kwargs)
+            resumed, resumed_burnin = ana.MCMC_sampling(
+                nsteps=5, num_workers=num_workers,
+                checkpoint_file=checkpoint_file, checkpoint_interval=2,
+                **kwargs
+            )
+            assert np.array_equal(resumed, chain), num_workers
+            assert np.array_equal(resumed_burnin, chain_burnin), num_workers
+    finally:
+        rmtree(temp_dir)
+
+    logging.info('<< PASS : test_mcmc_sampling >>')
+
+
 if __name__ == "__main__":
     set_verbosity(1)
     test_basic_analysis(pprint=True)
     test_constrained_minimization(pprint=True)
     test_global_scipy_minimization(pprint=True)
+    test_finite_diff_gradient(pprint=True)
+    test_fit_trials(pprint=True)
+    test_generalized_poisson_fit(pprint=True)
+    test_scan(pprint=True)
+    test_mcmc_sampling(pprint=True)
@@ -9,15 +9,16 @@ from __future__ import absolute_import, print_function
 
 from collections.abc import Sequence
 from collections import defaultdict
+import timeit
 
 import numpy as np
-import re
 
 from pisa import FTYPE
 from pisa.core.binning import OneDimBinning, MultiDimBinning
 from pisa.core.map import Map, MapSet
-from pisa.core.translation import histogram, lookup, resample
+from pisa.core.translation import BinIndices, histogram, lookup, resample
 from pisa.utils.comparisons import ALLCLOSE_KW
+from pisa.utils.cuts import get_cut_expression
 from pisa.utils.log import logging
 
 
@@ -82,6 +83,19 @@ class ContainerSet():
     def names(self):
         return [c.name for c in self.containers]
 
+    @property
+    def num_replicas(self):
+        '''Number of replicas held by the containers (see
+        `Container.num_replicas`), or None if none of them holds any'''
+        nums = set(c.num_replicas for c in self.containers) - {None}
+        if len(nums) == 0:
+            return None
+        if len(nums) > 1:
+            raise ValueError(
+                f'Containers hold different numbers of replicas: {sorted(nums)}'
+            )
+        return nums.pop()
+
     def get_shared_keys(self, rep_indep=True):
         """
         Get a tuple of all keys shared among contained containers.
@@ -153,7 +167,7 @@ class ContainerSet():
         containers_to_be_iterated = [c for c in self.containers if not c.linked] + self.linked_containers
         return iter(containers_to_be_iterated)
 
-    def get_mapset(self, key, error=None):
+    def get_mapset(self, key, error=None, fast=False, replica=None):
         """For a given key, get a MapSet
 
         Parameters
@@ -163,6 +177,13 @@ class ContainerSet():
         error : None or str
             specify a key that errors are read from
 
+        fast : bool
+            create fast maps (see `pisa.core.map.Map`)
+
+        replica : None or int
+            index of the replica to get the maps of (see
+            `Container.get_map`)
+
         Returns
         -------
         map_set : MapSet
@@ -170,7 +191,9 @@ class ContainerSet():
         """
         maps = []
         for container in self:
-            maps.append(container.get_map(key, error=error))
+            maps.append(
+                container.get_map(key, error=error, fast=fast, replica=replica)
+            )
         return MapSet(name=self.name, maps=maps)
 
 
@@ -183,7 +206,10 @@ class VirtualContainer():
     For reading, it just uses one container as a representative
     (no checking at the moment if the others actually contain the same data)
 
-    For writing, it creates one object that is added to all containers
+    For writing, it creates one object that is shared by all containers,
+    without copying. Outside of the link, the shared arrays are read-only and
+    they are copied (once) only if written to by a different set of linked
+    containers
 
     Parameters
     ----------
@@ -204,12 +230,13 @@ class VirtualContainer():
                 )
             container.linked = True
         self.containers = containers
+        self._names = frozenset(c.name for c in containers)
 
     def __repr__(self):
         return f'VirtualContainer containing {[c.name for c in self]}'
 
     def unlink(self):
-        '''Reset link flag and copy all accessed keys'''
+        '''Reset link flag'''
         # reset flag
         for container in self:
             container.linked = False
@@ -219,11 +246,24 @@ class VirtualContainer():
 
     def __getitem__(self, key):
         # should we check they're all the same?
-        return self.containers[0][key]
+        data = self.containers[0][key]
+        shared_with = self.containers[0].shared_with(key)
+        if shared_with is not None and not shared_with <= self._names:
+            # copy-on-write: the array is also used by containers outside of
+            # this link, which must not see what is written to it from here
+            data = np.copy(data)
+            self._share(key, data)
+        return data
 
     def __setitem__(self, key, value):
+        self.containers[0][key] = value
+        self._share(key, self.containers[0][key])
+        for container in self.containers[1:]:
+            container.mark_changed(key)
+
+    def _share(self, key, data):
         for container in self:
-            container[key] = value
+            container.share(key, data, self._names)
 
     def set_aux_data(self, key, val):
         '''See `Container.set_aux_data`'''
@@ -231,10 +271,9 @@ class VirtualContainer():
             container.set_aux_data(key, val)
 
     def mark_changed(self, key):
-        '''Copy data under this key from representative container into
+        '''Share data under this key from representative container with
         all others and then mark all as changed (see `Container.mark_changed`)'''
-        for container in self.containers[1:]:
-            container[key] = np.copy(self.containers[0][key])
+        self._share(key, self[key])
         for container in self:
             container.mark_changed(key)
 
@@ -260,6 +299,14 @@ class VirtualContainer():
     def size(self):
         return np.product(self.shape)
 
+    @property
+    def num_replicas(self):
+        return self.containers[0].num_replicas
+
+    def get_replica_weights(self):
+        '''See `Container.get_replica_weights`'''
+        return self.containers[0].get_replica_weights()
+
 
 class Container():
     """
@@ -274,16 +321,40 @@ class Container():
     representation : hashable object, e.g. str or MultiDimBinning
         Representation in which to initialize the container
 
+    Notes
+    -----
+    A container can hold an ensemble of replicas of its events (e.g.
+    bootstrap samples or k-folds), given by per-event factors of shape
+    (events, replicas) under the key `replica_weights_key` in the "events"
+    representation. The per-event weights themselves remain shared by all
+    replicas; only when the `replicated_keys` are histogrammed do they get
+    multiplied by the factors, resulting in binned data with a trailing
+    replica axis, i.e. of shape (bins, replicas).
+
     """
 
     default_translation_mode = "average"
     translation_modes = ("average", "sum")
     array_representations = ("events", "log_events")
 
+    # Per-event factors defining replicas of the events, and the keys they
+    # are applied to when histogrammed
+    replica_weights_key = "replica_weights"
+    replicated_keys = ("weights",)
+
+    # Unrolled bin centers, shared by all containers
+    # dict of form [binning_hash] -> tuple of read-only arrays (per dimension)
+    _unrolled_binnings = {}
+    _max_unrolled_binnings = 32
+
+    # Maximum number of representation objects remembered for fast switching
+    _max_representation_objects = 64
 
     def __init__(self, name, representation='events'):
         self.name = name
         self._representation = None
+        self._representation_id = None
+        self._is_map = False
 
         self.linked = False
 
@@ -292,7 +363,7 @@ class Container():
         self._aux_data = {}
 
         # validity bit
-        # dict of form [variable][representation_hash]
+        # dict of form [variable][representation_id]
         self.validity = defaultdict(dict)
 
         # translation mode
@@ -300,17 +371,42 @@ class Container():
         self.tranlation_modes = {}
 
         # Actual data
-        # dict of form [representation_hash][variable]
+        # dict of form [representation_id][variable]
         self.data = defaultdict(dict)
 
         # Representation objects
-        # dict of form [representation_hash]
+        # dict of form [representation_id]
         self._representations = {}
 
-        # Precedence of representation (lower number = higher precedence)
+        # IDs of representations, assigned in order of first use
         # dict of form [representation_hash]
+        self._representation_ids = {}
+
+        # IDs of the representation objects that have been used, to switch
+        # without hashing
+        # dict of form [id(representation)] -> (representation, representation_id)
+        self._representation_objects = {}
+
+        # Precedence of representation (lower number = higher precedence)
+        # dict of form [representation_id]
         self.precedence = defaultdict(int)
 
+        # Number of times a variable has been changed
+        # dict of form [variable]
+        self.versions = defaultdict(int)
+
+        # Bin indices of events, valid as long as versions are unchanged
+        # dict of form [(binning_hash, sample_keys)] -> (versions, BinIndices)
+        self._bin_indices = {}
+
+        # Masks of cut expressions, valid as long as versions are unchanged
+        # dict of form [(keep_criteria, representation_id)] -> (versions, mask)
+        self._keep_masks = {}
+
+        # Names of the linked containers sharing an array with this one
+        # dict of form [representation_id][variable] -> frozenset of names
+        self._shared = defaultdict(dict)
+
         self.representation = representation
 
     def __repr__(self):
@@ -331,18 +427,55 @@ class Container():
     
     @representation.setter
     def representation(self, representation):
-        key = hash(representation)
-        if not key in self.representation_keys:
+        key = self.get_representation_id(representation, register=True)
+        self._representation = representation
+        self._representation_id = key
+        self._is_map = isinstance(representation, MultiDimBinning)
+        self.current_data = self.data[key]
+        self.current_shared = self._shared[key]
+
+    def get_representation_id(self, representation, register=False):
+        '''Small integer ID of `representation` in this container, which is
+        the key of its data. Representation objects that have been used
+        before are found without hashing them.
+
+        Parameters
+        ----------
+        representation : str, MultiDimBinning or any hashable object
+        register : bool
+            Register the representation if it is unknown (otherwise, a
+            KeyError is raised)
+
+        Returns
+        -------
+        representation_id : int
+
+        '''
+        obj_id = id(representation)
+        known = self._representation_objects.get(obj_id)
+        if known is not None and known[0] is representation:
+            return known[1]
+
+        representation_hash = hash(representation)
+        key = self._representation_ids.get(representation_hash)
+        if key is None:
+            if not register:
+                raise KeyError(f'Unknown representation {representation}')
+            if isinstance(representation, str):
+                if representation not in self.array_representations:
+                    raise ValueError(f"Unknown representation '{representation}'")
+            key = len(self._representation_ids)
+            self._representation_ids[representation_hash] = key
             self._representations[key] = representation
             if isinstance(representation, MultiDimBinning):
                 for name in representation.names:
                     self.validity[name][key] = True
-            elif isinstance(representation, str):
-                if representation not in self.array_representations:
-                    raise ValueError(f"Unknown representation '{representation}'")
-            
-        self._representation = representation
-        self.current_data = self.data[key]
+
+        if len(self._representation_objects) >= self._max_representation_objects:
+            self._representation_objects.clear()
+        # keep a reference, such that the object id cannot be reused
+        self._representation_objects[obj_id] = (representation, key)
+        return key
         
     @property
     def shape(self):
@@ -362,6 +495,27 @@ class Container():
         if self.is_map:
             return self.representation.num_dims
         return 1
+
+    @property
+    def num_replicas(self):
+        '''Number of replicas of the events held by the container (i.e.
+        the length of the trailing replica axis of histogrammed weights), or
+        None if the container doesn't hold any'''
+        replica_weights = self.get_replica_weights()
+        if replica_weights is None:
+            return None
+        return replica_weights.shape[1]
+
+    def get_replica_weights(self):
+        '''Per-event factors of shape (events, replicas) defining the
+        replicas, or None if the container doesn't hold any'''
+        if not self.replica_weights_key in self.validity:
+            return None
+        representation = self.representation
+        self.representation = "events"
+        replica_weights = self[self.replica_weights_key]
+        self.representation = representation
+        return replica_weights
     
     @property
     def representations(self):
@@ -396,10 +550,11 @@ class Container():
     @property
     def is_map(self):
         '''Is current representation a map/grid'''
-        return isinstance(self.representation, MultiDimBinning)
+        return self._is_map
         
     def mark_changed(self, key):
         '''mark a key as changed and only what is in the current representation is valid'''
+        self.versions[key] += 1
         # invalidate all
         for rep in self.validity[key]:
             self.validity[key][rep] = False
@@ -407,12 +562,30 @@ class Container():
         if key in self.current_data.keys():
             self.mark_valid(key)
 
+    def share(self, key, data, names):
+        '''Hold the array `data` under `key` in the current representation
+        without copying, sharing it with the (linked) containers `names`.
+        Use `mark_changed` afterwards if the data changed.'''
+        self.current_data[key] = data
+        self.current_shared[key] = names
+        if not key in self.tranlation_modes.keys():
+            self.tranlation_modes[key] = self.default_translation_mode
+
+    def shared_with(self, key):
+        '''Names of the containers sharing the array under `key` in the
+        current representation, or None if the array is not shared'''
+        return self.current_shared.get(key)
+
     def mark_valid(self, key):
         '''validate data as is in current representation, regardless'''
-        self.validity[key][hash(self.representation)] = True
+        self.validity[key][self._representation_id] = True
         
     def __getitem__(self, key):
-        data = self.__get_data(key)        
+        data = self.__get_data(key)
+        if not self.linked and key in self.current_shared:
+            # only the linked containers may write to a shared array
+            data = data.view()
+            data.flags.writeable = False
         return data
     
     def __setitem__(self, key, data):
@@ -422,6 +595,7 @@ class Container():
                 raise Exception(f'Cannot add variable {key}, as it is a binning dimension')
         
         self.__add_data(key, data)                
+        self.current_shared.pop(key, None)
         if not key in self.tranlation_modes.keys():
             self.tranlation_modes[key] = self.default_translation_mode
         
@@ -486,7 +660,7 @@ class Container():
             if key in binning.names:
                 return self.unroll_binning(key, binning)
         # check validity
-        if not key in self.keys:
+        if not key in self.current_data:
             if key in self.all_keys:
                 self.auto_translate(key)
                 #raise KeyError(f'Data {key} not present in chosen representation')
@@ -495,7 +669,7 @@ class Container():
                     return self._aux_data[key]
                 raise KeyError(f'Data {key} not present in Container')
         
-        valid = self.validity[key][hash(self.representation)]
+        valid = self.validity[key][self._representation_id]
         if not valid:
             self.auto_translate(key)
             #raise ValueError('Invalid data as it was changed in a different representation!')
@@ -503,11 +677,22 @@ class Container():
 
         return self.current_data[key]
     
-    @staticmethod
-    def unroll_binning(key, binning):
-        '''Get an Array containing the unrolled binning'''
-        grid = binning.meshgrid(entity='weighted_centers', attach_units=False)
-        return grid[binning.index(key)].ravel()
+    @classmethod
+    def unroll_binning(cls, key, binning):
+        '''Get a (read-only) array containing the unrolled binning, which is
+        only computed once per binning'''
+        binning_hash = hash(binning)
+        unrolled = cls._unrolled_binnings.get(binning_hash)
+        if unrolled is None:
+            grid = binning.meshgrid(entity='weighted_centers', attach_units=False)
+            unrolled = tuple(g.ravel() for g in grid)
+            for array in unrolled:
+                array.flags.writeable = False
+            if len(cls._unrolled_binnings) >= cls._max_unrolled_binnings:
+                # drop the oldest entry
+                del cls._unrolled_binnings[next(iter(cls._unrolled_binnings))]
+            cls._unrolled_binnings[binning_hash] = unrolled
+        return unrolled[binning.index(key)]
 
     
     def get_hist(self, key):
@@ -519,22 +704,34 @@ class Container():
 
         binning = self.representation
         data = self[key]
-        if data.ndim > binning.num_dims:
+        # data is stored with the binning dimensions unrolled
+        if data.ndim > 1:
             full_shape = list(binning.shape) + [-1] 
         else:
             full_shape = list(binning.shape)
             
         return data.reshape(full_shape), binning
 
-    def get_map(self, key, error=None):
-        """Return binned data in the form of a PISA map"""
+    def get_map(self, key, error=None, fast=False, replica=None):
+        """Return binned data in the form of a PISA map
+
+        If `replica` is given and the data has a trailing replica axis (see
+        `num_replicas`), the map of that replica is returned; data without
+        replica axis is the same for all replicas.
+        """
         hist, binning = self.get_hist(key)
         if error is not None:
             error_hist = np.abs(self.get_hist(error)[0])
         else:
             error_hist = None
+        if replica is not None:
+            if hist.ndim > binning.num_dims:
+                hist = hist[..., replica]
+            if error_hist is not None and error_hist.ndim > binning.num_dims:
+                error_hist = error_hist[..., replica]
         assert hist.ndim == binning.num_dims
-        return Map(name=self.name, hist=hist, error_hist=error_hist, binning=binning)
+        return Map(name=self.name, hist=hist, error_hist=error_hist, binning=binning,
+                   fast=fast)
     
     def __iter__(self):
         """iterate over all keys in container"""
@@ -548,11 +745,11 @@ class Container():
         
         '''
         
-        assert hash(src_representation) in self.representation_keys
+        src_id = self.get_representation_id(src_representation)
         
         dest_representation = self.representation
 
-        if hash(src_representation) == hash(dest_representation):
+        if src_id == self._representation_id:
             # nothing to do
             return    
     
@@ -607,7 +804,7 @@ class Container():
             raise NotImplementedError()
             
         # validate source!
-        self.validity[key][hash(src_representation)] = True
+        self.validity[key][src_id] = True
 
         
     def auto_translate(self, key):
@@ -668,6 +865,9 @@ class Container():
         Notes
         -----
         right now, CPU-only
+
+        For the `replicated_keys`, the result has a trailing replica axis if
+        the container holds replicas (see `num_replicas`)
         """
         # TODO: make work for n-dim
         logging.trace('Transforming %s array to binned data'%(key))
@@ -676,33 +876,78 @@ class Container():
         assert isinstance(dest_representation, MultiDimBinning)
         
         if not dest_representation.is_irregular:
-            sample = []
+            sample_keys = []
             dimensions = []
             for d in dest_representation:
                 if d.is_log:
-                    self.representation = "log_events"
-                    sample.append(self[d.name])
+                    sample_keys.append(("log_events", d.name))
                     dimensions.append(OneDimBinning(
                         d.name,
                         domain=np.log(d.domain.m),
                         num_bins=d.num_bins
                     ))
                 else:
-                    self.representation = "events"
-                    sample.append(self[d.name])
+                    sample_keys.append(("events", d.name))
                     dimensions.append(d)
             hist_binning = MultiDimBinning(dimensions)
         else:
-            self.representation = src_representation
-            sample = [self[name] for name in dest_representation.names]
+            sample_keys = [(src_representation, name) for name in dest_representation.names]
             hist_binning = dest_representation
 
+        bin_indices = self.get_bin_indices(sample_keys, hist_binning)
+
         self.representation = src_representation
         weights = self[key]
+        if key in self.replicated_keys:
+            replica_weights = self.get_replica_weights()
+            if replica_weights is not None:
+                # histogram all replicas at once
+                weights = weights[:, np.newaxis] * replica_weights
         self.representation = dest_representation
-        hist = histogram(sample, weights, hist_binning, averaged=averaged)
+        hist = histogram(None, weights, hist_binning, averaged=averaged,
+                         bin_indices=bin_indices)
         return hist
 
+    def get_bin_indices(self, sample_keys, binning):
+        """Bin indices of the events w.r.t. `binning`, which are only
+        recomputed if any of the sample variables has changed since the last
+        call
+
+        Changes are tracked via `versions`, i.e. a stage that overwrites one of
+        the sample variables in place has to call `mark_changed` on it.
+
+        Parameters
+        ----------
+        sample_keys : sequence of (representation, key) tuples
+            Representation and name of the variable to use as sample for each
+            dimension of `binning`
+        binning : MultiDimBinning
+
+        Returns
+        -------
+        bin_indices : BinIndices
+
+        """
+        # retrieve sample first, as a translation (e.g. into "log_events")
+        # changes the variable
+        representation = self.representation
+        sample = []
+        for rep, name in sample_keys:
+            self.representation = rep
+            sample.append(self[name])
+        self.representation = representation
+
+        cache_key = (hash(binning), tuple(sample_keys))
+        versions = tuple(self.versions[name] for _, name in sample_keys)
+        if cache_key in self._bin_indices:
+            cached_versions, bin_indices = self._bin_indices[cache_key]
+            if cached_versions == versions:
+                return bin_indices
+
+        bin_indices = BinIndices(sample, binning)
+        self._bin_indices[cache_key] = (versions, bin_indices)
+        return bin_indices
+
     def binned_to_array(self, key, src_representation, dest_representation):
         """Augmented binned data to array data"""
 
@@ -740,6 +985,11 @@ class Container():
     def get_keep_mask(self, keep_criteria):
         """Returns a mask that only keeps the events that survive the given cut(s).
 
+        The mask is only re-evaluated if any of the variables in the cut has
+        changed since the last call, and is therefore read-only. As with
+        `get_bin_indices`, changes are tracked via `versions`, so a variable
+        overwritten in place has to be flagged with `mark_changed`.
+
         Parameters
         ----------
         keep_criteria : str
@@ -755,14 +1005,22 @@ class Container():
         """
         assert isinstance(keep_criteria, str)
 
-        for var in self.keys:
-            # using word boundary \b to replace whole words only
-            keep_criteria = re.sub(
-                r'\b{}\b'.format(var),
-                'self["%s"]'%(var),
-                keep_criteria
-            )
-        return eval(keep_criteria)  # pylint: disable=eval-used
+        cut = get_cut_expression(keep_criteria)
+        keys = set(self.keys) | set(self.all_keys_incl_aux_data)
+        columns = {var: self[var] for var in cut.variables if var in keys}
+
+        cache_key = (keep_criteria, self._representation_id)
+        versions = tuple(self.versions[var] for var in columns)
+        if cache_key in self._keep_masks:
+            cached_versions, mask = self._keep_masks[cache_key]
+            if cached_versions == versions:
+                return mask
+
+        mask = cut(columns)
+        if isinstance(mask, np.ndarray):
+            mask.flags.writeable = False
+        self._keep_masks[cache_key] = (versions, mask)
+        return mask
 
 
 
@@ -795,6 +1053,8 @@ def test_container():
     bx = container['x']
     m = np.meshgrid(binning.midpoints[0].m, binning.midpoints[1].m)[1].ravel()
     assert np.allclose(bx, m, **ALLCLOSE_KW), f'test:\n{bx}\n!= ref:\n{m}'
+    # unrolled binning is only computed once
+    assert container['x'] is bx and not bx.flags.writeable
 
     # array repr
     container.representation = 'events'
@@ -817,6 +1077,75 @@ def test_container():
 
     assert np.allclose(a, w, **ALLCLOSE_KW), f'test:\n{a}\n!= ref:\n{w}'
 
+    # replicas of the events are histogrammed at once
+    assert container.num_replicas is None
+    container['weights'] = w
+    container[container.replica_weights_key] = np.stack(
+        [np.ones(n_evts, dtype=FTYPE), np.full(n_evts, 2, dtype=FTYPE)], axis=1
+    )
+    assert container.num_replicas == 2
+    container.representation = binning
+    assert container['weights'].shape == (binning.size, 2)
+    for replica in range(2):
+        m = container.get_map('weights', replica=replica)
+        ref = (replica + 1) * diag
+        assert np.allclose(m.nominal_values, ref, **ALLCLOSE_KW), f'test:\n{m}\n!= ref:\n{ref}'
+    container.representation = 'events'
+
+    # keep masks are cached until one of the variables changes
+    keep_criteria = '(x > 10) & (y < 50)'
+    mask = container.get_keep_mask(keep_criteria)
+    assert np.array_equal(mask, (x > 10) & (y < 50))
+    assert container.get_keep_mask(keep_criteria) is mask
+    container['y'] = y + 10
+    mask = container.get_keep_mask(keep_criteria)
+    assert np.array_equal(mask, (x > 10) & (y + 10 < 50))
+    # in-place writes (as done e.g. by the pid stage) are picked up once the
+    # variable is marked as changed
+    container['y'][:] = y + 20
+    container.mark_changed('y')
+    mask = container.get_keep_mask(keep_criteria)
+    assert np.array_equal(mask, (x > 10) & (y + 20 < 50))
+
+
+def test_representation_switching():
+    """Representations are interned into IDs, and switching between known
+    representations does not hash them. Also reports the cost per switch."""
+    binning = MultiDimBinning([
+        OneDimBinning(name='x', num_bins=10, is_lin=True, domain=[0, 100]),
+        OneDimBinning(name='y', num_bins=10, is_lin=True, domain=[0, 100]),
+    ])
+    container = Container('test', 'events')
+    container['x'] = np.linspace(0, 100, 1000, dtype=FTYPE)
+    container.representation = 'log_events'
+    container.representation = binning
+
+    assert container.get_representation_id('events') == 0
+    assert container.get_representation_id('log_events') == 1
+    assert container.get_representation_id(binning) == 2
+    # an equal, but different binning object is found by its hash
+    assert container.get_representation_id(MultiDimBinning(list(binning))) == 2
+    try:
+        container.get_representation_id('some_events')
+    except KeyError:
+        pass
+    else:
+        assert False
+
+    reps = ('events', 'log_events', binning)
+    num_switches = 30000
+    def switch():
+        for i in range(num_switches):
+            container.representation = reps[i % 3]
+    time_per_switch = timeit.timeit(switch, number=1) / num_switches
+    assert container.representations == reps
+    assert container.is_map
+
+    logging.info(
+        'Switching representations takes %.2f us', time_per_switch * 1e6
+    )
+    logging.info('<< PASS : test_representation_switching >>')
+
 
 def test_container_set():
     container1 = Container('test1')
@@ -874,7 +1203,44 @@ def test_container_set():
     assert len(shared_keys_rep_indep) == 2
     assert len(shared_keys_rep_dep) == 1
 
+    # linked containers share one array without copying ...
+    binning = MultiDimBinning([
+        OneDimBinning(name='true_energy', num_bins=5, is_log=True, domain=[1, 80])
+    ])
+    containers = [Container('test%d' % i, binning) for i in range(3)]
+    data = ContainerSet('data', containers, representation=binning)
+    data.link_containers('all', ['test0', 'test1', 'test2'])
+    for container in data:
+        container['prob'] = np.zeros(binning.size, dtype=FTYPE)
+    for container in data:
+        container['prob'][:] = 0.5
+        container.mark_changed('prob')
+    data.unlink_containers()
+    for container in data:
+        assert np.all(container['prob'] == 0.5)
+        assert np.shares_memory(container['prob'], containers[0]['prob'])
+        # ... which is read-only outside of the link
+        assert not container['prob'].flags.writeable
+
+    # a different link only writes to its own copy
+    data.link_containers('some', ['test0', 'test1'])
+    for container in data:
+        if container.name == 'some':
+            container['prob'][:] = 1.
+            container.mark_changed('prob')
+    data.unlink_containers()
+    assert np.all(containers[0]['prob'] == 1.)
+    assert np.all(containers[1]['prob'] == 1.)
+    assert np.all(containers[2]['prob'] == 0.5)
+
+    # setting an array makes it private again
+    containers[2]['prob'] = np.ones(binning.size, dtype=FTYPE)
+    containers[2]['prob'] *= 2
+    assert np.all(containers[2]['prob'] == 2.)
+    assert np.all(containers[0]['prob'] == 1.)
+
 
 if __name__ == '__main__':
     test_container()
+    test_representation_switching()
     test_container_set()
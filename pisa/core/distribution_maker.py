@@ -266,7 +266,10 @@ class DistributionMaker(object):
 
         Returns
         -------
-        MapSet if `return_sum=True` or list of MapSets if `return_sum=False`
+        MapSet if `return_sum=True` or list of MapSets if `return_sum=False`;
+        for pipelines producing several MapSets each (e.g. for a `VarBinning`
+        or for replicas of the events), one more list level is added, over
+        which the sum is taken separately
 
         """
 
@@ -285,7 +288,7 @@ class DistributionMaker(object):
             elif isinstance(outputs[0], list):
                 outs = []
                 for i in range(len(outputs[0])):
-                    o = sum([sum(x) for x in np.array(outputs)[:, i]])
+                    o = sum([sum(x[i]) for x in outputs])
                     o.name = sum_map_name
                     o.tex = sum_map_tex_name
                     outs.append(MapSet(o))
@@ -6,14 +6,21 @@ import argparse
 from collections.abc import Mapping, Iterable, Sequence
 from collections import OrderedDict
 import copy
-import re
+import json
+import os
+import shutil
+import tempfile
 
 import numpy as np
 
 from pisa import FTYPE
 from pisa.core.binning import OneDimBinning, MultiDimBinning
-from pisa.utils.fileio import from_file
+from pisa.utils.cuts import get_cut_expression
+from pisa.utils.fileio import from_file, mkdir
+from pisa.utils.hash import hash_file, hash_obj
+from pisa.utils.jsons import dumps
 from pisa.utils.log import logging
+from pisa.utils.resources import find_resource
 
 
 __all__ = [
@@ -21,7 +28,9 @@ __all__ = [
     "NU_INTERACTIONS",
     "OUTPUT_NUFLAVINT_KEYS",
     "LEGACY_FLAVKEY_XLATION",
+    "EVENTS_CACHE_VERSION",
     "EventsPi",
+    "get_events_cache_path",
     "split_nu_events_by_flavor_and_interaction",
     "fix_oppo_flux",
     "main",
@@ -82,6 +91,11 @@ OPPO_FLUX_LEGACY_FIX_MAPPING_NUBAR = {
     "nominal_numubar_flux" : "neutrino_numu_flux",
 }
 
+# Version of the on-disk events cache layout, bump when changing it
+EVENTS_CACHE_VERSION = 1
+
+EVENTS_CACHE_MANIFEST = "manifest.json"
+
 def append_arrays_dict(key, val, sdict):
     '''
     Helper function for appending multiple dicts of arrays (e.g. from 
@@ -172,7 +186,8 @@ class EventsPi(OrderedDict):
         )
 
 
-    def load_events_file(self, events_file, variable_mapping=None, required_metadata=None, seed=123456):
+    def load_events_file(self, events_file, variable_mapping=None, required_metadata=None, seed=123456,
+                         keep_criteria=None, cache_dir=None):
         """Fill this events container from an input HDF5 file filled with event
         data. Optionally can provide a variable mapping so select a subset of
         variables, rename them, etc.
@@ -200,6 +215,19 @@ class EventsPi(OrderedDict):
             If `fraction_events_to_keep` is not `None`, serves
             as random seed for generating reproducible sub-samples.
 
+        keep_criteria : str, default: None
+            Optionally apply a cut to the loaded events (see `apply_cut`).
+
+        cache_dir : str, default: None
+            If specified, the loaded (and cut) events are stored in a
+            sub-directory of `cache_dir` as one flat binary file per variable
+            and event category, together with a manifest. Subsequent loads of the
+            same files with the same settings memory-map these files instead of
+            parsing the input files, such that concurrent jobs can share the
+            page cache. Input files are identified by their path, size,
+            modification time and a hash of their first kB. Only used if all
+            inputs are file paths and this container is still empty.
+
         """
 
         # Validate `events_file`
@@ -259,6 +287,30 @@ class EventsPi(OrderedDict):
         elif isinstance(events_file, Sequence):
             events_files_list = events_file
 
+        # Use the cache, if requested and possible
+        cache_path = None
+        if cache_dir is not None:
+            if len(self) == 0 and all(isinstance(f, str) for f in events_files_list):
+                cache_path = get_events_cache_path(
+                    cache_dir=cache_dir,
+                    events_files=events_files_list,
+                    variable_mapping=variable_mapping,
+                    required_metadata=required_metadata,
+                    seed=seed,
+                    keep_criteria=keep_criteria,
+                    neutrinos=self.neutrinos,
+                    fraction_events_to_keep=self.fraction_events_to_keep,
+                    events_subsample_index=self.events_subsample_index,
+                )
+                if self._load_from_cache(cache_path):
+                    logging.info("Loaded events from cache : %s", cache_path)
+                    return
+            else:
+                logging.warning(
+                    "Events can only be cached when loading from files into an"
+                    " empty container, not using the cache"
+                )
+
         # Loop over files
         for i_file, infile in enumerate(events_files_list) :
 
@@ -506,6 +558,101 @@ class EventsPi(OrderedDict):
                 # Add to array
                 self[data_key][var_dst] = array_data
 
+        # Apply the cut, if requested
+        if keep_criteria:
+            cut_data = self.apply_cut(keep_criteria)
+            self.clear()
+            self.update(cut_data)
+            self.metadata = cut_data.metadata
+
+        # Store in the cache, if requested
+        if cache_path is not None:
+            self._save_to_cache(cache_path)
+
+    def _load_from_cache(self, cache_path):
+        """Fill this (empty) events container by memory-mapping the columns in
+        the cache directory `cache_path`. Returns False if the cache has not
+        been populated (yet).
+
+        The arrays are mapped copy-on-write, so they can be modified in memory
+        without affecting the cache.
+        """
+        manifest_path = os.path.join(cache_path, EVENTS_CACHE_MANIFEST)
+        if not os.path.isfile(manifest_path):
+            return False
+
+        with open(manifest_path, "r") as manifest_file:
+            manifest = json.load(manifest_file, object_pairs_hook=OrderedDict)
+
+        for data_key, columns in manifest["columns"].items():
+            self[data_key] = OrderedDict()
+            for var, column in columns.items():
+                shape = tuple(column["shape"])
+                if np.prod(shape) == 0:
+                    # Cannot map an empty file
+                    array_data = np.empty(shape, dtype=column["dtype"])
+                else:
+                    array_data = np.memmap(
+                        os.path.join(cache_path, column["file"]),
+                        dtype=column["dtype"],
+                        mode="c",
+                        shape=shape,
+                    )
+                self[data_key][var] = array_data
+
+        self.metadata = manifest["metadata"]
+
+        return True
+
+    def _save_to_cache(self, cache_path):
+        """Write the contents of this events container to the cache directory
+        `cache_path`. The files are written to a temporary directory first,
+        which is then moved into place, such that concurrent jobs never see a
+        partially written cache.
+        """
+        cache_dir = os.path.dirname(cache_path)
+        mkdir(cache_dir, warn=False)
+        tmp_path = tempfile.mkdtemp(
+            prefix=os.path.basename(cache_path) + ".", dir=cache_dir
+        )
+        try:
+            os.chmod(tmp_path, 0o0750)
+
+            # Use indices for the file names, as the keys can be arbitrary strings
+            columns = OrderedDict()
+            for i_key, (data_key, data) in enumerate(self.items()):
+                columns[data_key] = OrderedDict()
+                for i_var, (var, array_data) in enumerate(data.items()):
+                    array_data = np.ascontiguousarray(array_data)
+                    file_name = "%i_%i.bin" % (i_key, i_var)
+                    array_data.tofile(os.path.join(tmp_path, file_name))
+                    columns[data_key][var] = OrderedDict(
+                        [
+                            ("file", file_name),
+                            ("dtype", array_data.dtype.str),
+                            ("shape", array_data.shape),
+                        ]
+                    )
+
+            manifest = OrderedDict(
+                [
+                    ("version", EVENTS_CACHE_VERSION),
+                    ("metadata", self.metadata),
+                    ("columns", columns),
+                ]
+            )
+            with open(os.path.join(tmp_path, EVENTS_CACHE_MANIFEST), "w") as manifest_file:
+                manifest_file.write(dumps(manifest))
+
+            # Fails if another job has populated the cache in the meantime, in
+            # which case we simply keep that one
+            os.rename(tmp_path, cache_path)
+            logging.info("Stored events in cache : %s", cache_path)
+
+        except (OSError, TypeError, ValueError) as err:
+            logging.warning("Could not store events in cache %s : %s", cache_path, err)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
 
     def apply_cut(self, keep_criteria):
         """Apply a cut by specifying criteria for keeping events. The cut must
@@ -546,6 +693,8 @@ class EventsPi(OrderedDict):
 
         # TODO Get everything from the GPU first ?
 
+        cut = get_cut_expression(keep_criteria)
+
         # Prepare the post-cut data container
         cut_data = EventsPi(name=self.name)
         cut_data.metadata = copy.deepcopy(self.metadata)
@@ -559,21 +708,15 @@ class EventsPi(OrderedDict):
             # already be in the Container class?
             variables = self[key].keys()
 
-            # Create the cut expression, and get the resulting mask
-            crit_str = keep_criteria
-            for variable_name in variables:
-                # using word boundary \b to replace whole words only
-                crit_str = re.sub(
-                    r'\b{}\b'.format(variable_name),
-                    'self["%s"]["%s"]' % (key, variable_name),
-                    crit_str
-                )
-            mask = eval(crit_str)  # pylint: disable=eval-used
+            # Evaluate the (parsed and compiled) cut expression to get the mask
+            mask = cut(self[key])
 
-            # Fill a new container with the post-cut data
+            # Fill a new container with the post-cut data, gathering the
+            # surviving events (which creates new arrays)
+            keep_indices = np.flatnonzero(mask)
             for variable_name in variables:
-                cut_data[key][variable_name] = copy.deepcopy(
-                    self[key][variable_name][mask]
+                cut_data[key][variable_name] = np.take(
+                    self[key][variable_name], keep_indices, axis=0
                 )
 
         # TODO update to GPUs?
@@ -637,6 +780,46 @@ class EventsPi(OrderedDict):
         return string
 
 
+def get_events_cache_path(cache_dir, events_files, **load_kwargs):
+    """Get the directory within `cache_dir` that holds the cached events for
+    the files `events_files`, loaded with the keyword arguments `load_kwargs`.
+
+    Files are identified by their (resolved) path, size and modification time,
+    as well as a hash of their first kB, which avoids reading them in full.
+
+    Parameters
+    ----------
+    cache_dir : str
+
+    events_files : sequence of str
+
+    **load_kwargs
+        Any settings affecting the loaded events
+
+    Returns
+    -------
+    cache_path : str
+
+    """
+    file_ids = []
+    for events_file in events_files:
+        events_file = os.path.realpath(find_resource(events_file))
+        stat = os.stat(events_file)
+        file_ids.append(
+            (
+                events_file,
+                stat.st_size,
+                stat.st_mtime_ns,
+                hash_file(events_file, hash_to="hex", full_hash=False),
+            )
+        )
+    cache_key = hash_obj(
+        (EVENTS_CACHE_VERSION, np.dtype(FTYPE).str, file_ids, sorted(load_kwargs.items())),
+        hash_to="hex",
+    )
+    return os.path.join(os.path.expanduser(os.path.expandvars(cache_dir)), "events_" + cache_key)
+
+
 def split_nu_events_by_flavor_and_interaction(input_data):
     """Split neutrino events by nu vs nubar, and CC vs NC.
 
@@ -744,6 +927,61 @@ def fix_oppo_flux(input_data):
                 val[new] = val.pop(old)
 
 
+def test_events_cache():
+    """Check that events loaded from the cache match those loaded from file"""
+    import tempfile
+
+    events_file = (
+        "events/events__vlvnt__toy_1_to_80GeV_spidx1.0_cz-1_to_1_1e2evts_set0__"
+        "unjoined__with_fluxes_honda-2015-spl-solmin-aa.hdf5"
+    )
+    variable_mapping = {
+        "true_energy": "true_energy",
+        "true_coszen": "true_coszen",
+        "reco_coszen_energy": ["reco_coszen", "reco_energy"],
+    }
+    keep_criteria = "true_energy > 5"
+
+    def load(cache_dir=None):
+        events = EventsPi(name="Events", fraction_events_to_keep=0.5)
+        events.load_events_file(
+            events_file=events_file,
+            variable_mapping=variable_mapping,
+            keep_criteria=keep_criteria,
+            cache_dir=cache_dir,
+        )
+        return events
+
+    reference = load()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # First populates the cache, second reads from it
+        for _ in range(2):
+            events = load(cache_dir=cache_dir)
+            assert list(events.keys()) == list(reference.keys())
+            assert events.metadata["cuts"] == [keep_criteria]
+            for key, data in reference.items():
+                assert list(events[key].keys()) == list(data.keys())
+                for var, array_data in data.items():
+                    assert np.array_equal(events[key][var], array_data)
+        assert len(os.listdir(cache_dir)) == 1
+        assert isinstance(events["numu_cc"]["true_energy"], np.memmap)
+
+        # Cut was recorded, so applying it again is a no-op
+        assert events.apply_cut(keep_criteria) is events
+
+        # Changing any setting must not re-use the cached events
+        events = EventsPi(name="Events", fraction_events_to_keep=0.5)
+        events.load_events_file(
+            events_file=events_file,
+            variable_mapping=variable_mapping,
+            cache_dir=cache_dir,
+        )
+        assert events.metadata["cuts"] == []
+        assert len(os.listdir(cache_dir)) == 2
+
+    logging.info("<< PASS : test_events_cache >>")
+
+
 def main():
     """Load an events file and print the contents"""
     parser = argparse.ArgumentParser(description="Events parsing")
@@ -44,7 +44,8 @@ from pisa.utils import stats
 
 
 __all__ = ['FLUCTUATE_METHODS', 'type_error', 'reduceToHist', 'rebin',
-           'valid_nominal_values', 'Map', 'MapSet', 'test_Map', 'test_MapSet']
+           'valid_nominal_values', 'Map', 'MapSet', 'test_Map', 'test_MapSet',
+           'test_fast_Map']
 
 __author__ = 'J.L. Lanfranchi'
 
@@ -112,6 +113,19 @@ def reduceToHist(obj):
     return hist
 
 
+def _metric_input(obj):
+    """Reduce `obj` as `reduceToHist` does, but pass on fast Maps (see
+    `Map.fast`) as such, since `pisa.utils.stats` reads their values without
+    creating a uarray"""
+    if isinstance(obj, MapSet):
+        obj = sum(obj)
+    elif isinstance(obj, Iterable) and not isinstance(obj, np.ndarray):
+        obj = sum([_metric_input(x) for x in obj])
+    if isinstance(obj, Map) and obj.fast:
+        return obj
+    return reduceToHist(obj)
+
+
 def rebin(hist, orig_binning, new_binning, normalize_values=True):
     """Rebin a histogram.
 
@@ -199,14 +213,102 @@ def _new_obj(original_function):
         for slot in self._state_attrs:
             if state_updates is not None and slot in state_updates:
                 new_state[slot] = state_updates[slot]
+            elif slot == 'hist' and self.fast:
+                # copy the arrays rather than going through a uarray
+                new_state['hist'] = np.copy(self._hist)
+                new_state['variance'] = deepcopy(self._variance)
             else:
                 new_state[slot] = deepcopy(getattr(self, slot))
+        if self.fast and state_updates is not None and 'variance' in state_updates:
+            new_state['variance'] = state_updates['variance']
         if len(new_state['binning']) == 0:
+            if new_state.get('variance') is not None:
+                return ufloat(new_state['hist'], np.sqrt(new_state['variance']))
             return new_state['hist']
         return Map(**new_state)
     return decorate(original_function, new_function)
 
 
+def _nominal_and_variance(obj):
+    """Get nominal values and variances (None if there are no uncertainties)
+    of a Map, array, or scalar, as used by fast Maps (see `Map.fast`)"""
+    # pylint: disable=protected-access
+    if isinstance(obj, Map):
+        if obj.fast:
+            return obj.nominal_values, obj._variance
+        return obj.nominal_values, np.square(obj.std_devs)
+    if type(obj) is uncertainties.core.Variable:
+        return obj.nominal_value, obj.std_dev**2
+    if isinstance(obj, np.ndarray) and obj.dtype == object:
+        return unp.nominal_values(obj), np.square(unp.std_devs(obj))
+    return obj, None
+
+
+def _propagate(operation, a, var_a, b=None, var_b=None):
+    """Apply `operation` to independent values `a` and `b` (which may be
+    arrays), with linear propagation of their variances `var_a` and `var_b`
+    (None for no uncertainty).
+
+    Returns
+    -------
+    value, variance
+        `variance` is None if neither input has uncertainties
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if operation == 'add':
+            value = a + b
+            terms = (var_a, var_b)
+        elif operation == 'sub':
+            value = a - b
+            terms = (var_a, var_b)
+        elif operation == 'mul':
+            value = a * b
+            terms = (
+                None if var_a is None else var_a * np.square(b),
+                None if var_b is None else var_b * np.square(a),
+            )
+        elif operation == 'div':
+            value = a / b
+            terms = (
+                None if var_a is None else var_a / np.square(b),
+                None if var_b is None else var_b * np.square(value / b),
+            )
+        elif operation == 'pow':
+            value = np.power(a, b)
+            terms = (
+                None if var_a is None else var_a * np.square(b * np.power(a, b - 1)),
+                None if var_b is None else var_b * np.square(value * np.log(a)),
+            )
+        elif operation == 'abs':
+            value = np.abs(a)
+            terms = (var_a,)
+        elif operation == 'neg':
+            value = -a
+            terms = (var_a,)
+        elif operation == 'sqrt':
+            value = np.sqrt(a)
+            terms = (None if var_a is None else var_a / (4 * a),)
+        elif operation == 'log':
+            value = np.log(a)
+            terms = (None if var_a is None else var_a / np.square(a),)
+        elif operation == 'log10':
+            value = np.log10(a)
+            terms = (
+                None if var_a is None else var_a / np.square(a * np.log(10)),
+            )
+        else:
+            raise ValueError('Unknown operation "%s"' % operation)
+
+    terms = [t for t in terms if t is not None]
+    if not terms:
+        return value, None
+    variance = np.zeros(np.shape(value))
+    for term in terms:
+        variance = variance + term
+    return value, variance
+
+
 def valid_nominal_values(data_array):
     """Get the the nominal values that are valid for an array"""
     return np.ma.masked_invalid(unp.nominal_values(data_array))
@@ -241,6 +343,19 @@ class Map(object):
         deviations for the contained `hist`, replacing any stddev information
         that might be contained in the passed `hist` arg.
 
+    variance : numpy ndarray, optional
+        Only if `fast`: variances of the values in `hist`. Alternative to
+        specifying `error_hist`.
+
+    fast : bool
+        Store the nominal values and variances as separate float arrays
+        instead of an array of `uncertainties` objects, and propagate errors
+        analytically in the supported operations (+, -, *, /, **, abs, sqrt,
+        log, log10, sum, project, rebin). This is much faster, but treats all
+        operands as uncorrelated (e.g. ``m - m`` has non-zero errors). A
+        uarray is only created when accessing `hist`; use `nominal_values`,
+        `std_devs`, and `variances` to avoid that.
+
     hash : None, or immutable object (typically an integer)
         Hash value to attach to the map.
 
@@ -298,15 +413,17 @@ class Map(object):
     _slots = ('name', 'hist', 'binning', 'hash', '_hash', 'tex',
               'full_comparison', 'parent_indexer', '_normalize_values')
     _state_attrs = ('name', 'hist', 'binning', 'hash', 'tex',
-                    'full_comparison')
+                    'full_comparison', 'fast')
 
     def __init__(self, name, hist, binning, error_hist=None, hash=None,
-                 tex=None, full_comparison=False):
+                 tex=None, full_comparison=False, variance=None, fast=False):
         # Set Read/write attributes via their defined setters
         super().__setattr__('_name', name)
         super().__setattr__('_tex', tex)
         super().__setattr__('_hash', hash)
         super().__setattr__('_full_comparison', full_comparison)
+        super().__setattr__('_fast', fast)
+        super().__setattr__('_variance', None)
 
         if not isinstance(binning, MultiDimBinning):
             if isinstance(binning, Sequence):
@@ -321,9 +438,27 @@ class Map(object):
         # Do the work here to set read-only attributes
         super().__setattr__('_binning', binning)
         binning.assert_array_fits(hist)
-        super().__setattr__(
-            '_hist', np.ascontiguousarray(hist)
-        )
+        if fast:
+            hist, hist_variance = _nominal_and_variance(np.asarray(hist))
+            if variance is None:
+                variance = hist_variance
+            elif error_hist is not None:
+                raise ValueError('Specify either `error_hist` or `variance`')
+            super().__setattr__(
+                '_hist', np.ascontiguousarray(hist, dtype=np.float64)
+            )
+            if variance is not None:
+                self.assert_compat(variance)
+                super().__setattr__(
+                    '_variance',
+                    np.ascontiguousarray(variance, dtype=np.float64)
+                )
+        else:
+            if variance is not None:
+                raise ValueError('`variance` requires `fast`')
+            super().__setattr__(
+                '_hist', np.ascontiguousarray(hist)
+            )
         if error_hist is not None:
             self.set_errors(error_hist)
         self._normalize_values = True
@@ -466,6 +601,9 @@ class Map(object):
     def set_poisson_errors(self):
         """Approximate poisson errors using sqrt(n)."""
         nom_values = self.nominal_values
+        if self.fast:
+            super().__setattr__('_variance', np.array(nom_values))
+            return
         super().__setattr__(
             '_hist',
             unp.uarray(nom_values, np.sqrt(nom_values))
@@ -483,6 +621,12 @@ class Map(object):
             `self.hist` a bare numpy array.
 
         """
+        if self.fast:
+            if error_hist is not None:
+                self.assert_compat(error_hist)
+                error_hist = np.square(error_hist, dtype=np.float64)
+            super().__setattr__('_variance', error_hist)
+            return
         if error_hist is None:
             super().__setattr__(
                 '_hist', self.nominal_values
@@ -937,9 +1081,11 @@ class Map(object):
                      for b in new_binning]
         # TODO: should this be a deepcopy rather than a simple veiw of the
         # original hist (the result of np.moveaxis)?
-        new_hist = np.moveaxis(self.hist, source=new_order,
-                               destination=orig_order)
-        return {'hist': new_hist, 'binning': new_binning}
+        state_updates = self._apply_to_arrays(
+            lambda x: np.moveaxis(x, source=new_order, destination=orig_order)
+        )
+        state_updates['binning'] = new_binning
+        return state_updates
 
     @_new_obj
     def squeeze(self):
@@ -952,13 +1098,17 @@ class Map(object):
 
         """
         new_binning = self.binning.squeeze()
-        new_hist = self.hist.squeeze()
-        return {'hist': new_hist, 'binning': new_binning}
+        state_updates = self._apply_to_arrays(np.squeeze)
+        state_updates['binning'] = new_binning
+        return state_updates
 
     @_new_obj
     def round2int(self):
         binning = self.binning
         nominal_values = np.rint(self.nominal_values)
+        if self.fast:
+            return {'hist': nominal_values,
+                    'variance': deepcopy(self._variance)}
         std_devs = self.std_devs
         return {'hist': unp.uarray(nominal_values, std_devs)}
 
@@ -996,7 +1146,9 @@ class Map(object):
             axis = [axis]
         # Note that the tuple is necessary here (I think...)
         sum_indices = tuple([self.binning.index(dim) for dim in axis])
-        new_hist = np.nansum(self.hist, axis=sum_indices, keepdims=keepdims)
+        state_updates = self._apply_to_arrays(
+            lambda x: np.nansum(x, axis=sum_indices, keepdims=keepdims)
+        )
 
         new_binning = []
         for idx, dim in enumerate(self.binning.dims):
@@ -1005,7 +1157,8 @@ class Map(object):
                     new_binning.append(dim.downsample(len(dim)))
             else:
                 new_binning.append(dim)
-        return {'hist': new_hist, 'binning': new_binning}
+        state_updates['binning'] = new_binning
+        return state_updates
 
     def project(self, axis, keepdims=False):
         """Project all dimensions onto a single `axis`.
@@ -1060,9 +1213,12 @@ class Map(object):
 
         assert self.binning.mask is None, "`rebin` function does not currenty support bin masking"
 
-        new_hist = rebin(hist=self.hist, orig_binning=self.binning,
-                         new_binning=new_binning)
-        return {'hist': new_hist, 'binning': new_binning}
+        state_updates = self._apply_to_arrays(
+            lambda x: rebin(hist=x, orig_binning=self.binning,
+                            new_binning=new_binning)
+        )
+        state_updates['binning'] = new_binning
+        return state_updates
 
     def downsample(self, *args, **kwargs):
         """Downsample by integer factor(s), summing together merged bins'
@@ -1216,16 +1372,18 @@ class Map(object):
     @property
     def shape(self):
         """tuple : shape of the map, akin to `nump.ndarray.shape`"""
-        return self.hist.shape
+        return self._hist.shape
 
     @property
     def size(self):
         """int : total number of elements"""
-        return self.hist.size
+        return self._hist.size
 
     @property
     def num_entries(self):
         """int : total number of weighted entries in all bins"""
+        if self.fast:
+            return np.sum(np.ma.masked_invalid(self.nominal_values))
         return np.sum(valid_nominal_values(self.hist))
 
     @property
@@ -1275,7 +1433,10 @@ class Map(object):
         self._normalize_values = b
 
     def __getstate__(self):
-        return self.serializable_state
+        state = self.serializable_state
+        if self.fast:
+            state['fast'] = True
+        return state
 
     def __setstate__(self, state):
         self.__init__(**state)
@@ -1352,11 +1513,11 @@ class Map(object):
             idx_view = tuple(slice(x, x+1) for x in idx_coord)
             single_bin_map = Map(
                 name=self.name,
-                hist=self.hist[idx_view],
                 binning=self.binning[idx_coord],
                 hash=None,
                 tex=self.tex,
                 full_comparison=self.full_comparison,
+                **self._apply_to_arrays(lambda x: x[idx_view])
             )
             single_bin_map.parent_indexer = idx_coord
             yield single_bin_map
@@ -1391,11 +1552,13 @@ class Map(object):
         new_binning = self.binning[idx]
 
         new_map = Map(name=self.name,
-                      hist=np.reshape(self.hist[idx], new_binning.shape),
                       binning=self.binning[idx],
                       hash=self.hash,
                       tex=self.tex,
-                      full_comparison=self.full_comparison)
+                      full_comparison=self.full_comparison,
+                      **self._apply_to_arrays(
+                          lambda x: np.reshape(x[idx], new_binning.shape)
+                      ))
         new_map.parent_indexer = idx
         return new_map
 
@@ -1546,14 +1709,15 @@ class Map(object):
         total_llh : float or binned_llh if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.llh(actual_values=self.hist,
+            return stats.llh(actual_values=_metric_input(self),
                              expected_values=expected_values)
 
-        return np.sum(stats.llh(actual_values=self.hist,
-                                expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='llh')
 
     def mcllh_mean(self, expected_values, binned=False):
         """Calculate the total LMean log-likelihood value between this map and the
@@ -1572,14 +1736,15 @@ class Map(object):
         total_llh : float or binned_llh if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.mcllh_mean(actual_values=self.hist,
+            return stats.mcllh_mean(actual_values=_metric_input(self),
                              expected_values=expected_values)
 
-        return np.sum(stats.mcllh_mean(actual_values=self.hist,
-                                expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='mcllh_mean')
 
 
     def mcllh_eff(self, expected_values, binned=False):
@@ -1599,14 +1764,15 @@ class Map(object):
         total_llh : float or binned_llh if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.mcllh_eff(actual_values=self.hist,
+            return stats.mcllh_eff(actual_values=_metric_input(self),
                              expected_values=expected_values)
 
-        return np.sum(stats.mcllh_eff(actual_values=self.hist,
-                                expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='mcllh_eff')
 
     def conv_llh(self, expected_values, binned=False):
         """Calculate the total convoluted log-likelihood value between this map
@@ -1625,13 +1791,13 @@ class Map(object):
         total_conv_llh : float or binned_conv_llh if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.conv_llh(actual_values=self.hist,
+            return stats.conv_llh(actual_values=_metric_input(self),
                                   expected_values=expected_values)
 
-        return np.sum(stats.conv_llh(actual_values=self.hist,
+        return np.sum(stats.conv_llh(actual_values=_metric_input(self),
                                      expected_values=expected_values))
 
     def barlow_llh(self, expected_values, binned=False):
@@ -1655,15 +1821,15 @@ class Map(object):
         # TODO: should this handle reduceToHist / expected_values as other
         # methods do, or should they handle these the way this method does?
         if isinstance(expected_values, (np.ndarray, Map, MapSet)):
-            expected_values = reduceToHist(expected_values)
+            expected_values = _metric_input(expected_values)
         elif isinstance(expected_values, Iterable):
-            expected_values = [reduceToHist(x) for x in expected_values]
+            expected_values = [_metric_input(x) for x in expected_values]
 
         if binned:
-            return stats.barlow_llh(actual_values=self.hist,
+            return stats.barlow_llh(actual_values=_metric_input(self),
                                     expected_values=expected_values)
 
-        return np.sum(stats.barlow_llh(actual_values=self.hist,
+        return np.sum(stats.barlow_llh(actual_values=_metric_input(self),
                                        expected_values=expected_values))
 
     def mod_chi2(self, expected_values, binned=False):
@@ -1683,14 +1849,15 @@ class Map(object):
         total_mod_chi2 : float or binned_mod_chi2 if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.mod_chi2(actual_values=self.hist,
+            return stats.mod_chi2(actual_values=_metric_input(self),
                                   expected_values=expected_values)
 
-        return np.sum(stats.mod_chi2(actual_values=self.hist,
-                                     expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='mod_chi2')
 
     def correct_chi2(self, expected_values, binned=False):
         """Calculate the total correct chi2 value between this map and the map
@@ -1709,14 +1876,15 @@ class Map(object):
         total_correct_chi2 : float or binned_correct_chi2 if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.correct_chi2(actual_values=self.hist,
+            return stats.correct_chi2(actual_values=_metric_input(self),
                                   expected_values=expected_values)
 
-        return np.sum(stats.correct_chi2(actual_values=self.hist,
-                                     expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='correct_chi2')
 
     def chi2(self, expected_values, binned=False):
         """Calculate the total chi-squared value between this map and the map
@@ -1735,14 +1903,15 @@ class Map(object):
         total_chi2 : float or binned_chi2 if binned=True
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
         if binned:
-            return stats.chi2(actual_values=self.hist,
+            return stats.chi2(actual_values=_metric_input(self),
                               expected_values=expected_values)
 
-        return np.sum(stats.chi2(actual_values=self.hist,
-                                 expected_values=expected_values))
+        return stats.metric_total(actual_values=_metric_input(self),
+                                  expected_values=expected_values,
+                                  metric='chi2')
 
     def signed_sqrt_mod_chi2(self, expected_values):
         """Calculate the binwise (signed) square-root of the modified chi2 value
@@ -1759,9 +1928,9 @@ class Map(object):
         m_pulls : signed_sqrt_mod_chi2
 
         """
-        expected_values = reduceToHist(expected_values)
+        expected_values = _metric_input(expected_values)
 
-        return stats.signed_sqrt_mod_chi2(actual_values=self.hist,
+        return stats.signed_sqrt_mod_chi2(actual_values=_metric_input(self),
                                           expected_values=expected_values)
 
 
@@ -1821,6 +1990,14 @@ class Map(object):
                              % (metric, stats.ALL_METRICS))
 
     def __setitem__(self, idx, val):
+        if self.fast:
+            nominal_values, variance = _nominal_and_variance(val)
+            setitem(self._hist, idx, nominal_values)
+            if variance is not None and self._variance is None:
+                super().__setattr__('_variance', np.zeros_like(self._hist))
+            if self._variance is not None:
+                setitem(self._variance, idx, 0 if variance is None else variance)
+            return None
         return setitem(self.hist, idx, val)
 
     @property
@@ -1859,10 +2036,23 @@ class Map(object):
         assert hasattr(value, '__hash__')
         super().__setattr__('_hash', value)
 
+    @property
+    def fast(self):
+        """bool : whether values and variances are stored as float arrays
+        (see class docstring)"""
+        return self._fast
+
     @property
     def hist(self):
         """numpy.ndarray : Histogram array underlying the Map"""
 
+        if self.fast:
+            # Note that this is a copy unless there are no errors
+            self._apply_mask()
+            if self._variance is None:
+                return self._hist
+            return unp.uarray(self._hist, np.sqrt(self._variance))
+
         # Get the hist
         hist = self._hist
 
@@ -1874,16 +2064,78 @@ class Map(object):
         # Done
         return hist
 
+    def _apply_mask(self):
+        """Set masked off elements of a fast map to NaN"""
+        if self.binning.mask is not None:
+            self._hist[~self.binning.mask] = np.NaN
+            if self._variance is not None:
+                self._variance[~self.binning.mask] = np.NaN
+
+    def _apply_to_arrays(self, func):
+        """Apply `func` to `hist` or, for a fast map, to the nominal values and
+        variances, returning the results as (Map kwargs) dict"""
+        if not self.fast:
+            return {'hist': func(self.hist)}
+        self._apply_mask()
+        return {
+            'hist': func(self._hist),
+            'variance': None if self._variance is None else func(self._variance),
+            'fast': True,
+        }
+
+    def _fast_operation(self, operation, other=None, reverse=False):
+        """State updates for `operation` (see `_propagate`) applied to this
+        fast map (and `other`, as second operand unless `reverse`)"""
+        self._apply_mask()
+        state_updates = {}
+        if other is None:
+            value, variance = _propagate(operation, self._hist, self._variance)
+        else:
+            if not (np.isscalar(other)
+                    or type(other) is uncertainties.core.Variable
+                    or isinstance(other, (np.ndarray, Map))):
+                type_error(other)
+            operands = [(self._hist, self._variance),
+                        _nominal_and_variance(other)]
+            if reverse:
+                operands = operands[::-1]
+            value, variance = _propagate(operation, *operands[0], *operands[1])
+            if isinstance(other, Map):
+                state_updates['full_comparison'] = (self.full_comparison or
+                                                    other.full_comparison)
+        state_updates['hist'] = value
+        state_updates['variance'] = variance
+        return state_updates
+
     @property
     def nominal_values(self):
         """numpy.ndarray : Bin values stripped of uncertainties"""
+        if self.fast:
+            self._apply_mask()
+            nominal_values = self._hist.view()
+            nominal_values.flags.writeable = False
+            return nominal_values
         return unp.nominal_values(self.hist)
 
     @property
     def std_devs(self):
         """numpy.ndarray : Uncertainties (standard deviations) per bin"""
+        if self.fast:
+            return np.sqrt(self.variances)
         return unp.std_devs(self.hist)
 
+    @property
+    def variances(self):
+        """numpy.ndarray : Variances (squared standard deviations) per bin"""
+        if not self.fast:
+            return np.square(self.std_devs)
+        self._apply_mask()
+        if self._variance is None:
+            return np.zeros_like(self._hist)
+        variances = self._variance.view()
+        variances.flags.writeable = False
+        return variances
+
     @property
     def binning(self):
         """pisa.core.binning.MultiDimBinning : Map's binning"""
@@ -1903,6 +2155,8 @@ class Map(object):
 
     @_new_obj
     def __abs__(self):
+        if self.fast:
+            return self._fast_operation('abs')
         state_updates = {
             #'name': "|%s|" % (self.name,),
             #'tex': r"{\left| %s \right|}" % strip_outer_parens(self.tex),
@@ -1913,6 +2167,8 @@ class Map(object):
     @_new_obj
     def __add__(self, other):
         """Add `other` to self"""
+        if self.fast:
+            return self._fast_operation('add', other)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "(%s + %s)" % (self.name, other),
@@ -1941,6 +2197,8 @@ class Map(object):
 
     @_new_obj
     def __div__(self, other):
+        if self.fast:
+            return self._fast_operation('div', other)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "(%s / %s)" % (self.name, other),
@@ -2013,6 +2271,8 @@ class Map(object):
         log_map : Map
 
         """
+        if self.fast:
+            return self._fast_operation('log')
         state_updates = {
             #'name': "log(%s)" % self.name,
             #'tex': r"\ln\left( %s \right)" % self.tex,
@@ -2029,6 +2289,8 @@ class Map(object):
         log10_map : Map
 
         """
+        if self.fast:
+            return self._fast_operation('log10')
         state_updates = {
             #'name': "log10(%s)" % self.name,
             #'tex': r"\log_{10}\left( %s \right)" % self.tex,
@@ -2038,6 +2300,8 @@ class Map(object):
 
     @_new_obj
     def __mul__(self, other):
+        if self.fast:
+            return self._fast_operation('mul', other)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "%s * %s" % (other, self.name),
@@ -2067,6 +2331,8 @@ class Map(object):
 
     @_new_obj
     def __neg__(self):
+        if self.fast:
+            return self._fast_operation('neg')
         state_updates = {
             #'name': "-%s" % self.name,
             #'tex': r"-%s" % self.tex,
@@ -2076,6 +2342,8 @@ class Map(object):
 
     @_new_obj
     def __pow__(self, other):
+        if self.fast:
+            return self._fast_operation('pow', other)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "%s**%s" % (self.name, other),
@@ -2111,6 +2379,8 @@ class Map(object):
 
     @_new_obj
     def __rdiv(self, other):
+        if self.fast:
+            return self._fast_operation('div', other, reverse=True)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "(%s / %s)" % (other, self.name),
@@ -2137,6 +2407,8 @@ class Map(object):
 
     @_new_obj
     def __rsub(self, other):
+        if self.fast:
+            return self._fast_operation('sub', other, reverse=True)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "(%s - %s)" % (other, self.name),
@@ -2162,6 +2434,8 @@ class Map(object):
         sqrt_map : Map
 
         """
+        if self.fast:
+            return self._fast_operation('sqrt')
         state_updates = {
             #'name': "sqrt(%s)" % self.name,
             #'tex': r"\sqrt{%s}" % self.tex,
@@ -2172,6 +2446,8 @@ class Map(object):
 
     @_new_obj
     def __sub__(self, other):
+        if self.fast:
+            return self._fast_operation('sub', other)
         if np.isscalar(other) or type(other) is uncertainties.core.Variable:
             state_updates = {
                 #'name': "(%s - %s)" % (self.name, other),
@@ -3550,7 +3826,85 @@ def test_MapSet():
     logging.info('<< PASS : test_MapSet >>')
 
 
+def test_fast_Map():
+    """Unit tests for Map with `fast=True`, comparing against the
+    `uncertainties`-based Map"""
+    import pickle
+    e_binning = OneDimBinning(name='energy', num_bins=6, domain=(1, 80)*ureg.GeV,
+                              is_log=True)
+    cz_binning = OneDimBinning(name='coszen', num_bins=4, domain=(-1, 0),
+                               is_lin=True)
+    binning = e_binning * cz_binning
+    rand = np.random.RandomState(0)
+    nom1, nom2 = rand.uniform(1, 10, size=(2,) + binning.shape)
+    sig1, sig2 = rand.uniform(0.1, 1, size=(2,) + binning.shape)
+
+    slow1 = Map(name='a', hist=unp.uarray(nom1, sig1), binning=binning)
+    slow2 = Map(name='b', hist=unp.uarray(nom2, sig2), binning=binning)
+    fast1 = Map(name='a', hist=nom1, error_hist=sig1, binning=binning, fast=True)
+    fast2 = Map(name='b', hist=nom2, variance=sig2**2, binning=binning,
+                fast=True)
+    assert fast1.fast and fast2.fast and not slow1.fast
+    assert fast1.hist.dtype == object
+    assert not fast1.nominal_values.flags.writeable
+
+    def check(slow, fast):
+        assert isinstance(fast, Map) and fast.fast, fast
+        assert fast.binning == slow.binning
+        assert np.allclose(fast.nominal_values, slow.nominal_values)
+        assert np.allclose(fast.std_devs, slow.std_devs)
+
+    check(slow1 + slow2, fast1 + fast2)
+    check(slow1 - slow2, fast1 - fast2)
+    check(slow1 * slow2, fast1 * fast2)
+    check(slow1 / slow2, fast1 / fast2)
+    check(slow1**2.5, fast1**2.5)
+    check(2 + slow1, 2 + fast1)
+    check(3 - slow1, 3 - fast1)
+    check(slow1.__rdiv__(3), fast1.__rdiv__(3))
+    check(-slow1, -fast1)
+    check(abs(slow1), abs(fast1))
+    check(slow1.sqrt(), fast1.sqrt())
+    check(slow1.log(), fast1.log())
+    check(slow1.log10(), fast1.log10())
+    check(slow1.sum('energy'), fast1.sum('energy'))
+    check(slow1.project('coszen'), fast1.project('coszen'))
+    check(slow1.reorder_dimensions(['coszen', 'energy']),
+          fast1.reorder_dimensions(['coszen', 'energy']))
+    check(slow1[0:2, 1], fast1[0:2, 1])
+    total = fast1.sum()
+    assert np.isclose(total.nominal_value, slow1.sum().nominal_value)
+    assert np.isclose(total.std_dev, slow1.sum().std_dev)
+
+    # Without errors, values stay plain floats
+    bare = Map(name='c', hist=nom1, binning=binning, fast=True)
+    assert bare.hist.dtype == np.float64
+    assert (bare + bare).hist.dtype == np.float64
+    assert np.all(bare.variances == 0)
+    bare.set_poisson_errors()
+    assert np.allclose(bare.std_devs, np.sqrt(nom1))
+
+    # Metrics must agree with the uncertainties-based maps
+    for metric in ['llh', 'chi2', 'mod_chi2', 'mcllh_mean', 'mcllh_eff',
+                   'conv_llh', 'barlow_llh']:
+        slow_val = getattr(slow1, metric)(slow2)
+        fast_val = getattr(fast1, metric)(fast2)
+        assert np.allclose(fast_val, slow_val), metric
+
+    fast_ms = MapSet([fast1, fast2])
+    slow_ms = MapSet([slow1, slow2])
+    assert np.isclose(fast_ms.metric_total(fast_ms, 'llh'),
+                      slow_ms.metric_total(slow_ms, 'llh'))
+
+    # Pickling and copying keep the representation
+    assert pickle.loads(pickle.dumps(fast1)).fast
+    check(slow1, deepcopy(fast1))
+
+    logging.info('<< PASS : test_fast_Map >>')
+
+
 if __name__ == "__main__":
     set_verbosity(1)
     test_Map()
     test_MapSet()
+    test_fast_Map()
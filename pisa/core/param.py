@@ -11,6 +11,7 @@ from collections.abc import Iterable, Mapping, MutableSequence, Set, Sequence
 from collections import OrderedDict
 from copy import deepcopy
 from functools import total_ordering
+from itertools import count
 from operator import setitem
 from os.path import join
 from shutil import rmtree
@@ -43,6 +44,7 @@ __all__ = [
     'ParamSet',
     'ParamSelector',
     'test_Param',
+    'test_param_versions',
     'test_ParamSet',
     'test_ParamSelector',
 ]
@@ -72,6 +74,10 @@ __license__ = '''Copyright (c) 2014-2019, The IceCube Collaboration
 # value hasn't been set yet, then there's no implicit units to reference
 # when setting the prior, range, and possibly other things (which all need to
 # at least have compatible units)
+_VERSIONS = count(1)
+"""Source of the version stamps of param values, unique within a process"""
+
+
 @total_ordering
 class Param:
     """Parameter class to store any kind of parameters
@@ -112,6 +118,9 @@ class Param:
     parameter should be spicfied and a prior must be assigned to compute llh
     and chi2 values.
 
+    Every change of the parameter's value assigns a new `version`, which
+    allows for cheap change detection (as opposed to `hash`).
+
     Examples
     --------
     >>> from pisa import ureg
@@ -162,6 +171,7 @@ class Param:
         '_range',
         '_units',
         'normalize_values',
+        '_version',
     )
     _state_attrs = (
         'name',
@@ -197,6 +207,7 @@ class Param:
         self._units = None
         self._nominal_value = None
         self._prior = None
+        self._version = 0
 
         self.value = value
         self.scales_as_log = scales_as_log
@@ -235,6 +246,21 @@ class Param:
             raise AttributeError('Invalid attribute: %s' % (attr,))
         object.__setattr__(self, attr, val)
 
+    def __deepcopy__(self, memo):
+        # copies share the version of the original, as they share its value
+        cls = self.__class__
+        result = cls.__new__(cls)
+        memo[id(self)] = result
+        for k, v in self.__dict__.items():
+            object.__setattr__(result, k, deepcopy(v, memo))
+        return result
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # versions are only unique within a process, so get a new one when
+        # unpickling
+        object.__setattr__(self, '_version', next(_VERSIONS))
+
     def __str__(self):
         return '%s=%s; prior=%s, range=%s, is_fixed=%s,' \
                 ' is_discrete=%s; help="%s"' \
@@ -276,12 +302,27 @@ class Param:
                         'Passed values must have units if the param has units'
                 val = val.to(self._value.units)
             self.validate_value(val)
-        self._value = val
+        self._update_value(val)
         if hasattr(self._value, 'units'):
             self._units = self._value.units
         else:
             self._units = ureg.Unit('dimensionless')
 
+    def _update_value(self, val):
+        """Set `_value` and get a new `version` if it changed"""
+        try:
+            changed = bool(val != self._value)
+        except (TypeError, ValueError, pint.errors.DimensionalityError):
+            changed = True
+        if changed:
+            self._version = next(_VERSIONS)
+        self._value = val
+
+    @property
+    def version(self):
+        """int : stamp that changes (only) whenever the value changes"""
+        return self._version
+
     @property
     def magnitude(self):
         return self._value.magnitude
@@ -392,9 +433,9 @@ class Param:
         if self.scales_as_log:
             # it is possible that the entire value range is negative, taking the
             # absolute value only inside log() produces the correct sign
-            self._value = np.exp(rval*(np.log(np.abs(srange1)) - np.log(np.abs(srange0)))) * srange0 * self._units
+            self._update_value(np.exp(rval*(np.log(np.abs(srange1)) - np.log(np.abs(srange0)))) * srange0 * self._units)
         else:
-            self._value = (srange0 + (srange1 - srange0)*rval) * self._units
+            self._update_value((srange0 + (srange1 - srange0)*rval) * self._units)
         # In some rare cases (one case being rval = 1., range = (-0.5, 0.3)), a rounding
         # error can occur that sets the value outside the allowed range. We clip the
         # value back to the range if that happens.
@@ -544,6 +585,7 @@ class Param:
 
         """
         self._value.ito(units)
+        self._version = next(_VERSIONS)
 
     @property
     def prior_llh(self):
@@ -599,6 +641,7 @@ class DerivedParam(Param):
         '_range',
         '_units',
         'normalize_values',
+        '_version',
         '_depends_names',
         '_dependson',
         '_configured',
@@ -642,6 +685,7 @@ class DerivedParam(Param):
         self._dependson = tuple([])
         self._configured = False
         self._callable = None
+        self._version = next(_VERSIONS)
 
         self._range = None
         self._tex = None
@@ -682,6 +726,7 @@ class DerivedParam(Param):
             the names are in principle redundant, but by keeping the mapping we can make the lookup of the dependable names quicker 
         """
         self._callable = what
+        self._version = next(_VERSIONS)
     
     def validate_value(self, value):
         return 
@@ -734,6 +779,17 @@ class DerivedParam(Param):
         self._configured = True
         self._dependson = {param.name:param for param in working}
         self.depends_names = tuple([param.name for param in working])
+        self._version = next(_VERSIONS)
+
+    @property
+    def version(self):
+        """tuple : stamps that change whenever the value of this or of any
+        param it depends on changes"""
+        if not self._configured:
+            return (self._version,)
+        return (self._version,) + tuple(
+            param.version for param in self._dependson.values()
+        )
 
 
     @property 
@@ -1274,6 +1330,11 @@ class ParamSet(MutableSequence, Set):
             setattr(result, k, deepcopy(v, memo))
         return result
 
+    def __setstate__(self, state):
+        # needs to be defined for unpickling, as `__getattr__` would otherwise
+        # recurse while `_params` is not set yet
+        self.__dict__.update(state)
+
     def __getitem__(self, i)->Param:
         if isinstance(i, int):
             return self._params[i]
@@ -1553,6 +1614,13 @@ class ParamSet(MutableSequence, Set):
     def state(self):
         return tuple(obj.state for obj in self._params)
 
+    @property
+    def values_version(self):
+        """tuple : versions of the params, changes whenever any of their
+        values changes. Much cheaper than `values_hash` for change detection,
+        but only meaningful within a process."""
+        return tuple(param.version for param in self._params)
+
     @property
     def values_hash(self):
         """int : hash only on the current param values (not full state)"""
@@ -1938,6 +2006,40 @@ def test_Param():
     logging.info('<< PASS : test_Param >>')
 
 
+def test_param_versions():
+    """Unit tests for the version stamps of Param, DerivedParam and ParamSet"""
+    import pickle
+
+    p = Param(name='c', value=1.5*ureg.m, prior=None, range=[1, 2]*ureg.m,
+              is_fixed=False, is_discrete=False, tex=r'\int{\rm c}')
+    val0 = p.value
+
+    # versions change with (and only with) the value, and are shared by
+    # copies until either of them changes
+    p_copy = deepcopy(p)
+    assert p_copy.version == p.version
+    version0 = p.version
+    p.value = val0
+    assert p.version == version0
+    p.value = val0 * 1.01
+    assert p.version > version0
+    assert p_copy.version == version0
+    assert pickle.loads(pickle.dumps(p_copy)).version != version0
+
+    # versions propagate to derived params and param sets
+    derived = DerivedParam(name='d', value=1.0)
+    derived.dependson = [p]
+    derived.callable = callable.Var(p.name) * 2
+    derived_version0 = derived.version
+    pset = ParamSet(p, derived)
+    set_version0 = pset.values_version
+    p.value = val0
+    assert derived.version != derived_version0
+    assert pset.values_version != set_version0
+
+    logging.info('<< PASS : test_param_versions >>')
+
+
 # TODO: add tests for reset() and reset_all() methods
 def test_ParamSet():
     """Unit tests for ParamSet class"""
@@ -2342,5 +2444,6 @@ def test_ParamSelector():
 if __name__ == "__main__":
     set_verbosity(1)
     test_Param()
+    test_param_versions()
     test_ParamSet()
     test_ParamSelector()
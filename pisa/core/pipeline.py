@@ -28,9 +28,11 @@ from pisa.core.events import Data
 from pisa.core.map import Map, MapSet
 from pisa.core.param import ParamSet, DerivedParam
 from pisa.core.stage import Stage
-from pisa.core.container import Container, ContainerSet
+from pisa.core.container import ContainerSet
 from pisa.core.binning import MultiDimBinning, OneDimBinning, VarBinning
+from pisa.core.translation import BinIndices
 from pisa.utils.config_parser import PISAConfigParser, parse_pipeline_config
+from pisa.utils.cuts import get_cut_expression
 from pisa.utils.fileio import mkdir
 from pisa.utils.format import format_times
 from pisa.utils.hash import hash_obj
@@ -84,8 +86,28 @@ class Pipeline():
     profile : bool
         Perform timings
 
+    Notes
+    -----
+    If the pipeline is run in incremental mode (option ``incremental = True``
+    in the ``[pipeline]`` config section, or by setting the `incremental`
+    attribute), only the stages downstream of the first stage whose
+    `Stage.dependency_params` changed since the previous run are rerun. To
+    this end, the keys in `INCREMENTAL_KEYS` (which stages update in place)
+    are copied before every stage with free params, at the expense of
+    memory. Only these keys are restored before rerunning part of the
+    pipeline. Any other key that is modified both upstream and downstream of
+    such a stage would therefore be updated cumulatively, which raises a
+    ValueError at the end of the first (full) run. Keys created by
+    downstream stages are not removed either, so stages must not depend on
+    whether such keys are already present.
+
     """
 
+    INCREMENTAL_KEYS = ("weights", "errors", "bin_unc2", "astro_weights")
+    """Container keys that are restored before rerunning part of an
+    incrementally evaluated pipeline, i.e. the only keys that stages may
+    modify after another stage has modified them in the same run"""
+
     def __init__(self, config, profile=False):
         if isinstance(config, (str, PISAConfigParser)):
             config = parse_pipeline_config(config=config)
@@ -104,6 +126,15 @@ class Pipeline():
         self.detector_name = config['pipeline']['detector_name']
         self._output_binning = config['pipeline']['output_binning']
         self.output_key = config['pipeline']['output_key']
+        self._incremental = config['pipeline'].get('incremental', False)
+        self.fast_maps = config['pipeline'].get('fast_maps', False)
+        """Whether to output fast maps (see `pisa.core.map.Map`)"""
+        self._reset_incremental()
+
+        # Event indices and bin indices per `VarBinning` selection
+        # dict of form [(container_name, binning_hash, selection_index)]
+        #   -> (container, versions, (keep_indices, bin_indices))
+        self._varbinning_selections = {}
 
         self._profile = profile
         self._setup_times = []
@@ -374,78 +405,145 @@ class Pipeline():
         """Logic that produces a single `MapSet` when the pipeline's
         output binning is a regular `MultiDimBinning`.
 
+        If the containers hold replicas of their events (see
+        `pisa.core.container.Container`), which are all histogrammed at
+        once, one `MapSet` per replica is produced.
+
         Returns
         -------
-        outputs : MapSet
+        outputs : MapSet or list of MapSet (one per replica)
 
         """
         self.data.representation = output_binning
+        num_replicas = self.data.num_replicas
         if isinstance(output_key, tuple):
             assert len(output_key) == 2
-            outputs = self.data.get_mapset(output_key[0], error=output_key[1])
+            key, error = output_key
         else:
-            outputs = self.data.get_mapset(output_key)
-        return outputs
+            key, error = output_key, None
+        if num_replicas is None:
+            return self.data.get_mapset(key, error=error, fast=self.fast_maps)
+        return [
+            self.data.get_mapset(key, error=error, fast=self.fast_maps, replica=i)
+            for i in range(num_replicas)
+        ]
+
+    def _get_varbinning_selection(self, container, output_binning, i):
+        """Indices of the events in `container` that belong to the `i`-th
+        selection of `output_binning` and their bin indices w.r.t. the
+        selection's binning. These are cached and only recomputed if any of
+        the variables they depend on has changed, i.e. stages writing to these
+        variables in place have to call `mark_changed` on them.
+
+        Returns
+        -------
+        keep_indices : np.ndarray of int
+
+        bin_indices : pisa.core.translation.BinIndices
+
+        """
+        selections = output_binning.selections
+        binning = output_binning.binnings[i]
+
+        # Variables the selection and binning depend on
+        if isinstance(selections, list):
+            cut_vars = [
+                var for var in get_cut_expression(selections[i]).variables
+                if var in container.all_keys
+            ]
+        else:
+            assert isinstance(selections, OneDimBinning)
+            cut_vars = [selections.name]
+        versions = tuple(
+            container.versions[var] for var in cut_vars + list(binning.names)
+        )
+
+        cache_key = (container.name, hash(output_binning), i)
+        if cache_key in self._varbinning_selections:
+            cached_container, cached_versions, selection = self._varbinning_selections[cache_key]
+            if cached_container is container and cached_versions == versions:
+                return selection
+
+        # Find the events that belong to the given selection, depending on
+        # type of selection.
+        if isinstance(selections, list):
+            keep = container.get_keep_mask(selections[i])
+        else:
+            cut_var = container[selections.name]
+            # cut on bin edges
+            keep = (cut_var >= selections.edge_magnitudes[i]) & (cut_var < selections.edge_magnitudes[i+1])
+        keep_indices = np.flatnonzero(keep)
+
+        # Bin indices of the selected events, following the same conventions
+        # as histogramming a container (see `Container.array_to_binned`)
+        if not binning.is_irregular:
+            sample = []
+            dimensions = []
+            for d in binning:
+                values = np.take(container[d.name], keep_indices, axis=0)
+                if d.is_log:
+                    sample.append(np.log(values))
+                    dimensions.append(OneDimBinning(
+                        d.name,
+                        domain=np.log(d.domain.m),
+                        num_bins=d.num_bins
+                    ))
+                else:
+                    sample.append(values)
+                    dimensions.append(d)
+            hist_binning = MultiDimBinning(dimensions)
+        else:
+            sample = [np.take(container[name], keep_indices, axis=0) for name in binning.names]
+            hist_binning = binning
+        bin_indices = BinIndices(sample, hist_binning)
+
+        selection = (keep_indices, bin_indices)
+        self._varbinning_selections[cache_key] = (container, versions, selection)
+        return selection
 
     def _get_outputs_varbinning(self, output_binning, output_key):
         """Logic that produces multiple `MapSet`s when the pipeline's
         output binning is a `VarBinning`.
 
+        The events of each selection and their bin indices are cached (see
+        `_get_varbinning_selection`), such that only the weights need to be
+        gathered and summed per bin.
+
         Returns
         -------
         outputs : list of MapSet
 
         """
         assert self.data.representation == "events"
+        if self.data.num_replicas is not None:
+            raise NotImplementedError("Replicas are not supported with VarBinning")
         outputs = []
 
-        selections = output_binning.selections
+        if isinstance(output_key, tuple):
+            assert len(output_key) == 2
+            weights_key = output_key[0]
+        else:
+            weights_key = output_key
+
         for i in range(output_binning.nselections):
-            # there will be a new ContainerSet created for each selection
-            containers = []
+            binning = output_binning.binnings[i]
+            maps = []
             for c in self.data.containers:
-                cc = Container(name=c.name)
-                # Find the events that belong to the given selection, depending on
-                # type of selection.
-                # TODO: consider optimisations such as caching these masks?
-                if isinstance(selections, list):
-                    keep = c.get_keep_mask(selections[i])
-                else:
-                    assert isinstance(selections, OneDimBinning)
-                    cut_var = c[selections.name]
-                    # cut on bin edges
-                    keep = (cut_var >= selections.edge_magnitudes[i]) & (cut_var < selections.edge_magnitudes[i+1])
-                for var_name in output_binning.binnings[i].names:
-                    # Store the selected var_name entries (corresponding to the
-                    # dimensions in which the data for this selection will be
-                    # binned) in the fresh Container
-                    cc[var_name] = c[var_name][keep]
-                # store the quantities that will populate each bin
+                keep_indices, bin_indices = self._get_varbinning_selection(
+                    c, output_binning, i
+                )
+                weights = np.take(c[weights_key], keep_indices, axis=0)
+                hist = bin_indices.histogram(weights).reshape(binning.shape)
                 if isinstance(output_key, tuple):
-                    assert len(output_key) == 2
-                    cc[output_key[0]] = c[output_key[0]][keep]
-                    cc.tranlation_modes[output_key[0]] = 'sum'
-                    cc[output_key[1]] = np.square(c[output_key[0]][keep])
-                    cc.tranlation_modes[output_key[1]] = 'sum'
-                else:
-                    cc[output_key] = c[output_key][keep]
-                    cc.tranlation_modes[output_key] = 'sum'
-
-                containers.append(cc)
-
-            dat = ContainerSet(
-                name=self.data.name,
-                containers=containers,
-                representation=output_binning.binnings[i],
-            )
-
-            if isinstance(output_key, tuple):
-                for c in dat.containers:
                     # uncertainties
-                    c[output_key[1]] = np.sqrt(c[output_key[1]])
-                outputs.append(dat.get_mapset(output_key[0], error=output_key[1]))
-            else:
-                outputs.append(dat.get_mapset(output_key))
+                    error_hist = np.sqrt(
+                        bin_indices.histogram(np.square(weights))
+                    ).reshape(binning.shape)
+                else:
+                    error_hist = None
+                maps.append(Map(name=c.name, hist=hist, error_hist=error_hist,
+                                binning=binning, fast=self.fast_maps))
+            outputs.append(MapSet(name=self.data.name, maps=maps))
         return outputs
 
 
@@ -541,10 +639,131 @@ class Pipeline():
 
     def _run_function(self):
         """Run the pipeline to compute"""
-        for stage in self.stages:
+        if not self.incremental:
+            for stage in self.stages:
+                logging.debug(f"Working on stage {stage.stage_name}.{stage.service_name}")
+                stage.run()
+            return
+
+        stages = self.stages
+        dependency_versions = [stage.dependency_version for stage in stages]
+        start = self._incremental_start(dependency_versions)
+        if start > 0:
+            self._restore_snapshot(self._snapshots[start])
+
+        # on a full run, record which keys are modified before and after each
+        # snapshot to check that restoring the snapshots is sufficient
+        full_run = start == 0
+        if full_run:
+            run_versions = self._get_key_versions()
+            snapshot_versions = {}
+
+        for idx, stage in enumerate(stages):
+            if idx < start:
+                logging.trace(f"Skipping stage {stage.stage_name}.{stage.service_name}")
+                continue
+            if idx > start and len(stage.params.free) > 0:
+                self._snapshots[idx] = self._take_snapshot()
+                if full_run:
+                    snapshot_versions[idx] = self._get_key_versions()
             logging.debug(f"Working on stage {stage.stage_name}.{stage.service_name}")
             stage.run()
 
+        if full_run:
+            self._check_incremental_keys(run_versions, snapshot_versions)
+        self._dependency_versions = dependency_versions
+
+    @property
+    def incremental(self):
+        """bool : whether to only rerun the stages affected by param changes
+        since the previous run"""
+        return self._incremental
+
+    @incremental.setter
+    def incremental(self, value):
+        self._incremental = bool(value)
+        self._reset_incremental()
+
+    def _reset_incremental(self):
+        """Forget the state of previous runs, such that the next run of an
+        incrementally evaluated pipeline runs all stages"""
+        self._dependency_versions = None
+        self._snapshots = {}
+
+    def _incremental_start(self, dependency_versions):
+        """Index of the stage from which on to rerun the pipeline: the last
+        stage with a snapshot that is not downstream of any changed stage
+        (0 if there is none)"""
+        if (self._dependency_versions is None
+                or len(self._dependency_versions) != len(dependency_versions)):
+            self._reset_incremental()
+            return 0
+
+        first_changed = len(dependency_versions)
+        for idx, (new, old) in enumerate(zip(dependency_versions, self._dependency_versions)):
+            if new != old:
+                first_changed = idx
+                break
+
+        # always rerun from the last snapshot on, since outputs may have been
+        # modified in place after the previous run (e.g. by `get_outputs`)
+        return max((idx for idx in self._snapshots if idx <= first_changed), default=0)
+
+    def _take_snapshot(self):
+        """Copy `INCREMENTAL_KEYS` of all containers in the representation in
+        which they are currently valid"""
+        snapshot = {}
+        for container in self.data.containers:
+            for key in self.INCREMENTAL_KEYS:
+                if key not in container.all_keys:
+                    continue
+                rep = container.find_valid_representation(key)
+                if rep is None:
+                    continue
+                rep_data = container.data[container.get_representation_id(rep)]
+                snapshot[(container.name, key)] = (rep, np.copy(rep_data[key]))
+        return snapshot
+
+    def _get_key_versions(self):
+        """Versions (see `Container.mark_changed`) of all keys of all
+        containers"""
+        return {
+            (container.name, key): version
+            for container in self.data.containers
+            for key, version in container.versions.items()
+        }
+
+    def _check_incremental_keys(self, run_versions, snapshot_versions):
+        """Make sure that no key other than `INCREMENTAL_KEYS` is modified
+        both before and after any of the snapshots during a run, given the
+        key versions at the start of the run and at each snapshot, as
+        rerunning the stages from that snapshot on would then modify it
+        again"""
+        end_versions = self._get_key_versions()
+        for idx, versions in snapshot_versions.items():
+            for (name, key), version in versions.items():
+                if key in self.INCREMENTAL_KEYS:
+                    continue
+                if (version != run_versions.get((name, key), 0)
+                        and end_versions[(name, key)] != version):
+                    stage = self.stages[idx]
+                    raise ValueError(
+                        f"Pipeline '{self.name}' cannot be evaluated "
+                        f"incrementally: key '{key}' of container '{name}' is "
+                        f"modified both before and after stage "
+                        f"{stage.stage_name}.{stage.service_name}, but only "
+                        f"{self.INCREMENTAL_KEYS} are restored before "
+                        "rerunning it."
+                    )
+
+    def _restore_snapshot(self, snapshot):
+        """Restore container data from a snapshot (see `_take_snapshot`)"""
+        for (name, key), (rep, array) in snapshot.items():
+            container = self.data[name]
+            container.representation = rep
+            container[key] = np.copy(array)
+        self.data.representation = self.data.representation
+
     def setup(self):
         """Wrapper around `_setup_function`"""
         if self.profile:
@@ -558,9 +777,33 @@ class Pipeline():
     def _setup_function(self):
         """Setup (reset) all stages"""
         self.data = ContainerSet(self.name)
+        self._reset_incremental()
+        self._varbinning_selections = {}
         for stage in self.stages:
             stage.data = self.data
             stage.setup()
+        self._check_replicas()
+
+    def _check_replicas(self):
+        """Make sure that, if the containers hold replicas of their events,
+        no stage follows the one histogramming them (see
+        `Stage.histograms_replicas`), as binned stages only handle weights of
+        shape (bins,) and would fail or silently broadcast wrongly"""
+        if self.data.num_replicas is None:
+            return
+        for idx, stage in enumerate(self.stages[:-1]):
+            if stage.histograms_replicas:
+                following = ", ".join(
+                    f"{s.stage_name}.{s.service_name}" for s in self.stages[idx+1:]
+                )
+                raise ValueError(
+                    f"Pipeline '{self.name}': the containers hold "
+                    f"{self.data.num_replicas} replicas of their events, which "
+                    f"are histogrammed by stage {stage.stage_name}."
+                    f"{stage.service_name}, but the stage(s) {following} follow "
+                    "it. Stages operating on the binned replicas are not "
+                    "supported, so the histogramming has to be the last stage."
+                )
 
     def update_params(self, params, existing_must_match=False, extend=False):
         """Update params for the pipeline.
@@ -840,6 +1083,36 @@ def test_Pipeline():
     out = p.get_outputs()
     # a split into two event selections has to result in two MapSets
     assert len(out) == 2
+    # cached selections are only re-used as long as the events are unchanged
+    cached = dict(p._varbinning_selections) # pylint: disable=protected-access
+    p.get_outputs()
+    assert all(
+        p._varbinning_selections[k][2] is v[2] for k, v in cached.items() # pylint: disable=protected-access
+    )
+    for container in p.data:
+        container['reco_energy'] = container['reco_energy'] * 1
+    for mapset, mapset_ref in zip(p.get_outputs(), out):
+        for m, m_ref in zip(mapset, mapset_ref):
+            assert np.array_equal(m.nominal_values, m_ref.nominal_values)
+            assert np.array_equal(m.std_devs, m_ref.std_devs)
+    assert all(
+        p._varbinning_selections[k][2] is not v[2] for k, v in cached.items() # pylint: disable=protected-access
+    )
+    # an in-place write to the split variable (as done e.g. by the pid stage)
+    # has to be flagged via `mark_changed`, after which the outputs agree with
+    # those of a fresh pipeline that never saw the original values
+    def flip_pid(pipeline):
+        for container in pipeline.data:
+            container.representation = 'events'
+            container['pid'][:] = -container['pid']
+            container.mark_changed('pid')
+    flip_pid(p)
+    p_fresh = Pipeline("settings/pipeline/varbin_example.cfg")
+    flip_pid(p_fresh)
+    for mapset, mapset_ref in zip(p.get_outputs(), p_fresh.get_outputs()):
+        for m, m_ref in zip(mapset, mapset_ref):
+            assert np.array_equal(m.nominal_values, m_ref.nominal_values)
+            assert np.array_equal(m.std_devs, m_ref.std_devs)
     # a binned apply_mode has to result in a ValueError
     # first get a pre-existing binning
     binned_calc_mode = p.stages[2].calc_mode
@@ -871,6 +1144,55 @@ def test_Pipeline():
     invalid_vb = VarBinning(binnings=vb.binnings, selections=sel)
     p.output_binning = invalid_vb
 
+    #
+    # Test: incremental evaluation gives the same outputs as a full run
+    #
+    full = Pipeline("settings/pipeline/example.cfg")
+    incremental = Pipeline("settings/pipeline/example.cfg")
+    incremental.incremental = True
+    # change the params of the last stage first, then of upstream stages
+    changed = [[]] + [[par.name] for par in incremental.params.free][::-1]
+    for names in changed:
+        for name in names:
+            for pipe in (full, incremental):
+                param = pipe.params[name]
+                param.value = param.value + 0.1 * (param.range[1] - param.range[0])
+                pipe.update_params(param)
+        for out_full, out_inc in zip(full.get_outputs(), incremental.get_outputs()):
+            for values in ("nominal_values", "std_devs"):
+                assert np.allclose(
+                    getattr(out_full, values), getattr(out_inc, values),
+                    rtol=1e-12, atol=0
+                ), names
+
+    # params that only enter the setup of a stage don't trigger a rerun
+    osc = incremental.stages[incremental.index("osc")]
+    assert "prop_height" not in osc.dependency_params
+    dependency_version = osc.dependency_version
+    osc.params.prop_height.value = osc.params.prop_height.value * 2
+    assert osc.dependency_version == dependency_version
+    osc.params.theta23.value = osc.params.theta23.value * 1.01
+    assert osc.dependency_version != dependency_version
+
+    # only `INCREMENTAL_KEYS` may be modified both up- and downstream of a
+    # stage with free params, here the `nu_flux` (modified by the flux stage)
+    # by the aeff stage
+    invalid = Pipeline("settings/pipeline/example.cfg")
+    invalid.incremental = True
+    aeff = invalid.stages[invalid.index("aeff")]
+    def apply_function():
+        for container in aeff.data:
+            container["nu_flux"] *= 1
+            container.mark_changed("nu_flux")
+    aeff.apply_function = apply_function
+    try:
+        invalid.run()
+    except ValueError:
+        pass
+    else:
+        assert False
+    logging.info('<< PASS : test_Pipeline >>')
+
 # ----- Most of this below cang go (?) ---
 
 def parse_args():
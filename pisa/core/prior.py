@@ -151,7 +151,6 @@ class Prior(object):
         self.units = None
         kind = kind.lower() if isinstance(kind, str) else kind
 
-        self.chi2 = lambda x: -2*self.llh(x)
         # Dispatch the correct initialization method
         if kind in [None, 'none', 'uniform']:
             self.__init_uniform(**kwargs)
@@ -173,7 +172,7 @@ class Prior(object):
         return ' ' + format(ureg(self.units).units, '~').strip()
 
     def __str__(self):
-        return self._str(self)
+        return self._str()
 
     def __repr__(self):
         return '<' + str(self.__class__) + ' ' + self.__str__() + '>'
@@ -201,14 +200,12 @@ class Prior(object):
         self._state_attrs.append('llh_offset')
         self.kind = 'uniform'
         self.llh_offset = llh_offset
-        def llh(x):
-            return 0.*self.__strip(x) + self.llh_offset
-        self.llh = llh
+        self.llh = self._llh_uniform
         self.max_at = np.nan
         self.max_at_str = 'no maximum'
         self.valid_range = (-np.inf * ureg(self.units),
                             np.inf * ureg(self.units))
-        self._str = lambda s: 'uniform prior, llh_offset=%s' %self.llh_offset
+        self._str = self._str_uniform
 
     def __init_jeffreys(self, A, B):
         """Calculate jeffreys prior as defined in Sivia p.125"""
@@ -221,17 +218,12 @@ class Prior(object):
         B = B.to(A.units)
         self.A = A
         self.B = B
-        def llh(x):
-            x = self.__strip(self.__convert(x))
-            A = self.__strip(self.A)
-            B = self.__strip(self.B)
-            return - np.log(x) + np.log(np.log(B)-np.log(A))
-        self.llh = llh
+        self.llh = self._llh_jeffreys
         self.max_at = self.A
         self.max_at_str = self.__stringify(self.max_at)
         self.valid_range = (self.A * ureg(self.units),
                             self.B * ureg(self.units))
-        self._str = lambda s: "jeffreys' prior, range [%s,%s]"%(self.A, self.B)
+        self._str = self._str_jeffreys
 
     def __init_gaussian(self, mean, stddev):
         mean = interpret_quantity(mean, expect_sequence=False)
@@ -246,19 +238,12 @@ class Prior(object):
             stddev = stddev.to(self.units)
         self.mean = mean
         self.stddev = stddev
-        def llh(x):
-            x = self.__strip(self.__convert(x))
-            m = self.__strip(self.mean)
-            s = self.__strip(self.stddev)
-            return -(x-m)**2 / (2*s**2)
-        self.llh = llh
+        self.llh = self._llh_gaussian
         self.max_at = self.mean
         self.max_at_str = self.__stringify(self.max_at)
         self.valid_range = (-np.inf * ureg(self.units),
                             np.inf * ureg(self.units))
-        self._str = lambda s: 'gaussian prior: stddev=%s%s, maximum at %s%s' \
-                %(self.__stringify(self.stddev), self.units_str,
-                  self.__stringify(self.mean), self.units_str)
+        self._str = self._str_gaussian
 
     def __init_linterp(self, param_vals, llh_vals):
         param_vals = interpret_quantity(param_vals, expect_sequence=True)
@@ -270,18 +255,12 @@ class Prior(object):
                                bounds_error=True, assume_sorted=False)
         self.param_vals = param_vals
         self.llh_vals = llh_vals
-        def llh(x):
-            x = self.__strip(self.__convert(x))
-            return self.interp(x)
-        self.llh = llh
+        self.llh = self._llh_linterp
         self.max_at = self.param_vals[self.llh_vals == np.max(self.llh_vals)]
         self.max_at_str = ', '.join([self.__stringify(v) for v in self.max_at])
         self.valid_range = (np.min(self.param_vals) * ureg(self.units),
                             np.max(self.param_vals) * ureg(self.units))
-        self._str = lambda s: 'linearly-interpolated prior: valid in [%s, %s]%s, maxima at (%s)%s' \
-                %(self.__stringify(np.min(self.param_vals)),
-                  self.__stringify(np.max(self.param_vals)), self.units_str,
-                  self.max_at_str, self.units_str)
+        self._str = self._str_linterp
 
     def __init_spline(self, knots, coeffs, deg, units=None):
         knots = interpret_quantity(knots, expect_sequence=True)
@@ -299,10 +278,7 @@ class Prior(object):
         self.knots = knots
         self.coeffs = coeffs
         self.deg = deg
-        def llh(x):
-            x = self.__strip(self.__convert(x))
-            return splev(x, tck=(self.__strip(self.knots), coeffs, deg), ext=2)
-        self.llh = llh
+        self.llh = self._llh_spline
         self.max_at = fminbound(
             func=self.__attach_units_to_args(self.chi2),
             x1=np.min(self.__strip(self.knots)),
@@ -313,7 +289,57 @@ class Prior(object):
         self.max_at_str = self.__stringify(self.max_at)
         self.valid_range = (np.min(self.knots) * ureg(self.units),
                             np.max(self.knots) * ureg(self.units))
-        self._str = lambda s: 'spline prior: deg=%d, valid in [%s, %s]%s; max at %s%s' \
+        self._str = self._str_spline
+
+    # The llh and string representations of each kind of prior are bound methods
+    # (rather than closures) such that priors can be pickled, e.g. to send fit
+    # results between processes.
+
+    def chi2(self, x):
+        return -2*self.llh(x)
+
+    def _llh_uniform(self, x):
+        return 0.*self.__strip(x) + self.llh_offset
+
+    def _str_uniform(self):
+        return 'uniform prior, llh_offset=%s' %self.llh_offset
+
+    def _llh_jeffreys(self, x):
+        x = self.__strip(self.__convert(x))
+        A = self.__strip(self.A)
+        B = self.__strip(self.B)
+        return - np.log(x) + np.log(np.log(B)-np.log(A))
+
+    def _str_jeffreys(self):
+        return "jeffreys' prior, range [%s,%s]"%(self.A, self.B)
+
+    def _llh_gaussian(self, x):
+        x = self.__strip(self.__convert(x))
+        m = self.__strip(self.mean)
+        s = self.__strip(self.stddev)
+        return -(x-m)**2 / (2*s**2)
+
+    def _str_gaussian(self):
+        return 'gaussian prior: stddev=%s%s, maximum at %s%s' \
+                %(self.__stringify(self.stddev), self.units_str,
+                  self.__stringify(self.mean), self.units_str)
+
+    def _llh_linterp(self, x):
+        x = self.__strip(self.__convert(x))
+        return self.interp(x)
+
+    def _str_linterp(self):
+        return 'linearly-interpolated prior: valid in [%s, %s]%s, maxima at (%s)%s' \
+                %(self.__stringify(np.min(self.param_vals)),
+                  self.__stringify(np.max(self.param_vals)), self.units_str,
+                  self.max_at_str, self.units_str)
+
+    def _llh_spline(self, x):
+        x = self.__strip(self.__convert(x))
+        return splev(x, tck=(self.__strip(self.knots), self.coeffs, self.deg), ext=2)
+
+    def _str_spline(self):
+        return 'spline prior: deg=%d, valid in [%s, %s]%s; max at %s%s' \
                 %(self.deg, self.__stringify(np.min(self.knots)),
                   self.__stringify(np.max(self.knots)), self.units_str,
                   self.max_at_str, self.units_str)
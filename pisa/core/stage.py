@@ -14,7 +14,7 @@ from pisa.core.binning import MultiDimBinning
 from pisa.core.container import Container, ContainerSet
 from pisa.utils.format import format_times
 from pisa.utils.log import logging
-from pisa.core.param import ParamSelector
+from pisa.core.param import ParamSelector, ParamSet
 from pisa.utils.format import arg_str_seq_none
 from pisa.utils.hash import hash_obj
 
@@ -166,7 +166,8 @@ class Stage():
         self._error_method = error_method
 
         self.param_hash = None
-        """Hash of stage params. Also serves as an indicator of whether `setup()`
+        """Version of stage param values (see `ParamSet.values_version`) as of
+        the last `compute()`. Also serves as an indicator of whether `setup()`
         has already been called."""
 
         self.profile = profile
@@ -258,6 +259,30 @@ class Stage():
         """Params"""
         return self._params
 
+    @property
+    def dependency_params(self):
+        """Names of the params that the output of this stage depends on
+        (default: all of its params). Services whose output does not depend
+        on some of their params can override this, such that incrementally
+        evaluated pipelines do not rerun them when only those change."""
+        return self.params.names
+
+    @property
+    def histograms_replicas(self):
+        """Whether the stage histograms the replicas of the events held by the
+        containers (see `pisa.core.container.Container`), i.e. whether it
+        produces binned weights with a trailing replica axis. No other
+        service handles that axis, so a pipeline rejects any stage after it."""
+        return False
+
+    @property
+    def dependency_version(self):
+        """Version of the current values of `dependency_params`"""
+        names = self.dependency_params
+        if tuple(names) == self.params.names:
+            return self.params.values_version
+        return ParamSet([self.params[name] for name in names]).values_version
+
     @property
     def param_selections(self):
         """Param selections"""
@@ -479,7 +504,8 @@ class Stage():
     def compute(self):
 
         # simplest caching algorithm: don't compute if params didn't change
-        new_param_hash = self.params.values_hash
+        # (compare versions rather than `values_hash`, which is expensive)
+        new_param_hash = self.params.values_version
         if new_param_hash == self.param_hash:
             logging.trace("cached output")
             return
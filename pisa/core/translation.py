@@ -36,10 +36,13 @@ from pisa.utils.profiler import line_profile, profile
 __all__ = [
     'resample',
     'histogram',
+    'BinIndices',
+    'find_bin_indices',
     'lookup',
     'find_index',
     'find_index_unsafe',
     'test_histogram',
+    'test_bin_indices',
     'test_find_index',
 ]
 
@@ -71,8 +74,13 @@ def resample(weights, old_sample, old_binning, new_sample, new_binning):
 
     # This is a two step process: first histogram the weights into the new binning
     # and keep the flat_hist_counts
-    flat_hist = histogram_np(old_sample, weights, new_binning, apply_weights=True)
-    flat_hist_counts = histogram_np(old_sample, weights, new_binning, apply_weights=False)
+    bin_indices = BinIndices(old_sample, new_binning, regular=False)
+    flat_hist = bin_indices.histogram(weights)
+    flat_hist_counts = bin_indices.counts
+    if flat_hist.ndim == 2:
+        flat_hist_counts = np.repeat(
+            flat_hist_counts[:, np.newaxis], flat_hist.shape[1], axis=1
+        )
 
     with np.errstate(divide='ignore', invalid='ignore'):
         flat_hist /= flat_hist_counts
@@ -90,7 +98,8 @@ def resample(weights, old_sample, old_binning, new_sample, new_binning):
 
 # --------- histogramming methods ---------------
 
-def histogram(sample, weights, binning, averaged, apply_weights=True):
+def histogram(sample, weights, binning, averaged, apply_weights=True,
+              bin_indices=None):
     """Histogram `sample` points, weighting by `weights`, according to `binning`.
 
     Parameters
@@ -110,10 +119,26 @@ def histogram(sample, weights, binning, averaged, apply_weights=True):
     apply_weights : bool
         wether to use weights or not
 
+    bin_indices : BinIndices, optional
+        Bin indices of `sample` in `binning` computed beforehand (and cached
+        by the caller); if provided, `sample` is not used at all and
+        histogramming reduces to summing `weights` per bin index
+
     """
     if not isinstance(binning, MultiDimBinning):
         raise ValueError("Binning should be a PISA MultiDimBinning")
 
+    if bin_indices is not None:
+        flat_hist = bin_indices.histogram(weights)
+        if averaged:
+            flat_hist_counts = bin_indices.counts
+            if flat_hist.ndim == 2:
+                flat_hist_counts = flat_hist_counts[:, np.newaxis]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                flat_hist /= flat_hist_counts
+                flat_hist = np.nan_to_num(flat_hist)
+        return flat_hist
+
     if binning.is_irregular or not binning.is_lin:
         flat_hist = histogram_np(sample, weights, binning, apply_weights=True)
     else:
@@ -131,6 +156,141 @@ def histogram(sample, weights, binning, averaged, apply_weights=True):
 
     return flat_hist
 
+
+class BinIndices():
+    """Flat bin index of every point in `sample` w.r.t. `binning`.
+
+    Since the coordinates of events usually stay the same while their weights
+    change, this allows histogramming any number of weight arrays without
+    finding the bins of the events over and over again.
+
+    Bin membership is the same as for `histogram`, i.e. that of
+    `fast_histogram` (upper-most edge exclusive) for regular and linear
+    binnings, and that of `np.histogramdd` otherwise.
+
+    Parameters
+    ----------
+    sample : list of np.ndarray
+
+    binning : PISA MultiDimBinning
+
+    regular : bool, optional
+        Force (or disable with False) the use of the regular binning
+        convention; by default this is chosen the same way as in `histogram`
+
+    """
+    def __init__(self, sample, binning, regular=None):
+        self.num_bins = binning.size
+        self.indices = find_bin_indices(sample, binning, regular=regular)
+        self._counts = None
+
+    @property
+    def counts(self):
+        """Number of sample points in each bin (computed once)"""
+        if self._counts is None:
+            self._counts = self.histogram(None)
+        return self._counts
+
+    def histogram(self, weights):
+        """Flat histogram of `weights`.
+
+        Parameters
+        ----------
+        weights : None, np.ndarray of shape (N,) or (N, d)
+            Unweighted counts are returned for None
+
+        Returns
+        -------
+        flat_hist : np.ndarray of shape (num_bins,) or (num_bins, d)
+
+        """
+        # out-of-range points have index `num_bins`, which is cut off again
+        if weights is not None and weights.ndim == 2:
+            flat_hist = np.zeros((self.num_bins + 1, weights.shape[1]))
+            _scatter_add_array(self.indices, weights, flat_hist)
+        else:
+            flat_hist = np.bincount(
+                self.indices, weights=weights, minlength=self.num_bins + 1
+            )
+        return flat_hist[:-1].astype(FTYPE)
+
+
+def find_bin_indices(sample, binning, regular=None):
+    """Find the flat (C-order) bin index of all `sample` points in `binning`.
+
+    Parameters
+    ----------
+    sample : list of np.ndarray
+
+    binning : PISA MultiDimBinning
+
+    regular : bool, optional
+        Whether to use the `fast_histogram` convention for regular and linear
+        binnings, i.e., compute indices arithmetically and exclude the
+        upper-most edge. Defaults to the choice `histogram` makes.
+
+    Returns
+    -------
+    indices : np.ndarray of int64
+        Points outside of the binning (or nan) get index `binning.size`
+
+    """
+    if not isinstance(binning, MultiDimBinning):
+        raise ValueError("Binning should be a PISA MultiDimBinning")
+    if len(sample) != binning.num_dims:
+        raise ValueError("Need one sample array per binning dimension")
+    if regular is None:
+        regular = not binning.is_irregular and binning.is_lin
+
+    indices = np.zeros(len(sample[0]), dtype=np.int64)
+    for dim, values in zip(binning, sample):
+        if regular:
+            xmin, xmax = dim.domain.m
+            update_regular_bin_indices(values, xmin, xmax, dim.num_bins, indices)
+        else:
+            update_bin_indices(values, dim.edge_magnitudes, indices)
+    indices[indices < 0] = binning.size
+    return indices
+
+
+@njit(parallel=True if TARGET == "parallel" else False)
+def update_regular_bin_indices(x, xmin, xmax, nx, indices):
+    """Fold the bin index along a regular, linear dimension into `indices`
+    (-1 marks points outside the binning); same arithmetic as in
+    `fast_histogram`"""
+    normx = nx / (xmax - xmin)
+    for idx in prange(len(indices)):
+        if indices[idx] < 0:
+            continue
+        if x[idx] >= xmin and x[idx] < xmax:
+            ix = min(int((x[idx] - xmin) * normx), nx - 1)
+            indices[idx] = indices[idx] * nx + ix
+        else:
+            indices[idx] = -1
+
+
+@njit(parallel=True if TARGET == "parallel" else False)
+def update_bin_indices(x, bin_edges, indices):
+    """Fold the bin index along an arbitrary dimension into `indices` (-1
+    marks points outside the binning); same convention as `np.histogramdd`"""
+    num_bins = len(bin_edges) - 1
+    for idx in prange(len(indices)):
+        if indices[idx] < 0:
+            continue
+        ix = find_index(x[idx], bin_edges)
+        if ix < 0 or ix >= num_bins:
+            indices[idx] = -1
+        else:
+            indices[idx] = indices[idx] * num_bins + ix
+
+
+@njit
+def _scatter_add_array(indices, weights, out):
+    for idx in range(len(indices)):
+        for d in range(weights.shape[1]):
+            out[indices[idx], d] += weights[idx, d]
+
+
 def _threaded_fh_histogramdd(sample, weights, bins, bin_range):
     if not TARGET == "parallel":
         return fh.histogramdd(sample=sample, weights=weights, bins=bins, range=bin_range)
@@ -179,13 +339,12 @@ def histogram_fh(sample, weights, binning, apply_weights=True):  # pylint: disab
                          "or a (D, N) array-like.")
 
     if weights is not None and weights.ndim == 2:
-        # that means it's 1-dim data instead of scalars
-        hists = []
-        for i in range(weights.shape[1]):
-            w = weights[:, i] if apply_weights else None
-            hist = _threaded_fh_histogramdd(sample=_sample, weights=w, bins=bins, bin_range=ranges)
-            hists.append(hist.ravel())
-        flat_hist = np.stack(hists, axis=1)
+        # that means it's 1-dim data instead of scalars; only find the bins
+        # once for all columns
+        bin_indices = BinIndices(_sample, binning, regular=True)
+        if not apply_weights:
+            return np.repeat(bin_indices.counts[:, np.newaxis], weights.shape[1], axis=1)
+        return bin_indices.histogram(weights)
     else:
         w = weights if apply_weights else None
         
@@ -198,13 +357,12 @@ def histogram_np(sample, weights, binning, apply_weights=True):  # pylint: disab
 
     bin_edges = [edges.magnitude for edges in binning.bin_edges]
     if weights is not None and weights.ndim == 2:
-        # that means it's 1-dim data instead of scalars
-        hists = []
-        for i in range(weights.shape[1]):
-            w = weights[:, i] if apply_weights else None
-            hist, _ = np.histogramdd(sample=sample, weights=w, bins=bin_edges)
-            hists.append(hist.ravel())
-        flat_hist = np.stack(hists, axis=1)
+        # that means it's 1-dim data instead of scalars; only find the bins
+        # once for all columns
+        bin_indices = BinIndices(sample, binning, regular=False)
+        if not apply_weights:
+            return np.repeat(bin_indices.counts[:, np.newaxis], weights.shape[1], axis=1)
+        return bin_indices.histogram(weights)
     else:
         w = weights if apply_weights else None
         hist, _ = np.histogramdd(sample=sample, weights=w, bins=bin_edges)
@@ -807,6 +965,56 @@ def test_histogram():
     logging.info('<< PASS : test_histogram >>')
 
 
+def test_bin_indices():
+    """Unit tests for `BinIndices`, which must yield results identical to
+    those of `histogram`"""
+    n_evts = 10000
+    rand = np.random.RandomState(seed=0)
+
+    binnings = [
+        # regular, linear -> fast_histogram convention
+        MultiDimBinning([
+            OneDimBinning(name='x', num_bins=7, is_lin=True, domain=[0.1, 0.9]),
+            OneDimBinning(name='y', num_bins=3, is_lin=True, domain=[0, 1]),
+        ]),
+        # logarithmic -> numpy convention
+        MultiDimBinning([
+            OneDimBinning(name='x', num_bins=5, is_log=True, domain=[0.1, 1]),
+        ]),
+        # irregular -> numpy convention
+        MultiDimBinning([
+            OneDimBinning(name='x', bin_edges=[0, 0.1, 0.5, 0.6, 1]),
+            OneDimBinning(name='y', num_bins=4, is_lin=True, domain=[0, 1]),
+        ]),
+    ]
+    for binning in binnings:
+        # include points outside of the binning and exactly on the edges
+        sample = []
+        for dim in binning:
+            s = rand.uniform(-0.1, 1.1, n_evts)
+            s[:dim.num_bins + 1] = dim.edge_magnitudes
+            sample.append(s.astype(FTYPE))
+        weights = rand.rand(n_evts).astype(FTYPE)
+        weights_2d = rand.rand(n_evts, 3).astype(FTYPE)
+
+        bin_indices = BinIndices(sample, binning)
+        for w in [weights, weights_2d]:
+            for averaged in [False, True]:
+                ref = histogram(sample, w, binning, averaged=averaged)
+                test = histogram(sample, w, binning, averaged=averaged,
+                                 bin_indices=bin_indices)
+                assert np.array_equal(test, ref), f'\ntest:\n{test}\n\nref:\n{ref}'
+
+        ref_counts = histogram(sample, None, binning, averaged=False)
+        assert np.array_equal(bin_indices.counts, ref_counts)
+
+        # nan is outside of any binning (unlike in `fast_histogram`)
+        sample[0][-1] = np.nan
+        assert find_bin_indices(sample, binning)[-1] == binning.size
+
+    logging.info('<< PASS : test_bin_indices >>')
+
+
 def test_find_index():
     """Unit tests for `find_index` function.
 
@@ -933,3 +1141,4 @@ if __name__ == '__main__':
     set_verbosity(1)
     test_find_index()
     test_histogram()
+    test_bin_indices()
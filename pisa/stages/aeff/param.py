@@ -178,6 +178,11 @@ class param(Stage): # pylint: disable=invalid-name
         self.energy_param = load_aeff_param(self.params.aeff_energy_paramfile.value)
         self.coszen_param = load_aeff_param(self.params.aeff_coszen_paramfile.value)
 
+    @property
+    def dependency_params(self):
+        # the parameterisations are only loaded on instantiation
+        return ('livetime', 'aeff_scale')
+
     def apply_function(self):
         aeff_scale = self.params.aeff_scale.m_as('dimensionless')
         livetime_s = self.params.livetime.m_as('sec')
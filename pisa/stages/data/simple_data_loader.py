@@ -62,6 +62,11 @@ class simple_data_loader(Stage):  # pylint: disable=invalid-name
         Event categories to be recorded. If specified,
         needs to be a subset of names in `events_file`.
 
+    events_cache_dir : str, default: None
+        If specified, cache the loaded and cut events in this directory as
+        memory-mapped columns, which are re-used by subsequent loads of the
+        same files with the same settings (see `EventsPi.load_events_file`).
+
     Notes
     -----
     Looks for `initial_weights` fields in events file, which will serve
@@ -79,6 +84,7 @@ class simple_data_loader(Stage):  # pylint: disable=invalid-name
                  events_subsample_index=0,
                  seed=123456,
                  output_names=None,
+                 events_cache_dir=None,
                  **std_kwargs,
                 ):
 
@@ -92,6 +98,7 @@ class simple_data_loader(Stage):  # pylint: disable=invalid-name
         self.events_subsample_index = int(events_subsample_index)
         self.seed = int(seed)
         self.output_names = output_names
+        self.events_cache_dir = events_cache_dir
 
         # Handle list inputs
         self.events_file = split(self.events_file)
@@ -137,11 +144,14 @@ class simple_data_loader(Stage):  # pylint: disable=invalid-name
                 self.data_dict = eval(self.data_dict)
 
         # Load the event file into the events structure
+        # (already applying the cuts, such that these can be cached as well)
         self.evts.load_events_file(
             events_file=self.events_file,
             variable_mapping=self.data_dict,
             required_metadata=self.required_metadata,
             seed=self.seed,
+            keep_criteria=self.mc_cuts if self.mc_cuts else None,
+            cache_dir=self.events_cache_dir,
         )
 
         if hasattr(self.evts, "metadata"):
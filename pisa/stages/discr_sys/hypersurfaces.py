@@ -11,6 +11,7 @@ from __future__ import absolute_import, print_function, division
 
 import ast
 from collections.abc import Mapping
+from functools import partial
 import numpy as np
 
 from pisa import FTYPE, ureg
@@ -178,24 +179,32 @@ class hypersurfaces(Stage): # pylint: disable=invalid-name
         for container in self.data:
 
             # Get the hypersurfaces
-            if self.interpolated:
-                # in the case of interpolated hypersurfaces, the actual hypersurface
-                # must be generated for the given oscillation parameters first
-                container_hs = self.hypersurfaces[container.name].get_hypersurface(**osc_params)
+            if self.interpolated and not self.fluctuate:
+                # in the case of interpolated hypersurfaces, the interpolator evaluates
+                # the hypersurface at the given oscillation parameters directly
+                hs_evaluate = partial(
+                    self.hypersurfaces[container.name].evaluate, osc_params
+                )
             else:
-                container_hs = self.hypersurfaces[container.name]
+                if self.interpolated:
+                    # the actual hypersurface must be generated for the given
+                    # oscillation parameters first
+                    container_hs = self.hypersurfaces[container.name].get_hypersurface(**osc_params)
+                else:
+                    container_hs = self.hypersurfaces[container.name]
 
-            # Fluctute the hypersurfaces, if requested
-            if self.fluctuate :
-                container_hs = container_hs.fluctuate(random_state=fluctuate_random_state) #TODO oncely need to do this once if not interpolating
+                # Fluctute the hypersurfaces, if requested
+                if self.fluctuate :
+                    container_hs = container_hs.fluctuate(random_state=fluctuate_random_state) #TODO oncely need to do this once if not interpolating
+                hs_evaluate = container_hs.evaluate
 
             # Get the hypersurface scale factors (reshape to 1D array)
             if self.propagate_uncertainty:
-                scales, uncertainties = container_hs.evaluate(param_values, return_uncertainty=True)
+                scales, uncertainties = hs_evaluate(param_values, return_uncertainty=True)
                 scales = scales.reshape(container.size)
                 uncertainties = uncertainties.reshape(container.size)
             else:
-                scales = container_hs.evaluate(param_values).reshape(container.size)
+                scales = hs_evaluate(param_values).reshape(container.size)
 
             # Where there are no scales (e.g. empty bins), set scale factor to 1
             empty_bins_mask = ~np.isfinite(scales)
@@ -10,7 +10,9 @@ from pisa.core.param import Param, ParamSet
 from pisa.core.stage import Stage
 from pisa.utils.log import logging
 from pisa.utils.profiler import profile
-from pisa.utils.flux_weights import load_2d_table, calculate_2d_flux_weights
+from pisa.utils.flux_weights import (
+    load_2d_table, make_2d_flux_coeffs, calculate_2d_flux_weights
+)
 
 __all__ = ['hillasg', 'init_test']
 
@@ -51,9 +53,19 @@ class hillasg(Stage):  # pylint: disable=invalid-name
             **std_kwargs,
         )
 
+    @property
+    def dependency_params(self):
+        # the flux table is only loaded in `setup_function`
+        return ()
+
     def setup_function(self):
 
         self.flux_table = load_2d_table(self.params.flux_table.value)
+        # spline coefficients only depend on the table, so compute them once
+        self.flux_coeffs = {
+            table: make_2d_flux_coeffs(self.flux_table[table])
+            for table in ["nue", "numu", "nutau", "nuebar", "numubar", "nutaubar"]
+        }
 
         self.data.representation = self.calc_mode
         if self.data.is_map:
@@ -122,7 +134,7 @@ class hillasg(Stage):  # pylint: disable=invalid-name
                 calculate_2d_flux_weights(
                     true_energies=container["true_energy"],
                     true_coszens=container["true_coszen"],
-                    en_splines=self.flux_table[table],
+                    en_splines=self.flux_coeffs[table],
                     out=container[out_name][:, index],
                 )
             container.mark_changed("nu_flux_nominal")
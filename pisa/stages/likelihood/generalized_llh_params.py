@@ -255,6 +255,13 @@ class generalized_llh_params(Stage):  # pylint: disable=invalid-name
             container.mark_changed('old_sum')
             container.mark_changed('weights')
 
+            # The weights of the individual events have not changed, so they
+            # must not be translated back from the bin sums computed here
+            # (which would accumulate the sums on every call)
+            self.data.representation = 'events'
+            container.mark_valid('weights')
+            self.data.representation = self.apply_mode
+
 
 def init_test(**param_kwargs):
     """Instantiation example"""
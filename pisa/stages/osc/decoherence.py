@@ -331,6 +331,16 @@ class decoherence(Stage):
         self.two_flavor = False
 
 
+    @property
+    def dependency_params(self):
+        # the Earth model, the geometry and the electron fractions only enter
+        # the layers computed in `setup_function`
+        return tuple(
+            name for name in self.params.names
+            if name not in ('earth_model', 'detector_depth', 'prop_height',
+                            'YeI', 'YeO', 'YeM')
+        )
+
     def setup_function(self):
 
         # setup Earth model
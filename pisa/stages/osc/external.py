@@ -114,6 +114,7 @@ class external(Stage):
 
         for container in self.data:
             self.layers.calcLayers(container['true_coszen'])
+            container['layer_index'] = self.layers.layer_index.reshape((container.size, self.layers.max_layers))
             container['densities'] = self.layers.density.reshape((container.size, self.layers.max_layers))
             container['densities_neutron_weighted'] = self.layers.density_neutron_weighted.reshape((container.size, self.layers.max_layers))
             container['distances'] = self.layers.distance.reshape((container.size, self.layers.max_layers))
@@ -148,18 +149,16 @@ class external(Stage):
             self.data.link_containers('nubar', ['nuebar_cc', 'numubar_cc', 'nutaubar_cc',
                                                 'nuebar_nc', 'numubar_nc', 'nutaubar_nc'])
 
-        # this can be done in a more clever way (don't have to recalculate all paths)
         YeI = self.params.YeI.value.m_as('dimensionless')
         YeO = self.params.YeO.value.m_as('dimensionless')
         YeM = self.params.YeM.value.m_as('dimensionless')
         if YeI != self.YeI or YeO != self.YeO or YeM != self.YeM:
             self.YeI = YeI; self.YeO = YeO; self.YeM = YeM
             self.layers.setElecFrac(self.YeI, self.YeO, self.YeM)
+            # the layer geometry is unchanged, only look up the new densities
             for container in self.data:
-                self.layers.calcLayers(container['true_coszen'])
-                container['densities'] = self.layers.density.reshape((container.size, self.layers.max_layers))
-                container['densities_neutron_weighted'] = self.layers.density_neutron_weighted.reshape((container.size, self.layers.max_layers))
-                container['distances'] = self.layers.distance.reshape((container.size, self.layers.max_layers))
+                (container['densities'],
+                 container['densities_neutron_weighted']) = self.layers.lookupDensities(container['layer_index'])
 
         for container in self.data:
             energy_idx = self.data.representation.names.index('true_energy')
@@ -217,6 +217,12 @@ class Layers(object):
     distance : 1d float array of length (max_layers * len(cz))
             containing distance values and filled up with 0s otherwise
 
+    layer_index : int array of shape (len(cz), max_layers)
+            index of the Earth model layer crossed in each segment, -1 where
+            no layer is crossed. Since the geometry does not depend on the
+            densities, these can be stored together with `distance` and used
+            with `lookupDensities` once densities or electron fractions change
+
     References
     ----------
     [1] A.M. Dziewonski and D.L. Anderson (1981) "Preliminary reference
@@ -361,18 +367,50 @@ class Layers(object):
         if not self.using_earth_model:
             raise ValueError("Cannot calculate layers when not using an Earth model")
 
-        # run external function
-        self._n_layers, self._density, self._density_neutron_weighted, self._distance = extCalcLayers(
+        # run external function, with the (1-based) layer numbers in place of
+        # the densities in order to obtain the layer crossed in each segment
+        layer_numbers = np.arange(1, len(self.radii) + 1, dtype=FTYPE)
+        self._n_layers, layer_index, _, self._distance = extCalcLayers(
             cz=cz,
             r_detector=self.r_detector,
             prop_height=self.prop_height,
             detector_depth=self.detector_depth,
-            rhos=self.rhos,
-            rhos_neutron_weighted=self.rhos_neutron_weighted,
+            rhos=layer_numbers,
+            rhos_neutron_weighted=layer_numbers,
             coszen_limit=self.coszen_limit,
             radii=self.radii,
             max_layers=self.max_layers,
         )
+        self._layer_index = np.rint(layer_index).astype(np.int16) - 1
+        self._density, self._density_neutron_weighted = self.lookupDensities(
+            self._layer_index
+        )
+
+    def lookupDensities(self, layer_index):
+        """Get the electron- and neutron-weighted densities for the current
+        layer densities and electron fractions, given the layers crossed as
+        obtained from `layer_index` (without recomputing the geometry)
+
+        Parameters
+        ----------
+        layer_index : int array
+            Layer indices as obtained from `calcLayers`
+
+        Returns
+        -------
+        density, density_neutron_weighted : float arrays of same shape as
+            `layer_index`
+
+        """
+        if not self.using_earth_model:
+            raise ValueError("Cannot get density when not using an Earth model")
+        # the appended zero is picked up by the index -1 (no layer)
+        zero = np.zeros(1, dtype=FTYPE)
+        rhos = np.concatenate((self.rhos.astype(FTYPE), zero))
+        rhos_neutron_weighted = np.concatenate(
+            (self.rhos_neutron_weighted.astype(FTYPE), zero)
+        )
+        return rhos[layer_index], rhos_neutron_weighted[layer_index]
 
     @property
     def n_layers(self):
@@ -396,6 +434,12 @@ class Layers(object):
     def distance(self):
         return self._distance
 
+    @property
+    def layer_index(self):
+        if not self.using_earth_model:
+            raise ValueError("Cannot get layers when not using an Earth model")
+        return self._layer_index
+
 
     def calcPathLength(self, cz) :
         """
@@ -673,7 +717,44 @@ def test_layers_3():
     assert np.allclose(np.sum(distance_segments, axis=1), vacuum_distances, **ALLCLOSE_KW), 'ERROR: distance mismatch: {0} vs {1}'.format(np.sum(distance_segments, axis=1), vacuum_distances)
 
     logging.info('<< PASS : test_Layers 3 >>')
-    
+
+
+def test_layers_4():
+    """Test that densities looked up via the layer indices match those
+    calculated along with the geometry, also after changing electron
+    fractions and density scalings"""
+    layer = Layers('osc/PREM_12layer.dat', detector_depth=2., prop_height=20.)
+    layer.setElecFrac(0.4656, 0.4656, 0.4957)
+    cz = np.linspace(-1, 1, int(1e4), dtype=FTYPE)
+    layer.calcLayers(cz)
+    layer_index = layer.layer_index
+
+    def check():
+        _, density, density_neutron_weighted, distance = extCalcLayers(
+            cz=cz,
+            r_detector=layer.r_detector,
+            prop_height=layer.prop_height,
+            detector_depth=layer.detector_depth,
+            rhos=layer.rhos,
+            rhos_neutron_weighted=layer.rhos_neutron_weighted,
+            coszen_limit=layer.coszen_limit,
+            radii=layer.radii,
+            max_layers=layer.max_layers,
+        )
+        lookup, lookup_neutron_weighted = layer.lookupDensities(layer_index)
+        assert np.array_equal(lookup, density)
+        assert np.array_equal(lookup_neutron_weighted, density_neutron_weighted)
+        assert np.array_equal(layer.distance, distance)
+
+    check()
+    layer.setElecFrac(0.45, 0.47, 0.49)
+    check()
+    layer.scaling(np.linspace(0.9, 1.1, len(layer.radii) - 1))
+    layer.setElecFrac(0.4656, 0.4656, 0.4957)
+    check()
+
+    logging.info('<< PASS : test_Layers 4 >>')
+
 
 
 
@@ -682,3 +763,4 @@ if __name__ == '__main__':
     test_layers_1()
     test_layers_2()
     test_layers_3()
+    test_layers_4()
@@ -8,9 +8,12 @@ and an osc. stage....todo
 
 from __future__ import absolute_import, print_function, division
 
+from collections import OrderedDict
+
+from numba import njit, prange
 import numpy as np
 
-from pisa import FTYPE, ureg
+from pisa import FTYPE, TARGET, ureg
 from pisa.core.param import Param, ParamSet
 from pisa.core.stage import Stage
 from pisa.utils.log import logging
@@ -23,7 +26,62 @@ from pisa.stages.osc.layers import Layers
 from pisa.stages.osc.prob3numba.numba_osc_hostfuncs import propagate_array, fill_probs
 from pisa.utils.resources import find_resource
 
-__all__ = ['prob3', 'init_test']
+__all__ = ['EVAL_MODES', 'prob3', 'init_test', 'test_prob3']
+
+
+EVAL_MODES = ('exact', 'unique', 'grid')
+"""Ways in which `prob3` can evaluate the oscillation probabilities"""
+
+
+@njit(parallel=TARGET == "parallel")
+def _interpolate_probs(grid_probs, e_idx, e_frac, cz_idx, cz_frac, out):
+    """Bilinear interpolation of probability matrices `grid_probs` of shape
+    (n_energy, n_coszen, 3, 3) to the (precomputed) lower node indices and
+    fractional distances to the next node of each event"""
+    for n in prange(out.shape[0]): # pylint: disable=not-an-iterable
+        i = e_idx[n]
+        j = cz_idx[n]
+        f_e = e_frac[n]
+        f_cz = cz_frac[n]
+        for a in range(out.shape[1]):
+            for b in range(out.shape[2]):
+                out[n, a, b] = (
+                    (1 - f_e) * ((1 - f_cz) * grid_probs[i, j, a, b]
+                                 + f_cz * grid_probs[i, j + 1, a, b])
+                    + f_e * ((1 - f_cz) * grid_probs[i + 1, j, a, b]
+                             + f_cz * grid_probs[i + 1, j + 1, a, b])
+                )
+
+
+def _path_coordinate(coszen, radii, r_detector, chord_weight=0.25):
+    """Coordinate along which the `coszen` nodes of the 'grid' `eval_mode`
+    are spaced uniformly: the path length (in km) from the outermost of the
+    spheres `radii` (the production height) to the detector, plus
+    `chord_weight` times the lengths of the chords through each sphere below
+    the detector.
+
+    The path length varies steeply near the horizon, and the chords like the
+    square root of the distance in coszen past the direction tangent to their
+    sphere, so the oscillation probabilities are much closer to linear in
+    this coordinate than in coszen. The weight of the chords balances the
+    density of nodes near these tangents against that elsewhere."""
+    coszen = np.asarray(coszen, dtype=np.float64)
+    # squared impact parameter of the path w.r.t. the Earth's centre
+    p2 = r_detector**2 * (1 - coszen**2)
+    coord = np.sqrt(np.max(radii)**2 - p2) - r_detector * coszen
+    for r in radii[radii < r_detector]:
+        chord = 2 * np.sqrt(np.clip(r**2 - p2, 0, None))
+        coord += chord_weight * np.where(coszen < 0, chord, 0)
+    return coord
+
+
+def _node_indices(values, nodes):
+    """Index of the node below each of `values` and the fractional distance
+    to the next node, for linear interpolation on `nodes`"""
+    idx = np.clip(np.searchsorted(nodes, values, side='right') - 1,
+                  0, len(nodes) - 2)
+    frac = (values - nodes[idx]) / (nodes[idx + 1] - nodes[idx])
+    return idx, np.clip(frac, 0, 1).astype(FTYPE)
 
 
 class prob3(Stage):  # pylint: disable=invalid-name
@@ -80,6 +138,26 @@ class prob3(Stage):  # pylint: disable=invalid-name
             "nu_flux"
             "weights"
 
+    eval_mode : str
+        One of `EVAL_MODES`. The default 'exact' propagates every event
+        individually. 'unique' only propagates each distinct combination of
+        (true_energy, true_coszen) once, which gives identical results.
+        'grid' propagates on a grid of nodes spanning the events' range and
+        interpolates the probabilities bilinearly to the events. The nodes are
+        spaced uniformly in 1/true_energy, i.e. in oscillation phase, and in
+        a path-length coordinate in true_coszen that places more nodes near
+        the horizon and near the directions tangent to the Earth's layers.
+        The interpolation error scales with the inverse square of the number
+        of nodes and is largest at the lowest energies: with the default
+        grid, the maximum absolute deviation of any probability from 'exact'
+        is about 5e-3 for events at 1-100 GeV from all directions, and
+        below 2e-3 above 3 GeV. Use `get_prob_deviations` to check the
+        accuracy of the grid for a given sample.
+
+    grid_n_energy, grid_n_coszen : int
+        Number of nodes in 1/true_energy and true_coszen in 'grid'
+        `eval_mode`
+
     **kwargs
         Other kwargs are handled by Stage
     -----
@@ -93,6 +171,9 @@ class prob3(Stage):  # pylint: disable=invalid-name
       neutrino_decay=False,
       tomography_type=None,
       lri_type=None,
+      eval_mode='exact',
+      grid_n_energy=500,
+      grid_n_coszen=500,
       **std_kwargs,
     ):
 
@@ -132,6 +213,20 @@ class prob3(Stage):  # pylint: disable=invalid-name
                 )
         self.nsi_type = nsi_type
         """Type of NSI to assume."""
+        if eval_mode is None:
+            eval_mode = 'exact'
+        eval_mode = eval_mode.strip().lower()
+        if eval_mode not in EVAL_MODES:
+            raise ValueError(
+                'Chosen eval_mode "%s" not available! Choose one of %s.'
+                % (eval_mode, EVAL_MODES)
+            )
+        self.eval_mode = eval_mode
+        """How to evaluate the probabilities (see `EVAL_MODES`)"""
+        if eval_mode == 'grid' and min(grid_n_energy, grid_n_coszen) < 2:
+            raise ValueError('Need at least two grid nodes per dimension')
+        self.grid_n_energy = int(grid_n_energy)
+        self.grid_n_coszen = int(grid_n_coszen)
         self.tomography_type = tomography_type
         self.reparam_mix_matrix = reparam_mix_matrix
         """Use a PMNS mixing matrix parameterisation that differs from
@@ -234,6 +329,24 @@ class prob3(Stage):  # pylint: disable=invalid-name
         self.YeI = None
         self.YeO = None
         self.YeM = None
+        self.grid_inv_energy = None
+        """1 / true_energy nodes (in 1/GeV) in 'grid' `eval_mode`"""
+        self.grid_coszen = None
+        """true_coszen nodes in 'grid' `eval_mode`"""
+        self._grid_coord = None
+        self._grid_layer_index = None
+        self._grid_densities = None
+        self._grid_distances = None
+        self._eval_indices = {}
+
+    @property
+    def dependency_params(self):
+        # the Earth model and the geometry only enter the layers computed in
+        # `setup_function`
+        return tuple(
+            name for name in self.params.names
+            if name not in ('earth_model', 'detector_depth', 'prop_height')
+        )
 
     def setup_function(self):
 
@@ -298,6 +411,7 @@ class prob3(Stage):  # pylint: disable=invalid-name
 
         for container in self.data:
             self.layers.calcLayers(container['true_coszen'])
+            container['layer_index'] = self.layers.layer_index.reshape((container.size, self.layers.max_layers))
             container['densities'] = self.layers.density.reshape((container.size, self.layers.max_layers))
             container['distances'] = self.layers.distance.reshape((container.size, self.layers.max_layers))
 
@@ -312,6 +426,7 @@ class prob3(Stage):  # pylint: disable=invalid-name
                                                 'nuebar_nc', 'numubar_nc', 'nutaubar_nc'])
         for container in self.data:
             container['probability'] = np.empty((container.size, 3, 3), dtype=FTYPE)
+        self._setup_eval_mode()
         self.data.unlink_containers()
 
         # setup more empty arrays
@@ -319,6 +434,175 @@ class prob3(Stage):  # pylint: disable=invalid-name
             container['prob_e'] = np.empty((container.size), dtype=FTYPE)
             container['prob_mu'] = np.empty((container.size), dtype=FTYPE)
 
+    def _setup_eval_mode(self):
+        """Find the unique kinematics or the grid nodes and interpolation
+        weights for each (linked) container"""
+        self._eval_indices = {}
+        if self.eval_mode == 'unique':
+            n_events = n_unique = 0
+            for container in self.data:
+                kinematics = [container['true_energy'], container['true_coszen']]
+                if np.ndim(container['nubar']) > 0:
+                    kinematics.append(container['nubar'])
+                _, index, inverse = np.unique(
+                    np.stack(kinematics, axis=1), axis=0, return_index=True,
+                    return_inverse=True
+                )
+                self._eval_indices[container.name] = (index, inverse.ravel())
+                n_events += container.size
+                n_unique += index.size
+            logging.debug('Propagating %d unique out of %d events',
+                          n_unique, n_events)
+
+        elif self.eval_mode == 'grid':
+            for container in self.data:
+                if np.ndim(container['nubar']) > 0:
+                    raise ValueError(
+                        'eval_mode "grid" requires a single `nubar` value'
+                        ' per container'
+                    )
+            radii = self.layers.radii
+            r_detector = self.layers.r_detector
+
+            # energy nodes uniform in 1/E, i.e. in oscillation phase
+            inv_energies = [1 / container['true_energy'] for container in self.data]
+            inv_e_min = min(np.min(x) for x in inv_energies)
+            inv_e_max = max(np.max(x) for x in inv_energies)
+            self.grid_inv_energy = np.linspace(
+                inv_e_min, max(inv_e_max, inv_e_min + 1e-6), self.grid_n_energy
+            )
+
+            # coszen nodes uniform in `_path_coordinate`, with a node at each
+            # direction tangent to a layer boundary below the detector
+            cz_min = min(np.min(container['true_coszen']) for container in self.data)
+            cz_max = max(np.max(container['true_coszen']) for container in self.data)
+            cz_max = max(cz_max, cz_min + 1e-6)
+            tangents = -np.sqrt(1 - (radii[radii < r_detector] / r_detector)**2)
+            tangents = tangents[(tangents > cz_min) & (tangents < cz_max)]
+            fine_coszen = np.union1d(
+                np.linspace(cz_min, cz_max, 100001), tangents
+            )[::-1]
+            fine_coord = _path_coordinate(fine_coszen, radii, r_detector)
+            breaks = np.concatenate((
+                fine_coord[[0, -1]], _path_coordinate(tangents, radii, r_detector)
+            ))
+            breaks = np.sort(breaks)
+            node_coord = np.unique(np.concatenate([
+                np.linspace(lo, hi, max(2, int(round(
+                    self.grid_n_coszen * (hi - lo) / (breaks[-1] - breaks[0])
+                ))))
+                for lo, hi in zip(breaks[:-1], breaks[1:])
+            ]))
+            self.grid_coszen = np.interp(node_coord, fine_coord, fine_coszen)
+            self._grid_coord = _path_coordinate(self.grid_coszen, radii, r_detector)
+
+            for container in self.data:
+                self._eval_indices[container.name] = (
+                    _node_indices(1 / container['true_energy'],
+                                  self.grid_inv_energy)
+                    + _node_indices(_path_coordinate(container['true_coszen'],
+                                                     radii, r_detector),
+                                    self._grid_coord)
+                )
+            self._calc_grid_layers()
+
+    def _calc_grid_layers(self):
+        """Layer densities and distances at the coszen nodes of the grid"""
+        self.layers.calcLayers(self.grid_coszen.astype(FTYPE))
+        shape = (len(self.grid_coszen), self.layers.max_layers)
+        self._grid_layer_index = self.layers.layer_index.reshape(shape)
+        self._grid_densities = self.layers.density.reshape(shape)
+        self._grid_distances = self.layers.distance.reshape(shape)
+
+    def _update_densities(self):
+        """Look up the layer densities after a change of the electron
+        fractions or density scalings; the layer geometry (and hence
+        `distances`) stays the same"""
+        for container in self.data:
+            container['densities'] = self.layers.lookupDensities(
+                container['layer_index']
+            )[0]
+        if self.eval_mode == 'grid':
+            self._grid_densities = self.layers.lookupDensities(
+                self._grid_layer_index
+            )[0]
+
+    def _calc_container_probs(self, container, grid_probs):
+        """Fill `container['probability']` according to `eval_mode`;
+        `grid_probs` caches the probabilities on the grid per `nubar`"""
+        if self.eval_mode == 'exact':
+            self.calc_probs(container['nubar'],
+                            container['true_energy'],
+                            container['densities'],
+                            container['distances'],
+                            out=container['probability'],
+                           )
+
+        elif self.eval_mode == 'unique':
+            index, inverse = self._eval_indices[container.name]
+            nubar = container['nubar']
+            if np.ndim(nubar) > 0:
+                nubar = nubar[index]
+            unique_probs = np.empty((index.size, 3, 3), dtype=FTYPE)
+            self.calc_probs(nubar,
+                            container['true_energy'][index],
+                            container['densities'][index],
+                            container['distances'][index],
+                            out=unique_probs,
+                           )
+            np.take(unique_probs, inverse, axis=0, out=container['probability'])
+
+        else:
+            nubar = container['nubar']
+            if nubar not in grid_probs:
+                grid_probs[nubar] = np.empty(
+                    (len(self.grid_inv_energy), len(self.grid_coszen), 3, 3),
+                    dtype=FTYPE
+                )
+                grid_energy = (1 / self.grid_inv_energy).astype(FTYPE)
+                self.calc_probs(nubar,
+                                grid_energy[:, np.newaxis],
+                                self._grid_densities[np.newaxis],
+                                self._grid_distances[np.newaxis],
+                                out=grid_probs[nubar],
+                               )
+            _interpolate_probs(grid_probs[nubar],
+                               *self._eval_indices[container.name],
+                               container['probability'])
+
+    def get_prob_deviations(self):
+        """Compare the probabilities obtained in the chosen `eval_mode` to
+        the exact per-event calculation, for the current parameter values.
+
+        Returns
+        -------
+        deviations : OrderedDict
+            Maximum absolute deviation of any oscillation probability per
+            (linked) container
+
+        """
+        self.compute()
+        self.data.representation = self.calc_mode
+        if self.is_map:
+            self.data.link_containers('nu', ['nue_cc', 'numu_cc', 'nutau_cc',
+                                             'nue_nc', 'numu_nc', 'nutau_nc'])
+            self.data.link_containers('nubar', ['nuebar_cc', 'numubar_cc', 'nutaubar_cc',
+                                                'nuebar_nc', 'numubar_nc', 'nutaubar_nc'])
+        deviations = OrderedDict()
+        for container in self.data:
+            exact = np.empty_like(container['probability'])
+            self.calc_probs(container['nubar'],
+                            container['true_energy'],
+                            container['densities'],
+                            container['distances'],
+                            out=exact,
+                           )
+            deviations[container.name] = np.max(
+                np.abs(container['probability'] - exact)
+            )
+        self.data.unlink_containers()
+        return deviations
+
     def calc_probs(self, nubar, e_array, rho_array, len_array, out):
         ''' wrapper to execute osc. calc '''
         if self.reparam_mix_matrix:
@@ -353,7 +637,6 @@ class prob3(Stage):  # pylint: disable=invalid-name
             self.data.link_containers('nubar', ['nuebar_cc', 'numubar_cc', 'nutaubar_cc',
                                                 'nuebar_nc', 'numubar_nc', 'nutaubar_nc'])
 
-        # this can be done in a more clever way (don't have to recalculate all paths)
         YeI = self.params.YeI.value.m_as('dimensionless')
         YeO = self.params.YeO.value.m_as('dimensionless')
         YeM = self.params.YeM.value.m_as('dimensionless')
@@ -361,10 +644,7 @@ class prob3(Stage):  # pylint: disable=invalid-name
         if YeI != self.YeI or YeO != self.YeO or YeM != self.YeM:
             self.YeI = YeI; self.YeO = YeO; self.YeM = YeM
             self.layers.setElecFrac(self.YeI, self.YeO, self.YeM)
-            for container in self.data:
-                self.layers.calcLayers(container['true_coszen'])
-                container['densities'] = self.layers.density.reshape((container.size, self.layers.max_layers))
-                container['distances'] = self.layers.distance.reshape((container.size, self.layers.max_layers))
+            self._update_densities()
 
 
         # some safety checks on units
@@ -423,9 +703,7 @@ class prob3(Stage):  # pylint: disable=invalid-name
                 self.tomography_params.middlemantle_density_scale = self.params.middlemantle_density_scale.value.m_as('dimensionless')
                 self.layers.scaling(scaling_array=self.tomography_params.scaling_factor_array)
             self.layers.setElecFrac(self.YeI, self.YeO, self.YeM)
-            for container in self.data:
-                self.layers.calcLayers(container['true_coszen'])
-                container['densities'] = self.layers.density.reshape((container.size, self.layers.max_layers))
+            self._update_densities()
 
 
         # now we can proceed to calculate the generalised matter potential matrix
@@ -465,13 +743,9 @@ class prob3(Stage):  # pylint: disable=invalid-name
                 raise ValueError("Implemented symmetries are %s" % types_lri)
 
 
+        grid_probs = {}
         for container in self.data:
-            self.calc_probs(container['nubar'],
-                            container['true_energy'],
-                            container['densities'],
-                            container['distances'],
-                            out=container['probability'],
-                           )
+            self._calc_container_probs(container, grid_probs)
             container.mark_changed('probability')
 
         # the following is flavour specific, hence unlink
@@ -526,3 +800,49 @@ def init_test(**param_kwargs):
         Param(name='deltacp', value=180*ureg.degree, **param_kwargs),
     ])
     return prob3(params=param_set)
+
+
+def test_prob3():
+    """Compare the probabilities of the 'unique' and 'grid' `eval_mode`s to
+    the exact calculation"""
+    from pisa.core.container import Container, ContainerSet
+    from pisa.utils.random_numbers import get_random_state
+
+    random_state = get_random_state(0)
+    n_kinematics = 20000
+    # every combination of energy and coszen occurs twice
+    true_energy = np.tile(np.power(10, random_state.uniform(0, 2, n_kinematics)), 2)
+    true_coszen = np.tile(random_state.uniform(-1, 1, n_kinematics), 2)
+
+    def get_data():
+        containers = []
+        for name, nubar in (('nu', 1), ('nubar', -1)):
+            container = Container(name)
+            container['true_energy'] = true_energy.astype(FTYPE)
+            container['true_coszen'] = true_coszen.astype(FTYPE)
+            container['nu_flux'] = np.ones((true_energy.size, 2), dtype=FTYPE)
+            container['weights'] = np.ones(true_energy.size, dtype=FTYPE)
+            container.set_aux_data('nubar', nubar)
+            container.set_aux_data('flav', 1)
+            containers.append(container)
+        return ContainerSet('data', containers)
+
+    probs = {}
+    for eval_mode in EVAL_MODES:
+        osc = init_test(prior=None, range=None, is_fixed=True)
+        osc.eval_mode = eval_mode
+        osc.calc_mode = 'events'
+        osc.apply_mode = 'events'
+        osc.data = get_data()
+        osc.setup()
+        osc.compute()
+        probs[eval_mode] = [np.copy(c['probability']) for c in osc.data]
+
+    for exact, unique, grid in zip(*[probs[m] for m in EVAL_MODES]):
+        assert np.array_equal(unique, exact)
+        # see the documented accuracy of the default grid
+        deviation = np.max(np.abs(grid - exact))
+        logging.info('max. deviation of grid from exact: %.2e', deviation)
+        assert deviation < 1e-2
+
+    logging.info('<< PASS : test_prob3 >>')
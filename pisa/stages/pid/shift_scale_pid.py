@@ -11,8 +11,10 @@ from pisa import FTYPE, TARGET
 from pisa.core.param import Param, ParamSet
 from pisa.core.stage import Stage
 from pisa.utils import vectorizer
+from pisa.utils.log import logging, set_verbosity
 
-__all__ = ['shift_scale_pid', 'calculate_pid_function', 'init_test']
+__all__ = ['shift_scale_pid', 'calculate_pid_function', 'init_test',
+           'test_shift_scale_pid']
 
 __author__ = 'L. Fischer'
 
@@ -48,6 +50,9 @@ class shift_scale_pid(Stage):  # pylint: disable=invalid-name
 
         assert self.calc_mode == 'events'
 
+        # version of `calculated_pid` last written to `pid`, per container
+        self._applied_versions = {}
+
     def setup_function(self):
         """Setup the stage"""
 
@@ -57,6 +62,7 @@ class shift_scale_pid(Stage):  # pylint: disable=invalid-name
             container['calculated_pid'] = np.empty((container.size), dtype=FTYPE)
             container['original_pid'] = np.empty((container.size), dtype=FTYPE)
             vectorizer.assign(vals=container['pid'], out=container['original_pid'])
+        self._applied_versions = {}
 
     def compute_function(self):
         """Perform computation"""
@@ -74,8 +80,15 @@ class shift_scale_pid(Stage):  # pylint: disable=invalid-name
 
     def apply_function(self):
         for container in self.data:
-            # set the pid value to the calculated one
+            version = container.versions['calculated_pid']
+            if self._applied_versions.get(container.name) == version:
+                continue
+            # set the pid value to the calculated one; `pid` is overwritten in
+            # place, so flag it as changed to invalidate the bin indices and cut
+            # masks cached on it
             vectorizer.assign(vals=container['calculated_pid'], out=container['pid'])
+            container.mark_changed('pid')
+            self._applied_versions[container.name] = version
 
 signatures = [
     '(f4[:], f4[:], f4[:], f4[:])',
@@ -114,3 +127,52 @@ def init_test(**param_kwargs):
     ])
 
     return shift_scale_pid(calc_mode='events', params=param_set)
+
+
+def test_shift_scale_pid():
+    """Changing the bias has to produce the same maps as a fresh pipeline
+    configured with that bias, i.e. nothing must be cached on stale pid values"""
+    from collections import OrderedDict
+    from copy import deepcopy
+    from pisa import ureg
+    from pisa.core.param import ParamSelector
+    from pisa.core.pipeline import Pipeline
+    from pisa.utils.config_parser import parse_pipeline_config
+
+    example_cfg = parse_pipeline_config('settings/pipeline/example.cfg')
+
+    def get_cfg(bias):
+        stage_cfg = OrderedDict()
+        stage_cfg['calc_mode'] = 'events'
+        stage_cfg['apply_mode'] = 'events'
+        stage_cfg['params'] = ParamSelector(regular_params=[
+            Param(name='bias', value=bias * ureg.dimensionless, prior=None,
+                  range=None, is_fixed=False),
+            Param(name='scale', value=1.0 * ureg.dimensionless, prior=None,
+                  range=None, is_fixed=True),
+        ])
+        cfg = deepcopy(example_cfg)
+        # insert the pid stage right before the histogramming
+        for k in list(cfg.keys()):
+            if k == ('utils', 'hist'):
+                cfg[('pid', 'shift_scale_pid')] = stage_cfg
+            cfg.move_to_end(k)
+        return cfg
+
+    pipeline = Pipeline(get_cfg(0.))
+    out_nominal = pipeline.get_outputs()
+    pipeline.params.bias.value = 2. * ureg.dimensionless
+    out_shifted = pipeline.get_outputs()
+    out_fresh = Pipeline(get_cfg(2.)).get_outputs()
+
+    for m_shifted, m_fresh, m_nominal in zip(out_shifted, out_fresh, out_nominal):
+        assert np.array_equal(m_shifted.nominal_values, m_fresh.nominal_values)
+        assert np.array_equal(m_shifted.std_devs, m_fresh.std_devs)
+        assert not np.array_equal(m_shifted.nominal_values, m_nominal.nominal_values)
+
+    logging.info('<< PASS : test_shift_scale_pid >>')
+
+
+if __name__ == '__main__':
+    set_verbosity(1)
+    test_shift_scale_pid()
@@ -5,6 +5,11 @@ This stage allows one to resample datasets to estimate MC uncertainties without
 to decrease statistics. Bootstrap samples are produced by random selection with
 replacement, which is implemented in this stage by an equivalent re-weighting of
 events.
+
+Optionally, an entire ensemble of bootstrap samples is produced at once, which
+are carried by the containers as replicas of the events (see
+`pisa.core.container.Container`). All per-event calculations are then shared by
+the replicas, and only the final histogramming is done for each of them.
 """
 
 from copy import deepcopy
@@ -12,6 +17,7 @@ from collections import OrderedDict
 
 import numpy as np
 
+from pisa import FTYPE
 from pisa.core.stage import Stage
 from pisa.utils.log import logging, set_verbosity
 
@@ -43,11 +49,17 @@ class bootstrap(Stage):  # pylint: disable=invalid-name
     ----------
     seed : int, optional
         Seed for the random number generator.
+    n_replicas : int, optional
+        If given, produce this many bootstrap samples as replicas of the
+        events instead of re-weighting the events by a single one. The
+        pipeline's outputs are then lists of MapSets, one per sample. The
+        first sample is the same as the one produced without `n_replicas`.
     """
 
     def __init__(
         self,
         seed=None,
+        n_replicas=None,
         **std_kwargs,
     ):
 
@@ -69,6 +81,12 @@ class bootstrap(Stage):  # pylint: disable=invalid-name
         else:
             self.seed = int(seed)
 
+        if n_replicas is None:
+            self.n_replicas = None
+        else:
+            self.n_replicas = int(n_replicas)
+            assert self.n_replicas > 0
+
     def setup_function(self):
 
         logging.debug(f"Setting up bootstrap with seed: {self.seed}")
@@ -77,24 +95,51 @@ class bootstrap(Stage):  # pylint: disable=invalid-name
 
         rng = default_rng(self.seed)
 
+        if self.n_replicas is None:
+            for container in self.data:
+                sample_size = container["weights"].size
+                container["bootstrap_weights"] = self._sample_weights(rng, sample_size)
+            return
+
+        # one column of sample weights per replica, which are applied when
+        # histogramming; replicas are drawn one after the other such that the
+        # first one is the same as without replicas
+        replica_weights = {
+            container.name: np.empty(
+                (container["weights"].size, self.n_replicas), dtype=FTYPE
+            )
+            for container in self.data
+        }
+        for i in range(self.n_replicas):
+            for container in self.data:
+                sample_size = container["weights"].size
+                replica_weights[container.name][:, i] = self._sample_weights(
+                    rng, sample_size
+                )
         for container in self.data:
-            sample_size = container["weights"].size
-            # indices of events are randomly chosen from the entire sample until
-            # we have a new sample of the same size
-            sample_idx = rng.integers(sample_size, size=sample_size)
-            # Instead of manipulating all of the data arrays, we count how often each
-            # index was chosen and take that as a weight, i.e. an event that was selected
-            # twice will have a weight of 2.
-            sample_weights = np.bincount(sample_idx, minlength=sample_size)
-            container["bootstrap_weights"] = sample_weights
+            container[container.replica_weights_key] = replica_weights[container.name]
+
+    @staticmethod
+    def _sample_weights(rng, sample_size):
+        """Weights of the events in a single bootstrap sample"""
+        # indices of events are randomly chosen from the entire sample until
+        # we have a new sample of the same size
+        sample_idx = rng.integers(sample_size, size=sample_size)
+        # Instead of manipulating all of the data arrays, we count how often each
+        # index was chosen and take that as a weight, i.e. an event that was selected
+        # twice will have a weight of 2.
+        return np.bincount(sample_idx, minlength=sample_size)
 
     def apply_function(self):
 
+        if self.n_replicas is not None:
+            return
+
         for container in self.data:
             container["weights"] *= container["bootstrap_weights"]
 
 
-def insert_bootstrap_after_data_loader(cfg_dict, seed=None):
+def insert_bootstrap_after_data_loader(cfg_dict, seed=None, n_replicas=None):
     """
     Given a pipeline configuration parsed with `parse_pipeline_config`, insert the
     bootstrap stage directly after the `simple_data_loader` stage and return the
@@ -106,6 +151,9 @@ def insert_bootstrap_after_data_loader(cfg_dict, seed=None):
         Pipeline configuration in the form of an ordered dictionary.
     seed : int, optional
         Seed to be placed into the pipeline configuration.
+    n_replicas : int, optional
+        Number of bootstrap samples to be placed into the pipeline
+        configuration.
 
     Returns
     -------
@@ -118,6 +166,8 @@ def insert_bootstrap_after_data_loader(cfg_dict, seed=None):
     bootstrap_stage_cfg["apply_mode"] = "events"
     bootstrap_stage_cfg["calc_mode"] = "events"
     bootstrap_stage_cfg["seed"] = seed
+    if n_replicas is not None:
+        bootstrap_stage_cfg["n_replicas"] = n_replicas
 
     bootstrap_pipe_cfg = deepcopy(cfg_dict)
 
@@ -201,6 +251,35 @@ def test_bootstrap():
         # the standard deviations are a little harder to match in 100 samples
         assert np.abs(np.nanmean(bs_std_ratios) - 1.0) < 0.02
 
+    # The same can be obtained from an ensemble of bootstrap samples, which are
+    # all produced in a single run of the pipeline
+    ensemble_pipe_cfg = insert_bootstrap_after_data_loader(
+        example_cfg, seed=0, n_replicas=100
+    )
+    dmaker = DistributionMaker([ensemble_pipe_cfg])
+    maps_ensemble = dmaker.get_outputs(return_sum=True)
+    assert len(maps_ensemble) == 100
+
+    # the first sample is the one obtained without replicas
+    assert maps_ensemble[0][0] == map_seed0
+
+    nominal_values = np.stack([m[0].nominal_values for m in maps_ensemble])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bs_nom_ratios = np.mean(nominal_values, axis=0) / map_baseline.nominal_values
+        bs_std_ratios = np.std(nominal_values, axis=0) / map_baseline.std_devs
+        assert np.abs(np.nanmean(bs_nom_ratios) - 1.0) < 0.01
+        assert np.abs(np.nanmean(bs_std_ratios) - 1.0) < 0.02
+
+    # binned stages after the histogramming of the replicas are rejected
+    after_hist_cfg = deepcopy(ensemble_pipe_cfg)
+    after_hist_cfg[("utils", "fix_error")] = OrderedDict()
+    try:
+        DistributionMaker([after_hist_cfg])
+    except ValueError:
+        pass
+    else:
+        assert False, "stage after histogramming replicas not rejected"
+
     logging.info("<< PASS : bootstrap >>")
 
 
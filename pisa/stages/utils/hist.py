@@ -4,9 +4,11 @@ that represent event counts
 """
 
 import numpy as np
+from scipy import sparse
 
+from pisa import FTYPE
 from pisa.core.stage import Stage
-from pisa.core.translation import histogram
+from pisa.core.translation import BinIndices, histogram
 from pisa.core.binning import MultiDimBinning, OneDimBinning
 from pisa.utils.profiler import profile
 from pisa.utils.log import logging
@@ -28,6 +30,15 @@ class hist(Stage):  # pylint: disable=invalid-name
 
             "weights"
             "unc_weights" (if `apply_unc_weights`)
+
+    Notes
+    -----
+    If the containers hold replicas of their events (e.g. from the
+    `bootstrap` or `kfold` stages), the histograms of all replicas are
+    computed in one pass, resulting in binned weights (and errors) of shape
+    (bins, replicas), see `pisa.core.container.Container`. This is only
+    supported for event-wise calculation, and the stage has to be the last
+    one of the pipeline.
     """
 
     def __init__(
@@ -52,9 +63,14 @@ class hist(Stage):  # pylint: disable=invalid-name
         assert self.calc_mode is not None
         assert self.apply_mode is not None
         self.regularized_apply_mode = None
+        self.hist_transforms = None
         self.apply_unc_weights = apply_unc_weights
         self.unweighted = unweighted
 
+    @property
+    def histograms_replicas(self):
+        return True
+
     def setup_function(self):
 
         assert isinstance(self.apply_mode, MultiDimBinning), (
@@ -68,15 +84,21 @@ class hist(Stage):  # pylint: disable=invalid-name
 
             transform_binning = self.calc_mode + self.apply_mode
 
-            # go to "events" mode to create the transforms
-
+            # go to "events" mode to create the transforms, which map calc
+            # bins onto apply bins; as every event only contributes to a
+            # single entry, they are stored as sparse (CSR) matrices of shape
+            # (apply bins, calc bins)
+            self.hist_transforms = {}
             for container in self.data:
                 self.data.representation = "events"
                 sample = [container[name] for name in transform_binning.names]
-                hist = histogram(sample, None, transform_binning, averaged=False)
-                transform = hist.reshape(self.calc_mode.shape + (-1,))
-                self.data.representation = self.calc_mode
-                container["hist_transform"] = transform
+                indices = BinIndices(sample, transform_binning).indices
+                indices = indices[indices < transform_binning.size]
+                calc_idx, apply_idx = np.divmod(indices, self.apply_mode.size)
+                self.hist_transforms[container.name] = sparse.csr_matrix(
+                    (np.ones(indices.size, dtype=FTYPE), (apply_idx, calc_idx)),
+                    shape=(self.apply_mode.size, self.calc_mode.size),
+                )
 
         elif self.calc_mode == "events":
             # For dimensions where the binning is irregular, we pre-compute the
@@ -132,6 +154,10 @@ class hist(Stage):  # pylint: disable=invalid-name
                 raise NotImplementedError(
                     "Unweighted hist only implemented in event-wise calculation"
                 )
+            if self.data.num_replicas is not None:
+                raise NotImplementedError(
+                    "Replicas only implemented in event-wise calculation"
+                )
             for container in self.data:
 
                 container.representation = self.calc_mode
@@ -143,12 +169,12 @@ class hist(Stage):  # pylint: disable=invalid-name
                     unc_weights = container["unc_weights"]
                 else:
                     unc_weights = np.ones(weights.shape)
-                transform = container["hist_transform"]
+                transform = self.hist_transforms[container.name]
 
-                hist = (unc_weights*weights) @ transform
+                hist = transform @ (unc_weights*weights)
                 if self.error_method == "sumw2":
-                    sumw2 = np.square(unc_weights*weights) @ transform
-                    bin_unc2 = (np.square(unc_weights)*weights) @ transform
+                    sumw2 = transform @ np.square(unc_weights*weights)
+                    bin_unc2 = transform @ (np.square(unc_weights)*weights)
 
                 container.representation = self.apply_mode
                 container["weights"] = hist
@@ -159,20 +185,23 @@ class hist(Stage):  # pylint: disable=invalid-name
 
         elif self.calc_mode == "events":
             for container in self.data:
-                container.representation = self.calc_mode
-                sample = []
+                sample_keys = []
                 dims_log = [d.is_log for d in self.apply_mode]
                 dims_ire = [d.is_irregular for d in self.apply_mode]
                 for dim, is_log, is_ire in zip(
                     self.regularized_apply_mode, dims_log, dims_ire
                 ):
                     if is_log and not is_ire:
-                        container.representation = "log_events"
-                        sample.append(container[dim.name])
+                        sample_keys.append(("log_events", dim.name))
                     else:
-                        container.representation = "events"
-                        sample.append(container[dim.name])
+                        sample_keys.append(("events", dim.name))
+                # events rarely move between iterations, so their bins are
+                # cached by the container
+                bin_indices = container.get_bin_indices(
+                    sample_keys, self.regularized_apply_mode
+                )
 
+                container.representation = self.calc_mode
                 if self.unweighted:
                     if "astro_weights" in container.keys:
                         weights = np.ones_like(
@@ -190,20 +219,29 @@ class hist(Stage):  # pylint: disable=invalid-name
                 else:
                     unc_weights = np.ones(weights.shape)
 
+                replica_weights = container.get_replica_weights()
+                if replica_weights is not None:
+                    # the weights of all replicas are histogrammed at once
+                    weights = weights[:, np.newaxis] * replica_weights
+                    unc_weights = unc_weights[:, np.newaxis]
+
                 # The hist is now computed using a binning that is completely linear
                 # and regular
                 hist = histogram(
-                    sample,
+                    None,
                     unc_weights*weights,
                     self.regularized_apply_mode,
-                    averaged=False
+                    averaged=False,
+                    bin_indices=bin_indices,
                 )
 
                 if self.error_method == "sumw2":
-                    sumw2 = histogram(sample, np.square(unc_weights*weights),
-                        self.regularized_apply_mode, averaged=False)
-                    bin_unc2 = histogram(sample, np.square(unc_weights)*weights,
-                        self.regularized_apply_mode, averaged=False)
+                    sumw2 = histogram(None, np.square(unc_weights*weights),
+                        self.regularized_apply_mode, averaged=False,
+                        bin_indices=bin_indices)
+                    bin_unc2 = histogram(None, np.square(unc_weights)*weights,
+                        self.regularized_apply_mode, averaged=False,
+                        bin_indices=bin_indices)
 
                 container.representation = self.apply_mode
                 container["weights"] = hist
@@ -6,6 +6,10 @@ chunk to make histograms from. It uses the KFold class from scikit-learn to make
 "test" and "train" indeces for the dataset and sets all weights in the "train"
 indeces to zero. Optionally, weights can be re-scaled by the number of splits to
 renormalize the total rates.
+
+Optionally, all splits are produced at once and carried by the containers as
+replicas of the events (see `pisa.core.container.Container`), such that the
+histograms of all splits are obtained from a single pipeline run.
 """
 
 from __future__ import absolute_import, print_function, division
@@ -14,6 +18,7 @@ import numpy as np
 
 from pisa import FTYPE
 from pisa.core.stage import Stage
+from pisa.utils.log import logging, set_verbosity
 
 
 __author__ = "A. Trettin"
@@ -33,7 +38,7 @@ __license__ = """Copyright (c) 2020, The IceCube Collaboration
  limitations under the License."""
 
 
-__all__ = ['kfold', 'init_test']
+__all__ = ['kfold', 'init_test', 'test_kfold']
 
 
 class kfold(Stage):  # pylint: disable=invalid-name
@@ -50,6 +55,9 @@ class kfold(Stage):  # pylint: disable=invalid-name
     renormalize (bool, optional): renormalize weights by multiplying
         by the number of splits
     shuffle (bool, optional): shuffle indeces before splitting
+    all_splits (bool, optional): keep all splits as replicas of the events
+        instead of selecting one (`select_split` and `save_mask` are then
+        ignored); the pipeline's outputs are lists of MapSets, one per split
 
     """
 
@@ -61,6 +69,7 @@ class kfold(Stage):  # pylint: disable=invalid-name
         renormalize=False,
         shuffle=False,
         save_mask=False,
+        all_splits=False,
         **std_kwargs,
     ):
 
@@ -87,21 +96,33 @@ class kfold(Stage):  # pylint: disable=invalid-name
         self.shuffle = bool(shuffle)
 
         self.save_mask = save_mask
+        self.all_splits = bool(all_splits)
 
     def setup_function(self):
         from sklearn.model_selection import KFold
 
         kf = KFold(n_splits=self.n_splits, shuffle=self.shuffle, random_state=self.seed)
         for container in self.data:
+            select_weight = (
+                kf.get_n_splits(container["weights"]) if self.renormalize else 1.0
+            )
+            if self.all_splits:
+                # one column of fold weights per split, which are applied
+                # when histogramming
+                replica_weights = np.zeros(
+                    (container.size, self.n_splits), dtype=FTYPE
+                )
+                for i, (_, test_index) in enumerate(kf.split(container["weights"])):
+                    replica_weights[test_index, i] = select_weight
+                container[container.replica_weights_key] = replica_weights
+                continue
+
             index_gen = kf.split(container["weights"])  # a generator
             for i, (train_index, test_index) in enumerate(index_gen):
                 select_idx = test_index
                 if i == self.select_split:
                     break
             container["fold_weight"] = np.zeros((container.size), dtype=FTYPE)
-            select_weight = (
-                kf.get_n_splits(container["weights"]) if self.renormalize else 1.0
-            )
             container["fold_weight"][select_idx] = select_weight
             container.mark_changed("fold_weight")
 
@@ -112,6 +133,8 @@ class kfold(Stage):  # pylint: disable=invalid-name
 
 
     def apply_function(self):
+        if self.all_splits:
+            return
         for container in self.data:
             container["weights"] *= container["fold_weight"]
 
@@ -119,3 +142,50 @@ class kfold(Stage):  # pylint: disable=invalid-name
 def init_test(**param_kwargs):
     """Initialisation example"""
     return kfold(n_splits=2, calc_mode='events')
+
+
+def test_kfold():
+    """Unit test for the kfold stage: the replicas produced with `all_splits`
+    must match the outputs obtained by selecting each split in turn."""
+    from collections import OrderedDict
+    from copy import deepcopy
+    from pisa.core.distribution_maker import DistributionMaker
+    from pisa.utils.config_parser import parse_pipeline_config
+
+    example_cfg = parse_pipeline_config("settings/pipeline/example.cfg")
+    n_splits = 3
+
+    def kfold_pipe_cfg(**kwargs):
+        kfold_stage_cfg = OrderedDict(
+            apply_mode="events", calc_mode="events", n_splits=n_splits,
+            seed=0, shuffle=True, renormalize=True, **kwargs
+        )
+        pipe_cfg = deepcopy(example_cfg)
+        # insert the kfold stage right after the data loading stage
+        for k in list(pipe_cfg.keys()):
+            pipe_cfg.move_to_end(k)
+            if k == ("data", "simple_data_loader"):
+                pipe_cfg[("utils", "kfold")] = kfold_stage_cfg
+        return pipe_cfg
+
+    dmaker = DistributionMaker([kfold_pipe_cfg(all_splits=True)])
+    maps_all = dmaker.get_outputs(return_sum=True)
+    assert len(maps_all) == n_splits
+
+    for i in range(n_splits):
+        dmaker = DistributionMaker([kfold_pipe_cfg(select_split=i)])
+        map_split = dmaker.get_outputs(return_sum=True)[0]
+        assert np.allclose(maps_all[i][0].nominal_values,
+                           map_split.nominal_values, rtol=1e-10), i
+        assert np.allclose(maps_all[i][0].std_devs,
+                           map_split.std_devs, rtol=1e-10), i
+    # the splits are different
+    assert not np.allclose(maps_all[0][0].nominal_values,
+                           maps_all[1][0].nominal_values)
+
+    logging.info("<< PASS : test_kfold >>")
+
+
+if __name__ == "__main__":
+    set_verbosity(1)
+    test_kfold()
@@ -13,10 +13,12 @@ from __future__ import absolute_import, division, print_function
 from copy import copy
 import sys
 
+from numba import njit
 import numpy as np
-from scipy.optimize import minimize
 
-__all__ = ['Likelihoods']
+from pisa.utils.log import logging, set_verbosity
+
+__all__ = ['Likelihoods', 'test_barlow_llh']
 __author__ = 'Michael Larson'
 __email__ = 'mlarson@nbi.ku.dk'
 __date__ = '2016-03-14'
@@ -61,6 +63,94 @@ class ArgValueError(Exception):
     exitcode = 102
 
 
+@njit
+def _barlow_bestfit_bin(d, w, a, out):
+    """Find the expected MC counts `out` of each sample in a single bin that
+    maximise the Barlow LLH, given the data count `d`, the average weights `w`
+    and the unweighted MC counts `a` of the samples.
+
+    As shown by Barlow and Beeston, the maximum is at
+    ``A_j = a_j / (1 + w_j * t)``, where `t` is the root of the (monotonically
+    decreasing) function ``g(t) = (1 - t) * sum_j w_j A_j(t) - d``, which is
+    found by a safeguarded Newton iteration. A sample without MC events in the
+    bin only gets a non-zero expectation if it has the largest weight and the
+    data cannot be described otherwise.
+    """
+    num_samples = a.size
+
+    # Largest weight among the samples with and without MC events in this bin
+    w_max = 0.
+    w_max_empty = 0.
+    k_empty = -1
+    for j in range(num_samples):
+        if a[j] > 0:
+            w_max = max(w_max, w[j])
+        elif w[j] > w_max_empty:
+            w_max_empty = w[j]
+            k_empty = j
+
+    if d == 0 or (w_max == 0 and k_empty < 0):
+        for j in range(num_samples):
+            out[j] = a[j] / (1. + w[j])
+        return
+
+    if k_empty >= 0 and w_max_empty > w_max:
+        # the expectation of the sample without events is 0 unless the root
+        # of g lies below -1/w_max_empty, i.e. g is negative there
+        t_empty = -1. / w_max_empty
+        g_empty = -d
+        for j in range(num_samples):
+            if a[j] > 0:
+                g_empty += (1. - t_empty) * w[j] * a[j] / (1. + w[j] * t_empty)
+        if g_empty <= 0:
+            f = d / (1. - t_empty)
+            for j in range(num_samples):
+                if a[j] > 0:
+                    out[j] = a[j] / (1. + w[j] * t_empty)
+                    f -= w[j] * out[j]
+                else:
+                    out[j] = 0.
+            out[k_empty] = f / w_max_empty
+            return
+
+    # Bracket [lo, hi] of the root, where g(lo) > 0 and g(hi) <= 0
+    lo = -1. / w_max
+    hi = 1.
+    t = 0.
+    for _ in range(100):
+        s0 = 0.
+        s1 = 0.
+        for j in range(num_samples):
+            if a[j] > 0:
+                x = w[j] / (1. + w[j] * t)
+                s0 += x * a[j]
+                s1 += x * x * a[j]
+        g = (1. - t) * s0 - d
+        if g > 0:
+            lo = t
+        else:
+            hi = t
+        dg = -s0 - (1. - t) * s1
+        t_new = t - g / dg
+        if not lo < t_new < hi:
+            t_new = 0.5 * (lo + hi)
+        converged = abs(t_new - t) <= 1e-14 * max(1., abs(t))
+        t = t_new
+        if converged:
+            break
+
+    for j in range(num_samples):
+        out[j] = a[j] / (1. + w[j] * t) if a[j] > 0 else 0.
+
+
+@njit
+def _barlow_bestfit(data, weights, unweighted, out):
+    """Apply `_barlow_bestfit_bin` to all bins (second axis of `weights`,
+    `unweighted` and `out`)"""
+    for i in range(data.size):
+        _barlow_bestfit_bin(data[i], weights[:, i], unweighted[:, i], out[:, i])
+
+
 class Likelihoods(object):
     """
 A class to handle the likelihood calculations in OscFit. It can
@@ -202,11 +292,9 @@ of best-fit weighted histograms for each sample).
         unweighted histograms. You can choose between "Poisson" and "Barlow"
         likelihoods at the moment.
 
-        If using the "Barlow" LLH, note that the method is picked to be Powell
-        with 25 iterations maximum per step. This is not optimized at all and
-        was explicitly chosen simply because it "worked". This doesn't work
-        with the bounds set in the normal way, so the positive-definiteness of
-        the rates is enforced in the get_llh_barlow_bin method.
+        If using the "Barlow" LLH, the best-fit expected MC counts are found
+        for all bins at once (see `_barlow_bestfit_bin`), and the likelihood
+        in each bin is then evaluated as in the `get_llh_barlow_bin` method.
 
         """
         llh_type = llh_type.lower()
@@ -219,24 +307,16 @@ of best-fit weighted histograms for each sample).
             return poisson_llh
 
         # The more complicated case: The Barlow LLH
-        # This requires a separate minimization step in each bin to estimate
+        # This requires a separate maximization in each bin to estimate
         #  the expected rate in each bin from each MC sample using constraints
         #  from the data and the observed MC distribution.
         elif llh_type == "barlow":
-            llh = 0
-            for bin_n in range(len(self.data_histogram)):
-                self.current_bin = bin_n
-                bin_result = minimize(
-                    fun=self.get_llh_barlow_bin,
-                    x0=self.bestfit_plots[:, bin_n],
-                    method="Powell",
-                    options={'maxiter': 25, 'disp': False}
-                )
-                self.bestfit_plots[:, bin_n] = bin_result.x
-                llh += bin_result.fun
-
-            self.current_bin = None
-            return llh
+            data = np.asarray(self.data_histogram, dtype=np.float64)
+            weights = np.asarray(self.mc_histograms, dtype=np.float64)
+            unweighted = np.asarray(self.unweighted_histograms, dtype=np.float64)
+            self.bestfit_plots = np.empty_like(unweighted)
+            _barlow_bestfit(data, weights, unweighted, self.bestfit_plots)
+            return self.get_llh_barlow()
 
         raise ArgValueError(
             'Unknown `llh_type` "{}". Choose either "Poisson" (ideal) or'
@@ -287,6 +367,28 @@ of best-fit weighted histograms for each sample).
 
         return -llh
 
+    def get_llh_barlow(self):
+        """The Barlow LLH (see `get_llh_barlow_bin`) summed over all bins,
+        evaluated at the current `bestfit_plots`."""
+        di = self.data_histogram
+        a_i = self.bestfit_plots
+        fi = np.sum(np.multiply(self.mc_histograms, a_i), axis=0)
+        ai = self.unweighted_histograms
+
+        llh = 0
+
+        cut = fi > 0
+        llh += np.sum(di[cut] * np.log(fi[cut]) - fi[cut])
+        cut = di > 0
+        llh -= np.sum(di[cut] * np.log(di[cut]) - di[cut])
+
+        cut = a_i > 0
+        llh += np.sum(ai[cut] * np.log(a_i[cut]) - a_i[cut])
+        cut = ai > 0
+        llh -= np.sum(ai[cut] * np.log(ai[cut]) - ai[cut])
+
+        return -llh
+
     def get_llh_poisson(self):
         """The standard binned-poisson likelihood comparing the weighted MC
         distribution to the data, ignoring MC statistical uncertainties."""
@@ -306,3 +408,52 @@ of best-fit weighted histograms for each sample).
         llh -= np.sum(di[cut] * np.log(di[cut]) - di[cut])
 
         return -llh
+
+
+def test_barlow_llh():
+    """Compare the best-fit Barlow LLH with a per-bin numerical minimization
+    of `Likelihoods.get_llh_barlow_bin`."""
+    from scipy.optimize import minimize
+
+    rng = np.random.default_rng(0)
+    num_samples = 3
+    shape = (6, 8)
+    unweighted = rng.poisson(rng.uniform(0, 10, (num_samples,) + shape)).astype(float)
+    weights = rng.uniform(0.01, 2., (num_samples,) + shape)
+    data = rng.poisson(np.sum(unweighted * weights, axis=0)).astype(float)
+    # some corner cases: no data, no MC in some or all of the samples
+    data[0, 0] = 0
+    unweighted[:, 0, 1] = 0
+    unweighted[0, 0, 2] = 0
+    weights[0, 0, 2] = 5.
+    data[0, 2] = 100
+
+    likelihoods = Likelihoods()
+    likelihoods.set_data(data)
+    likelihoods.set_mc(weights)
+    likelihoods.set_unweighted(unweighted)
+    llh = likelihoods.get_llh('barlow')
+    bestfit = likelihoods.bestfit_plots
+
+    ref_llh = 0
+    for bin_n in range(data.size):
+        likelihoods.current_bin = bin_n
+        fun = likelihoods.get_llh_barlow_bin(bestfit[:, bin_n])
+        ref_fun = np.inf
+        for x0 in (unweighted.reshape(num_samples, -1)[:, bin_n] + 1,
+                   bestfit[:, bin_n] * 1.1 + 0.1):
+            ref = minimize(
+                fun=likelihoods.get_llh_barlow_bin, x0=x0, method='Nelder-Mead',
+                options={'xatol': 1e-10, 'fatol': 1e-12, 'maxiter': 10000}
+            )
+            ref_fun = min(ref_fun, ref.fun)
+        # the best fit is at least as good as the numerical minimum
+        assert fun <= ref_fun + 1e-8, (bin_n, fun, ref_fun)
+        ref_llh += ref_fun
+    assert llh <= ref_llh and np.isclose(llh, ref_llh, rtol=1e-3)
+    logging.info('<< PASS : test_barlow_llh >>')
+
+
+if __name__ == '__main__':
+    set_verbosity(1)
+    test_barlow_llh()
@@ -81,6 +81,10 @@ required, in addition to a ``[binning]`` section:
   through the pipeline which contain histogram weights and (if desired) errors
   (note: the presence of these keys is in general not obvious from a given
   pipeline config file itself)
+  Setting ``incremental = True`` makes the pipeline only rerun the stages
+  affected by parameter changes since its previous run, and
+  ``fast_maps = True`` makes it output maps that store values and variances
+  as plain arrays.
 * ``binning`` can contain different binning definitions, that are then later
   referred to from within the ``stage.service`` sections.
 * ``stage.service``: one such section per stage.service is necessary. It may
@@ -791,6 +795,20 @@ def parse_pipeline_config(config):
     else:
         stage_dicts[section]['detector_name'] = None
 
+    if config.has_option(section, 'incremental'):
+        stage_dicts[section]['incremental'] = config.getboolean(
+            section, 'incremental'
+        )
+    else:
+        stage_dicts[section]['incremental'] = False
+
+    if config.has_option(section, 'fast_maps'):
+        stage_dicts[section]['fast_maps'] = config.getboolean(
+            section, 'fast_maps'
+        )
+    else:
+        stage_dicts[section]['fast_maps'] = False
+
 
     # Parse [stage.<stage_name>] sections and store to stage_dicts
     for stage, service in order:  # pylint: disable=too-many-nested-blocks
@@ -0,0 +1,250 @@
+"""
+Parsing, compilation and evaluation of cut expressions, i.e., numpy boolean
+expressions over named event variables such as
+``"(true_energy >= 1) & (true_energy <= 80)"``.
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import ast
+from functools import lru_cache
+
+import numba
+import numpy as np
+
+from pisa.utils.log import logging, set_verbosity
+
+
+__all__ = ['CutExpression', 'get_cut_expression', 'test_cut_expression']
+
+__license__ = '''Copyright (c) 2014-2020, The IceCube Collaboration
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.'''
+
+
+# Names that are never interpreted as variables
+RESERVED_NAMES = ('np',)
+
+# Operators that act element-wise in the same way on numpy arrays and on
+# scalars inside a numba kernel
+_KERNEL_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.BitAnd, ast.BitOr, ast.BitXor)
+_KERNEL_UNARYOPS = (ast.Invert, ast.USub, ast.UAdd)
+_KERNEL_CMPOPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+# Column dtypes for which the kernel yields results identical to numpy
+# (smaller types would be promoted differently when compared to constants)
+_KERNEL_DTYPES = (np.dtype(np.float64), np.dtype(np.int64), np.dtype(np.bool_))
+
+
+def _is_kernel_compatible(node):
+    """Whether the expression (sub-)tree `node` only consists of element-wise
+    operations that can be fused into a single numba kernel"""
+    if isinstance(node, ast.Expression):
+        return _is_kernel_compatible(node.body)
+    if isinstance(node, ast.Name):
+        return node.id not in RESERVED_NAMES
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (bool, int, float))
+    if isinstance(node, ast.BinOp):
+        return (isinstance(node.op, _KERNEL_BINOPS)
+                and _is_kernel_compatible(node.left)
+                and _is_kernel_compatible(node.right))
+    if isinstance(node, ast.UnaryOp):
+        return (isinstance(node.op, _KERNEL_UNARYOPS)
+                and _is_kernel_compatible(node.operand))
+    if isinstance(node, ast.Compare):
+        # chained comparisons are not valid for arrays
+        return (len(node.ops) == 1 and isinstance(node.ops[0], _KERNEL_CMPOPS)
+                and _is_kernel_compatible(node.left)
+                and _is_kernel_compatible(node.comparators[0]))
+    if isinstance(node, ast.Call):
+        # only numpy ufuncs, e.g. `np.log10(x)`
+        func = node.func
+        return (isinstance(func, ast.Attribute)
+                and isinstance(func.value, ast.Name) and func.value.id == 'np'
+                and isinstance(getattr(np, func.attr, None), np.ufunc)
+                and not node.keywords
+                and all(_is_kernel_compatible(arg) for arg in node.args))
+    return False
+
+
+class CutExpression(object):
+    """
+    A cut expression, parsed and compiled once and then evaluated on any set
+    of columns.
+
+    The expression can be any numpy expression, where bare names (apart from
+    `np`) refer to variables. Expressions that only consist of element-wise
+    arithmetic, comparisons, logical operators and numpy ufuncs are evaluated
+    on large arrays in a single pass by a fused numba kernel, avoiding the
+    creation of temporary arrays for every sub-expression.
+
+    Parameters
+    ----------
+    expression : str
+
+    Examples
+    --------
+    >>> cut = CutExpression("(true_energy >= 1) & (true_energy <= 80)")
+    >>> cut.variables
+    ('true_energy',)
+    >>> cut({'true_energy': np.array([0.5, 2., 100.])})
+    array([False,  True, False])
+
+    """
+
+    fused_min_size = 1000000
+    """Minimum number of elements for which the fused kernel is used, since
+    compiling it only pays off for large arrays"""
+
+    def __init__(self, expression):
+        assert isinstance(expression, str)
+        self.expression = expression
+
+        tree = ast.parse(expression.strip(), mode='eval')
+
+        # Collect the variable names, in order of appearance
+        variables = []
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Name) and node.id not in RESERVED_NAMES
+                    and node.id not in variables):
+                variables.append(node.id)
+        self.variables = tuple(variables)
+
+        self._code = compile(tree, '<cut expression>', 'eval')
+
+        self._fusable = _is_kernel_compatible(tree)
+        self._kernel = None
+
+    def __repr__(self):
+        return 'CutExpression(%r)' % self.expression
+
+    def _get_kernel(self):
+        """Compile the fused kernel on first use"""
+        if self._kernel is None:
+            # The variables are valid identifiers, so can be used as the
+            # argument names of a scalar function returning the expression
+            source = 'def _cut_kernel(%s):\n    return (%s)\n' % (
+                ', '.join(self.variables), self.expression.strip()
+            )
+            namespace = {'np': np}
+            exec(source, namespace) # pylint: disable=exec-used
+            self._kernel = numba.vectorize(nopython=True)(namespace['_cut_kernel'])
+        return self._kernel
+
+    def __call__(self, columns):
+        """Evaluate the expression.
+
+        Parameters
+        ----------
+        columns : mapping
+            Must provide (at least) the arrays for all `variables`. Names that
+            are not found in `columns` are looked up among Python's builtins.
+
+        Returns
+        -------
+        result : array
+            Typically a boolean mask
+
+        """
+        arrays = {var: columns[var] for var in self.variables if var in columns}
+
+        use_kernel = (
+            self._fusable
+            and len(arrays) == len(self.variables) > 0
+            and all(
+                isinstance(a, np.ndarray) and a.ndim == 1
+                and a.size >= self.fused_min_size and a.dtype in _KERNEL_DTYPES
+                for a in arrays.values()
+            )
+        )
+        if use_kernel:
+            try:
+                kernel = self._get_kernel()
+                return kernel(*[arrays[var] for var in self.variables])
+            except Exception as err: # pylint: disable=broad-except
+                logging.debug(
+                    'Fused evaluation of %s failed (%s), falling back to numpy',
+                    self, err
+                )
+                self._fusable = False
+
+        return eval(self._code, {'np': np}, arrays) # pylint: disable=eval-used
+
+
+@lru_cache(maxsize=256)
+def get_cut_expression(expression):
+    """Get the (cached) `CutExpression` for the string `expression`, such that
+    every expression is only parsed and compiled once."""
+    return CutExpression(expression)
+
+
+def test_cut_expression():
+    """Unit tests for `CutExpression`"""
+    rng = np.random.default_rng(0)
+    n_evts = 2000
+    columns = {
+        'true_energy': rng.uniform(0.5, 100., n_evts),
+        'true_coszen': rng.uniform(-1., 1., n_evts),
+        'pid': rng.integers(-3, 3, n_evts),
+    }
+
+    expressions = [
+        '(true_energy >= 1) & (true_energy <= 80)',
+        '~((true_energy >= 1) & (true_energy <= 80))',
+        'np.log10(true_energy) >= 1',
+        '(true_coszen <= 0.5) & (pid >= 0) | (np.abs(true_coszen) < 0.1)',
+        'true_energy * (1 + true_coszen) > 20',
+    ]
+
+    # Variables are only looked up as whole names
+    assert get_cut_expression(expressions[2]).variables == ('true_energy',)
+    assert get_cut_expression(expressions[3]).variables == (
+        'true_coszen', 'pid'
+    )
+    # ... and expressions are only parsed once
+    assert get_cut_expression(expressions[0]) is get_cut_expression(expressions[0])
+
+    for expression in expressions:
+        reference = eval(expression, {'np': np}, columns) # pylint: disable=eval-used
+        cut = CutExpression(expression)
+        assert cut._fusable, expression # pylint: disable=protected-access
+        assert np.array_equal(cut(columns), reference), expression
+
+        # Force the use of the fused kernel
+        cut.fused_min_size = 0
+        mask = cut(columns)
+        assert cut._kernel is not None, expression # pylint: disable=protected-access
+        assert mask.dtype == reference.dtype
+        assert np.array_equal(mask, reference), expression
+
+    # Not element-wise, so never fused
+    cut = CutExpression('true_energy > np.median(true_energy)')
+    cut.fused_min_size = 0
+    assert not cut._fusable # pylint: disable=protected-access
+    assert np.sum(cut(columns)) == n_evts // 2
+
+    # Unknown variables
+    try:
+        CutExpression('reco_energy > 1')(columns)
+    except NameError:
+        pass
+    else:
+        assert False
+
+    logging.info('<< PASS : test_cut_expression >>')
+
+
+if __name__ == '__main__':
+    set_verbosity(1)
+    test_cut_expression()
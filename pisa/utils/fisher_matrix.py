@@ -75,10 +75,14 @@ def build_fisher_matrix(gradient_hist_flat_d, fiducial_hist, fiducial_params):
     return fisher, nonempty
 
 
-def get_fisher_matrix(hypo_maker, test_vals, counter):
+def get_fisher_matrix(hypo_maker, test_vals, counter, num_workers=None):
     """Compute Fisher matrices at fiducial hypothesis given data.
+
+    The templates for all parameter variations are generated at once,
+    optionally distributed over `num_workers` worker processes (see
+    `pisa.utils.pull_method.get_templates`).
     """
-    from pisa.utils.pull_method import get_gradients
+    from pisa.utils.pull_method import get_derivative_map, get_templates
     hypo_params = hypo_maker.params.free
 
     #fisher = {'total': {}}
@@ -88,23 +92,29 @@ def get_fisher_matrix(hypo_maker, test_vals, counter):
     pmaps = {'total': {}}
     gradient_maps = {'total': {}}
 
+    param_values = [
+        (pname, test_val) for pname in hypo_params.names
+        for test_val in test_vals[pname]
+    ]
+    templates = get_templates(
+        hypo_maker=hypo_maker, param_values=param_values, num_workers=num_workers
+    )
+    counter += len(param_values)
+
     for pname in hypo_params.names:
         logging.trace("Computing binwise gradients for parameter '%s'." % pname)
-        tpm, gm = get_gradients(
-            param=pname,
-            hypo_maker=hypo_maker,
-            test_vals=test_vals[pname],
-        )
-        counter += len(test_vals[pname])
         # the maps corresponding to variations of
         # a single param are not flattened
+        tpm = {
+            test_val: template for (name, test_val), template
+            in zip(param_values, templates) if name == pname
+        }
         pmaps['total'][pname] = tpm
         # these are flattened, which is also what the
         # method below assumes
-        gradient_maps['total'][pname] = gm
+        gradient_maps['total'][pname] = get_derivative_map(hypo_maps=tpm)
 
-    # hypo param values are not at nominal anymore,
-    # but we don't use their values here
+    # hypo param values are back at their fiducial values
 
     fisher, nonempty = build_fisher_matrix(
         gradient_hist_flat_d=gradient_maps['total'],
@@ -8,9 +8,13 @@ this as a stage it makes sense to copy it in to here so somebody can't
 accidentally do the wrong thing with that script.
 """
 
+from collections import namedtuple
+
+from numba import njit, prange
 import numpy as np
 import scipy.interpolate as interpolate
 
+from pisa import TARGET
 from pisa.utils.log import logging
 from pisa.utils.resources import open_resource
 
@@ -19,10 +23,15 @@ __all__ = [
     "load_2d_honda_table",
     "load_2d_bartol_table",
     "load_2d_table",
+    "FluxSplineCoeffs",
+    "make_2d_flux_coeffs",
     "calculate_2d_flux_weights",
     "load_3d_honda_table",
     "load_3d_table",
+    "make_3d_flux_coeffs",
     "calculate_3d_flux_weights",
+    "test_calculate_2d_flux_weights",
+    "test_calculate_3d_flux_weights",
 ]
 
 __author__ = "S. Wren"
@@ -264,6 +273,264 @@ def load_2d_table(flux_file, enpow=1, return_table=False):
     return spline_dict
 
 
+FluxSplineCoeffs = namedtuple(
+    "FluxSplineCoeffs",
+    ["e_knots", "e_deg", "e_coeffs", "cz_knots", "cz_deg", "cz_coeffs"],
+)
+FluxSplineCoeffs.__doc__ = """B-spline coefficients needed to evaluate the
+integral-preserving flux splines for many events at once.
+
+`e_coeffs` holds the coefficients of the first derivative (in log10 energy)
+of the energy splines for each table coszen value (and, in 3D mode, for each
+table azimuth value in front). `cz_coeffs` is the linear map from these
+derivatives to the coefficients of the derivative of the integral-preserving
+coszen spline, which only depends on the coszen nodes and hence can be
+computed once.
+"""
+
+_CHUNK_SIZE = 4096
+"""Events per work unit for the flux kernels (per-thread scratch arrays are
+allocated once per chunk)"""
+
+
+def _ip_derivative_matrix(nodes, width):
+    """Get the linear map from table values to the derivative of the
+    integral-preserving spline through `nodes`.
+
+    The integral-preserving spline is the interpolating cubic spline through
+    the cumulative sum of the `len(nodes) - 1` table values times `width`.
+    Since interpolating splines are linear in the data, its derivative can be
+    expressed as a matrix acting on the table values.
+
+    Returns
+    -------
+    knots : array
+    deg : int
+    coeffs : array of shape (num_coeffs, len(nodes) - 1)
+
+    """
+    num_vals = len(nodes) - 1
+    knots, deg = None, None
+    columns = []
+    for j in range(num_vals):
+        int_vals = np.zeros(len(nodes))
+        int_vals[j + 1 :] = width
+        knots, coeffs, deg = interpolate.splder(
+            interpolate.splrep(nodes, int_vals, s=0)
+        )
+        columns.append(coeffs[: len(knots) - deg - 1])
+    return knots, deg, np.array(columns).T
+
+
+def _stack_energy_derivatives(splines):
+    """Stack the derivative coefficients of a sequence of energy splines,
+    which are required to share the same knots"""
+    knots, deg = None, None
+    rows = []
+    for tck in splines:
+        t, c, k = interpolate.splder(tck)
+        if knots is None:
+            knots, deg = t, k
+        elif k != deg or not np.array_equal(t, knots):
+            raise ValueError("Energy splines must all share the same knots")
+        rows.append(c[: len(t) - k - 1])
+    return knots, deg, np.array(rows)
+
+
+def make_2d_flux_coeffs(en_splines):
+    """Precompute everything needed to evaluate `en_splines` (for one
+    primary, as returned by `load_2d_table`) for arbitrary events.
+
+    Parameters
+    ----------
+    en_splines : dict
+        Energy splines keyed by table coszen value
+
+    Returns
+    -------
+    coeffs : FluxSplineCoeffs
+
+    """
+    czkeys = ["%.2f" % x for x in np.linspace(-0.95, 0.95, 20)]
+    e_knots, e_deg, e_coeffs = _stack_energy_derivatives(
+        [en_splines[czkey] for czkey in czkeys]
+    )
+    cz_knots, cz_deg, cz_coeffs = _ip_derivative_matrix(np.linspace(-1, 1, 21), 0.1)
+    return FluxSplineCoeffs(e_knots, e_deg, e_coeffs, cz_knots, cz_deg, cz_coeffs)
+
+
+def make_3d_flux_coeffs(en_splines):
+    """Precompute everything needed to evaluate `en_splines` (for one
+    primary, as returned by `load_3d_table`) for arbitrary events.
+
+    Parameters
+    ----------
+    en_splines : dict
+        Dicts of energy splines keyed by table coszen value, keyed by table
+        azimuth value
+
+    Returns
+    -------
+    coeffs : FluxSplineCoeffs
+        `e_coeffs` has an additional leading azimuth dimension
+
+    """
+    azkeys = np.linspace(15.0, 345.0, 12)
+    czkeys = ["%.2f" % x for x in np.linspace(-0.95, 0.95, 20)]
+    e_knots, e_deg, e_coeffs = _stack_energy_derivatives(
+        [en_splines[azkey][czkey] for azkey in azkeys for czkey in czkeys]
+    )
+    e_coeffs = e_coeffs.reshape(len(azkeys), len(czkeys), -1)
+    cz_knots, cz_deg, cz_coeffs = _ip_derivative_matrix(np.linspace(-1, 1, 21), 0.1)
+    return FluxSplineCoeffs(e_knots, e_deg, e_coeffs, cz_knots, cz_deg, cz_coeffs)
+
+
+@njit
+def _find_interval(knots, deg, x):
+    """Index `l` of the knot interval t[l] <= x < t[l+1] used to evaluate
+    the spline at `x`; points outside the spline range use the outermost
+    intervals, i.e. extrapolate like `splev`"""
+    lo = deg
+    hi = knots.size - deg - 2
+    if x < knots[lo + 1]:
+        return lo
+    if x >= knots[hi]:
+        return hi
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if x >= knots[mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+@njit
+def _bspline_basis(knots, deg, x, l, h, hh):
+    """Fill `h` with the `deg + 1` non-zero B-spline basis functions at `x`
+    (Cox-de Boor recursion as in FITPACK's `fpbspl`); `hh` is scratch"""
+    h[0] = 1.0
+    for j in range(1, deg + 1):
+        for i in range(j):
+            hh[i] = h[i]
+        h[0] = 0.0
+        for i in range(1, j + 1):
+            li = l + i
+            lj = li - j
+            if knots[li] == knots[lj]:
+                h[i] = 0.0
+                continue
+            f = hh[i - 1] / (knots[li] - knots[lj])
+            h[i - 1] += f * (knots[li] - x)
+            h[i] = f * (x - knots[lj])
+
+
+@njit
+def _ip_weights(knots, deg, coeffs, x, h, hh, weights):
+    """Weights of the table values for the integral-preserving spline
+    derivative at `x`"""
+    l = _find_interval(knots, deg, x)
+    _bspline_basis(knots, deg, x, l, h, hh)
+    for j in range(weights.size):
+        weights[j] = 0.0
+        for m in range(deg + 1):
+            weights[j] += h[m] * coeffs[l - deg + m, j]
+
+
+@njit
+def _weighted_energy_derivatives(e_coeffs, l, deg, h, weights):
+    """Sum of energy spline derivatives (basis `h` in interval `l`) weighted
+    by `weights`"""
+    val = 0.0
+    for j in range(weights.size):
+        deriv = 0.0
+        for m in range(deg + 1):
+            deriv += h[m] * e_coeffs[j, l - deg + m]
+        val += weights[j] * deriv
+    return val
+
+
+@njit(parallel=True if TARGET == "parallel" else False)
+def _eval_2d_flux(
+    energies, coszens, e_knots, e_deg, e_coeffs, cz_knots, cz_deg, cz_coeffs, enpow, out
+):
+    num_events = out.size
+    num_chunks = (num_events + _CHUNK_SIZE - 1) // _CHUNK_SIZE
+    for chunk in prange(num_chunks):
+        h_e = np.empty(e_deg + 1)
+        h_cz = np.empty(cz_deg + 1)
+        hh = np.empty(max(e_deg, cz_deg) + 1)
+        weights = np.empty(e_coeffs.shape[0])
+        for idx in range(
+            chunk * _CHUNK_SIZE, min((chunk + 1) * _CHUNK_SIZE, num_events)
+        ):
+            _ip_weights(cz_knots, cz_deg, cz_coeffs, coszens[idx], h_cz, hh, weights)
+            log_energy = np.log10(energies[idx])
+            l_e = _find_interval(e_knots, e_deg, log_energy)
+            _bspline_basis(e_knots, e_deg, log_energy, l_e, h_e, hh)
+            out[idx] = _weighted_energy_derivatives(
+                e_coeffs, l_e, e_deg, h_e, weights
+            ) / energies[idx] ** enpow
+
+
+@njit(parallel=True if TARGET == "parallel" else False)
+def _eval_3d_flux(
+    energies,
+    coszens,
+    azimuths,
+    e_knots,
+    e_deg,
+    e_coeffs,
+    cz_knots,
+    cz_deg,
+    cz_coeffs,
+    az_knots,
+    az_deg,
+    az_coeffs,
+    az_linear,
+    enpow,
+    out,
+):
+    num_events = out.size
+    num_az = e_coeffs.shape[0]
+    num_chunks = (num_events + _CHUNK_SIZE - 1) // _CHUNK_SIZE
+    for chunk in prange(num_chunks):
+        h_e = np.empty(e_deg + 1)
+        h_cz = np.empty(cz_deg + 1)
+        h_az = np.empty(az_deg + 1)
+        hh = np.empty(max(e_deg, cz_deg, az_deg) + 1)
+        weights = np.empty(e_coeffs.shape[1])
+        az_weights = np.empty(num_az)
+        az_vals = np.empty(num_az + 1)
+        for idx in range(
+            chunk * _CHUNK_SIZE, min((chunk + 1) * _CHUNK_SIZE, num_events)
+        ):
+            _ip_weights(cz_knots, cz_deg, cz_coeffs, coszens[idx], h_cz, hh, weights)
+            log_energy = np.log10(energies[idx])
+            l_e = _find_interval(e_knots, e_deg, log_energy)
+            _bspline_basis(e_knots, e_deg, log_energy, l_e, h_e, hh)
+            for a in range(num_az):
+                az_vals[a] = _weighted_energy_derivatives(
+                    e_coeffs[a], l_e, e_deg, h_e, weights
+                )
+
+            azimuth = azimuths[idx] * 180.0 / np.pi
+            if az_linear:
+                # Linear interpolation on the cyclic 15, 45, ..., 375 deg grid
+                az_vals[num_az] = az_vals[0]
+                if azimuth < 15.0:
+                    azimuth += 360.0
+                i_az = min(max(int((azimuth - 15.0) // 30.0), 0), num_az - 1)
+                frac = (azimuth - (15.0 + 30.0 * i_az)) / 30.0
+                val = az_vals[i_az] + frac * (az_vals[i_az + 1] - az_vals[i_az])
+            else:
+                _ip_weights(az_knots, az_deg, az_coeffs, azimuth, h_az, hh, az_weights)
+                val = 0.0
+                for a in range(num_az):
+                    val += az_weights[a] * az_vals[a]
+            out[idx] = val / energies[idx] ** enpow
+
+
 def calculate_2d_flux_weights(
     true_energies, true_coszens, en_splines, enpow=1, out=None
 ):
@@ -279,9 +546,10 @@ def calculate_2d_flux_weights(
         A list of the true energies of your MC events. Pass this in GeV!
     true_coszens : list or numpy array
         A list of the true coszens of your MC events
-    en_splines : list of splines
+    en_splines : list of splines or FluxSplineCoeffs
         A list of the initialised energy splines from the previous function
-        for your desired primary.
+        for your desired primary, or the coefficients precomputed from them
+        via `make_2d_flux_coeffs` (avoids redoing this for repeated calls).
     enpow : integer
         The power to which the energy was raised in the construction of the
         splines. If you don't know what this means, leave it as 1.
@@ -324,27 +592,24 @@ def calculate_2d_flux_weights(
     if not isinstance(enpow, int):
         raise TypeError("Energy power must be an integer")
 
-    num_cz_points = 20
-    czkeys = ["%.2f" % x for x in np.linspace(-0.95, 0.95, num_cz_points)]
-    cz_spline_points = np.linspace(-1, 1, num_cz_points + 1)
+    if not isinstance(en_splines, FluxSplineCoeffs):
+        en_splines = make_2d_flux_coeffs(en_splines)
 
     if out is None:
         out = np.empty_like(true_energies)
 
-    spline_vals = np.zeros(num_cz_points + 1)
-    for i in range(len(true_energies)):
-        true_log_energy = np.log10(true_energies[i])
-        for j in range(num_cz_points):
-            spline_vals[j + 1] = interpolate.splev(
-                true_log_energy, en_splines[czkeys[j]], der=1
-            )
-
-        int_spline_vals = np.cumsum(spline_vals) * 0.1
-        spline = interpolate.splrep(cz_spline_points, int_spline_vals, s=0)
-
-        out[i] = interpolate.splev(true_coszens[i], spline, der=1) / np.power(
-            true_energies[i], enpow
-        )
+    _eval_2d_flux(
+        true_energies,
+        true_coszens,
+        en_splines.e_knots,
+        en_splines.e_deg,
+        en_splines.e_coeffs,
+        en_splines.cz_knots,
+        en_splines.cz_deg,
+        en_splines.cz_coeffs,
+        enpow,
+        out,
+    )
 
     return out
 
@@ -490,9 +755,10 @@ def calculate_3d_flux_weights(
         A list of the true coszens of your MC events
     true_azimuths : list or numpy array
         A list of the true azimuths of your MC events. Pass this in radians!
-    en_splines : list of splines
+    en_splines : list of splines or FluxSplineCoeffs
         A list of the initialised energy splines from the previous function
-        for your desired primary.
+        for your desired primary, or the coefficients precomputed from them
+        via `make_3d_flux_coeffs`.
     enpow : integer
         The power to which the energy was raised in the construction of the
         splines. If you don't know what this means, leave it as 1.
@@ -549,57 +815,124 @@ def calculate_3d_flux_weights(
             "Azimuths should be given as the angle, so should " "all be positive"
         )
 
-    azkeys = np.linspace(15.0, 345.0, 12)
-    if not az_linear:
-        az_spline_points = np.linspace(0.0, 360.0, 13)
-    else:
-        az_spline_points = np.linspace(15.0, 375.0, 13)
+    if not isinstance(en_splines, FluxSplineCoeffs):
+        en_splines = make_3d_flux_coeffs(en_splines)
+    az_knots, az_deg, az_coeffs = _ip_derivative_matrix(
+        np.linspace(0.0, 360.0, 13), 30.0
+    )
+
+    flux_weights = np.empty(len(true_energies))
+    _eval_3d_flux(
+        true_energies,
+        true_coszens,
+        true_azimuths,
+        en_splines.e_knots,
+        en_splines.e_deg,
+        en_splines.e_coeffs,
+        en_splines.cz_knots,
+        en_splines.cz_deg,
+        en_splines.cz_coeffs,
+        az_knots,
+        az_deg,
+        az_coeffs,
+        az_linear,
+        enpow,
+        flux_weights,
+    )
+    return flux_weights
+
+
+def _reference_flux_weights(true_energies, true_coszens, true_azimuths,
+                            en_splines, enpow=1, az_linear=True):
+    """Per-event evaluation of the integral-preserving splines via
+    `splev`/`splrep`, used to validate the vectorized kernels. Pass
+    `true_azimuths=None` for 2D splines."""
     czkeys = ["%.2f" % x for x in np.linspace(-0.95, 0.95, 20)]
     cz_spline_points = np.linspace(-1, 1, 21)
-
-    flux_weights = []
-    for true_energy, true_coszen, true_azimuth in zip(
-        true_energies, true_coszens, true_azimuths
+    azkeys = [None] if true_azimuths is None else np.linspace(15.0, 345.0, 12)
+    if true_azimuths is None:
+        true_azimuths = np.zeros_like(true_energies)
+    out = np.empty(len(true_energies))
+    for i, (energy, coszen, azimuth) in enumerate(
+        zip(true_energies, true_coszens, true_azimuths)
     ):
-        true_azimuth *= 180.0 / np.pi
-        true_log_energy = np.log10(true_energy)
-        az_spline_vals = []
+        az_vals = []
         for azkey in azkeys:
-            cz_spline_vals = [0]
-            for czkey in czkeys:
-                spval = interpolate.splev(
-                    true_log_energy, en_splines[azkey][czkey], der=1
-                )
-
-                cz_spline_vals.append(spval)
-            cz_spline_vals = np.array(cz_spline_vals)
-            cz_int_spline_vals = np.cumsum(cz_spline_vals) * 0.1
-            cz_spline = interpolate.splrep(cz_spline_points, cz_int_spline_vals, s=0)
-            az_spline_vals.append(interpolate.splev(true_coszen, cz_spline, der=1))
-        # Treat the azimuthal dimension in an integral-preserving manner.
-        # This is not recommended.
-        if not az_linear:
-            az_spline_vals = np.array(az_spline_vals)
-            az_spline_vals = np.insert(az_spline_vals, 0, 0)
-            az_int_spline_vals = np.cumsum(az_spline_vals) * 30.0
-            az_spline = interpolate.splrep(az_spline_points, az_int_spline_vals, s=0)
-            flux_weights.append(
-                interpolate.splev(true_azimuth, az_spline, der=1)
-                / np.power(true_energy, enpow)
+            splines = en_splines if azkey is None else en_splines[azkey]
+            cz_vals = [0] + [
+                interpolate.splev(np.log10(energy), splines[czkey], der=1)
+                for czkey in czkeys
+            ]
+            cz_spline = interpolate.splrep(
+                cz_spline_points, np.cumsum(cz_vals) * 0.1, s=0
             )
-        # Treat the azimuthal dimension with a linear interpolation.
-        # This is the best treatment.
+            az_vals.append(interpolate.splev(coszen, cz_spline, der=1))
+        azimuth = azimuth * 180.0 / np.pi
+        if azkeys[0] is None:
+            out[i] = az_vals[0]
+        elif az_linear:
+            az_vals.append(az_vals[0])
+            if azimuth < 15.0:
+                azimuth += 360.0
+            out[i] = np.interp(azimuth, np.linspace(15.0, 375.0, 13), az_vals)
         else:
-            # Make the azimuthal spline cyclic
-            az_spline_vals.append(az_spline_vals[0])
-            # Account for the energy power that was applied in the first splines
-            az_spline_vals /= np.power(true_energy, enpow)
-            az_spline = interpolate.splrep(az_spline_points, az_spline_vals, k=1)
-            if true_azimuth < 15.0:
-                true_azimuth += 360.0
-            flux_weights.append(interpolate.splev(true_azimuth, az_spline, der=0))
-    flux_weights = np.array(flux_weights)
-    return flux_weights
+            az_spline = interpolate.splrep(
+                np.linspace(0.0, 360.0, 13), np.cumsum([0] + az_vals) * 30.0, s=0
+            )
+            out[i] = interpolate.splev(azimuth, az_spline, der=1)
+        out[i] /= np.power(energy, enpow)
+    return out
+
+
+def _random_test_events(num_events, seed=0):
+    """Events covering the full coszen range and energies beyond both ends of
+    the tables (to test extrapolation)"""
+    rand = np.random.RandomState(seed)
+    energies = np.power(10.0, rand.uniform(-1.3, 4.3, num_events))
+    coszens = rand.uniform(-1.0, 1.0, num_events)
+    coszens[:2] = [-1.0, 1.0]
+    azimuths = rand.uniform(0.0, 2 * np.pi, num_events)
+    return energies, coszens, azimuths
+
+
+def test_calculate_2d_flux_weights():
+    """Compare vectorized 2D flux evaluation against per-event splines"""
+    energies, coszens, _ = _random_test_events(500)
+    for flux_file in ["flux/honda-2015-spl-solmin-aa.d",
+                      "flux/bartol-2004-sno-solmax-aa.d"]:
+        spline_dict = load_2d_table(flux_file)
+        for prim in PRIMARIES:
+            ref = _reference_flux_weights(
+                energies, coszens, None, spline_dict[prim]
+            )
+            fast = calculate_2d_flux_weights(energies, coszens, spline_dict[prim])
+            assert np.allclose(fast, ref, rtol=1e-10, atol=0), flux_file
+
+            # precomputed coefficients and `out` (non-contiguous view)
+            out = np.zeros((len(energies), 2))
+            calculate_2d_flux_weights(
+                energies,
+                coszens,
+                make_2d_flux_coeffs(spline_dict[prim]),
+                out=out[:, 1],
+            )
+            assert np.array_equal(out[:, 1], fast)
+    logging.info("<< PASS : test_calculate_2d_flux_weights >>")
+
+
+def test_calculate_3d_flux_weights():
+    """Compare vectorized 3D flux evaluation against per-event splines"""
+    energies, coszens, azimuths = _random_test_events(100)
+    spline_dict = load_3d_table("flux/honda-2015-spl-solmin.d")
+    for az_linear in [True, False]:
+        ref = _reference_flux_weights(
+            energies, coszens, azimuths, spline_dict["numu"], az_linear=az_linear
+        )
+        fast = calculate_3d_flux_weights(
+            energies, coszens, azimuths, spline_dict["numu"], az_linear=az_linear
+        )
+        assert np.allclose(fast, ref, rtol=1e-10, atol=0), az_linear
+    logging.info("<< PASS : test_calculate_3d_flux_weights >>")
 
 
 def main():
@@ -17,7 +17,7 @@ from pisa.utils.resources import find_resource
 from pisa.utils.comparisons import recursiveEquality
 
 
-__all__ = ['HDF5_EXTS', 'from_hdf', 'to_hdf', 'test_hdf']
+__all__ = ['HDF5_EXTS', 'from_hdf', 'to_hdf', 'append_columns', 'test_hdf']
 
 __author__ = 'S. Boeser, J.L. Lanfranchi'
 
@@ -300,6 +300,71 @@ def to_hdf(data_dict, tgt, attrs=None, overwrite=True, warn=True):
         raise TypeError('to_hdf: Invalid `tgt` type: %s' % type(tgt))
 
 
+def append_columns(columns, tgt, attrs=None):
+    """Append rows to a table stored column-wise in an HDF5 file, i.e., as
+    one resizable (and compressed) dataset per column. The file and the
+    columns are created by the first call; the file is closed again after
+    every call, such that all rows written so far are preserved if a
+    long-running process (e.g. fitting pseudo-experiments) is interrupted.
+
+    The table can be read via `from_hdf`; column names containing "/" end up
+    in nested groups.
+
+    Parameters
+    ----------
+    columns : Mapping
+        Column name -> array of the values to append, where the first axis
+        runs over rows and has the same length for all columns. When
+        appending to an existing table, the same set of columns must be
+        given.
+
+    tgt : str
+        Filename
+
+    attrs : Mapping, optional
+        Attributes to set on the file (only when it is created)
+
+    Returns
+    -------
+    num_rows : int
+        Total number of rows in the table
+
+    """
+    columns = {name: np.asarray(vals) for name, vals in columns.items()}
+    lengths = set(len(vals) for vals in columns.values())
+    if len(lengths) != 1:
+        raise ValueError('All columns must have the same number of rows')
+    num_new = lengths.pop()
+
+    with h5py.File(tgt, 'a') as h5file:
+        existing = []
+        h5file.visititems(
+            lambda name, obj: existing.append(name)
+            if isinstance(obj, h5py.Dataset) else None
+        )
+        if not existing:
+            if attrs is not None:
+                h5file.attrs.update(attrs)
+            for name, vals in columns.items():
+                h5file.create_dataset(
+                    name, data=vals, maxshape=(None,) + vals.shape[1:],
+                    chunks=True, compression='gzip', shuffle=True
+                )
+            return num_new
+
+        if set(existing) != set(columns.keys()):
+            raise ValueError(
+                'Columns %s do not match the existing columns %s in "%s"'
+                % (sorted(columns.keys()), sorted(existing), tgt)
+            )
+        num_rows = h5file[existing[0]].shape[0]
+        for name, vals in columns.items():
+            dset = h5file[name]
+            dset.resize(num_rows + num_new, axis=0)
+            dset[num_rows:] = vals
+    return num_rows + num_new
+
+
 def test_hdf():
     """Unit tests for hdf module"""
     from shutil import rmtree
@@ -420,6 +485,31 @@ def test_hdf():
             assert tgt_type_checker(val), \
                     "key '%s': val '%s' is type '%s'" % \
                     (key, val, type(loaded_attrs[key]))
+
+        # column-wise table, appended to in chunks of rows
+        fpath = os.path.join(temp_dir, 'append_columns.hdf5')
+        ref = OrderedDict([
+            ('x', np.arange(10, dtype=np.int64)),
+            ('a/y', np.linspace(0, 1, 10)),
+            ('a/z', np.arange(20, dtype=np.float32).reshape(10, 2)),
+        ])
+        for start, stop in ((0, 4), (4, 5), (5, 10)):
+            num_rows = append_columns(
+                {name: vals[start:stop] for name, vals in ref.items()},
+                fpath, attrs={'seed': 1}
+            )
+            assert num_rows == stop
+        loaded = from_hdf(fpath)
+        assert loaded.attrs['seed'] == 1
+        assert np.array_equal(loaded['x'], ref['x'])
+        assert np.array_equal(loaded['a']['y'], ref['a/y'])
+        assert np.array_equal(loaded['a']['z'], ref['a/z'])
+        try:
+            append_columns({'x': ref['x']}, fpath)
+        except ValueError:
+            pass
+        else:
+            assert False
     finally:
         rmtree(temp_dir)
 
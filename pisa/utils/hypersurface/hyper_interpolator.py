@@ -26,9 +26,9 @@ __license__ = '''Copyright (c) 2014-2017, The IceCube Collaboration
 import os
 import collections
 import copy
+import itertools
 
 import numpy as np
-from scipy import interpolate
 from .hypersurface import Hypersurface, HypersurfaceParam, load_hypersurfaces
 from pisa import FTYPE, ureg
 from pisa.utils import matrix
@@ -50,10 +50,12 @@ class HypersurfaceInterpolator(object):
 
     After being initialized with a set of hypersurface fits produced at different
     parameters, it uses interpolation to produce a Hypersurface object
-    at a given point in parameter space using scipy's `RegularGridInterpolator`.
+    at a given point in parameter space.
 
-    The interpolation is piecewise-linear between points. All points must lie on a
-    rectilinear ND grid.
+    The interpolation is piecewise-linear between points (equivalent to scipy's
+    `RegularGridInterpolator`). All points must lie on a rectilinear ND grid.
+    Covariance matrices are checked (and fixed, if necessary) at the grid points
+    when the interpolator is initialized.
 
     Parameters
     ----------
@@ -76,14 +78,14 @@ class HypersurfaceInterpolator(object):
     Notes
     -----
     Be sure to give a support that covers the entire relevant parameter range and a
-    good distance beyond! To prevent minimization failure from NaNs, extrapolation
-    is used if hypersurfaces outside the support are requested but needless to say
-    these numbers are unreliable.
+    good distance beyond! To prevent minimization failure from NaNs, parameter
+    values outside the support are clipped to its boundaries, but needless to say
+    the resulting numbers are unreliable.
 
     See Also
     --------
     scipy.interpolate.RegularGridInterpolator :
-        class used for interpolation
+        reference for the interpolation method
     """
 
     def __init__(self, interpolation_param_spec, hs_fits, ignore_nan=True):
@@ -108,14 +110,10 @@ class HypersurfaceInterpolator(object):
         for param in self._reference_state['params'].values():
             param['fit_coeffts_sigma'] = np.full_like(
                 param['fit_coeffts_sigma'], np.nan)
-        # Instead of holding numbers, these coefficients and covariance matrices are
-        # interpolator objects the produce them at the requested point.
         # The shape of fit_coeffts is [binning ..., fit coeffts]
         self.coeff_shape = reference_hs.fit_coeffts.shape
-        self.coefficients = None
         # The shape of fit_cov_mat is [binning ..., fit coeffts, fit coeffts]
         self.covars_shape = reference_hs.fit_cov_mat.shape
-        self.covars = None
 
         # We now need to massage the fit coefficients into the correct shape
         # for interpolation.
@@ -154,23 +152,130 @@ class HypersurfaceInterpolator(object):
         for i, param_name in enumerate(self.interpolation_param_names):
             if self.interp_param_spec[param_name]["scales_log"]:
                 grid_coords[i] = np.log10(grid_coords[i])
-        self.coefficients = interpolate.RegularGridInterpolator(
-            grid_coords,
-            self._coeff_z,
-            # We disable extrapolation, but clip parameter values inside the valid
-            # range.
-            bounds_error=True, fill_value=None
-        )
-        self.covars = interpolate.RegularGridInterpolator(
-            grid_coords,
-            self._covar_z,
-            bounds_error=True, fill_value=None
-        )
+        for grid_vals in grid_coords:
+            assert np.all(np.diff(grid_vals) > 0), "grid points must be ascending"
+        self._grid_coords = grid_coords
         # In order not to spam warnings, we only want to warn about non positive
         # semi definite covariance matrices once for each bin. We store the bin
         # indeces for which the warning has already been issued.
         self.covar_bins_warning_issued = []
         self.ignore_nan = ignore_nan
+        self._validate_covars()
+
+        # The interpolated hypersurface is held by a single object, into whose
+        # (preallocated) arrays the interpolated coefficients and covariance
+        # matrices are written.
+        self._hypersurface = Hypersurface.from_state(
+            copy.deepcopy(self._reference_state)
+        )
+        self._hypersurface.fit_cov_mat = np.full(self.covars_shape, np.nan)
+        self._coeffts = np.full(self.coeff_shape, np.nan)
+        # default values for coefficients that are not finite: intercept 1, slopes 0
+        self._default_coeffts = np.zeros(self.coeff_shape)
+        self._default_coeffts[..., 0] = 1.
+        # interpolation coordinates at which coefficients and covariance matrices
+        # were last evaluated
+        self._coeffts_x = None
+        self._covars_x = None
+
+    def _validate_covars(self):
+        """Check the covariance matrices at all interpolation grid points for
+        symmetry and positive semi-definiteness, and fix them where necessary.
+
+        The interpolation is a convex combination of the matrices at the grid
+        points, so that all interpolated matrices are then valid as well and don't
+        have to be checked again.
+        """
+        bins_shape = self.covars_shape[:-2]
+        for idx in np.ndindex(self.interp_shape):
+            for bin_idx in np.ndindex(bins_shape):
+                m = self._covar_z[idx + bin_idx]
+                if not np.all(np.isfinite(m)):
+                    assert self.ignore_nan, ("invalid cov matrix element "
+                        f"encountered at grid point {idx} in bin {bin_idx}")
+                    # is replaced by the identity after interpolation
+                    continue
+                assert np.allclose(m, m.T, rtol=ALLCLOSE_KW['rtol']*10.), (
+                    f'cov matrix not symmetric in bin {bin_idx}')
+                if not matrix.is_psd(m):
+                    self._covar_z[idx + bin_idx] = matrix.fronebius_nearest_psd(m)
+                    if not bin_idx in self.covar_bins_warning_issued:
+                        logging.warn(
+                            f'Invalid covariance matrix fixed in bin: {bin_idx}')
+                        self.covar_bins_warning_issued.append(bin_idx)
+
+    def _get_interp_coords(self, param_kw):
+        """Convert parameter values into (clipped and, where needed,
+        log-scaled) coordinates in the interpolation grid."""
+        assert set(param_kw.keys()) == set(self.interp_param_spec.keys()), "invalid parameters"
+        # getting param magnitudes in the same units as the parameter specification
+        x = np.array([
+            param_kw[p].m_as(self.interp_param_spec[p]["values"][0].u)
+            # we have checked that this is an OrderedDict so that the order of x is not
+            # ambiguous here
+            for p in self.interp_param_spec.keys()
+        ])
+        assert len(x) == len(self.param_bounds)
+        for i, bounds in enumerate(self.param_bounds):
+            x[i] = np.clip(x[i], *bounds)
+        # if a parameter scales as log, we have to take the log here again
+        for i, param_name in enumerate(self.interpolation_param_names):
+            if self.interp_param_spec[param_name]["scales_log"]:
+                # We must be strict with raising errors here, because otherwise
+                # the Hypersurface will suddenly have NaNs everywhere! This shouldn't
+                # happen because we clip values into the valid parameter range.
+                if x[i] <= 0:
+                    raise RuntimeError("A log-scaling parameter cannot become zero "
+                                       "or negative!")
+                x[i] = np.log10(x[i])
+        return x
+
+    def _interpolate(self, x, values, out):
+        """Multi-linear interpolation of `values` (with the interpolation grid in
+        the leading dimensions) at the point `x`, written into `out`."""
+        corners = []
+        for grid_vals, xi in zip(self._grid_coords, x):
+            if len(grid_vals) == 1:
+                corners.append(((0, 1.),))
+                continue
+            i = np.clip(np.searchsorted(grid_vals, xi, side="right") - 1,
+                        0, len(grid_vals) - 2)
+            t = (xi - grid_vals[i]) / (grid_vals[i + 1] - grid_vals[i])
+            corners.append(((i, 1. - t), (i + 1, t)))
+        out.fill(0.)
+        for corner in itertools.product(*corners):
+            idx = tuple(c[0] for c in corner)
+            weight = np.prod([c[1] for c in corner])
+            # zero weights are not skipped such that NaNs propagate like they do
+            # in scipy's `RegularGridInterpolator`
+            out += weight * values[idx]
+        return out
+
+    def _update_hypersurface(self, param_kw, covars=True):
+        """Write coefficients (and optionally covariance matrices) interpolated
+        at the given parameters into the arrays of the internal hypersurface."""
+        x = self._get_interp_coords(param_kw)
+        hypersurface = self._hypersurface
+        if self._coeffts_x is None or not np.array_equal(x, self._coeffts_x):
+            coeffts = self._interpolate(x, self._coeff_z, self._coeffts)
+            # check that coefficients exist and if not replace with default values
+            invalid = ~np.isfinite(coeffts)
+            if np.any(invalid):
+                assert self.ignore_nan, ("invalid coeff encountered at "
+                    f"{param_kw} in loc {np.argwhere(invalid)[0]}")
+                np.copyto(coeffts, self._default_coeffts, where=invalid)
+            # the setter method defined in the Hypersurface class takes care of
+            # putting the coefficients in the right place in their respective params
+            hypersurface.fit_coeffts = coeffts
+            self._coeffts_x = x
+        if covars and (self._covars_x is None
+                       or not np.array_equal(x, self._covars_x)):
+            cov = self._interpolate(x, self._covar_z, hypersurface.fit_cov_mat)
+            # matrices that were invalid at any grid point are replaced by the identity
+            invalid = ~np.all(np.isfinite(cov), axis=(-2, -1))
+            cov[invalid] = np.identity(self.covars_shape[-1])
+            self._covars_x = x
+        return hypersurface
 
     @property
     def interpolation_param_names(self):
@@ -203,66 +308,34 @@ class HypersurfaceInterpolator(object):
             which the hypersurfaces are interpolated. The values
             are given as :obj:`Quantity` objects with units.
         """
-        assert set(param_kw.keys()) == set(self.interp_param_spec.keys()), "invalid parameters"
-        # getting param magnitudes in the same units as the parameter specification
-        x = np.array([
-            param_kw[p].m_as(self.interp_param_spec[p]["values"][0].u)
-            # we have checked that this is an OrderedDict so that the order of x is not
-            # ambiguous here
-            for p in self.interp_param_spec.keys()
-        ])
-        assert len(x) == len(self.param_bounds)
-        for i, bounds in enumerate(self.param_bounds):
-            x[i] = np.clip(x[i], *bounds)
-        # if a parameter scales as log, we have to take the log here again
-        for i, param_name in enumerate(self.interpolation_param_names):
-            if self.interp_param_spec[param_name]["scales_log"]:
-                # We must be strict with raising errors here, because otherwise
-                # the Hypersurface will suddenly have NaNs everywhere! This shouldn't
-                # happen because we clip values into the valid parameter range.
-                if x[i] <= 0:
-                    raise RuntimeError("A log-scaling parameter cannot become zero "
-                                       "or negative!")
-                x[i] = np.log10(x[i])
+        return copy.deepcopy(self._update_hypersurface(param_kw))
 
-        state = copy.deepcopy(self._reference_state)
-        # fit covariance matrices are stored directly in the state while fit coeffts
-        # must be assigned with the setter method...
-        # need squeeze here because the RegularGridInterpolator always puts another
-        # dimension around the output
-        state["fit_cov_mat"] = np.squeeze(self.covars(x))
-        assert state["fit_cov_mat"].shape == self.covars_shape
-        for idx in np.ndindex(state['fit_cov_mat'].shape):
-            if self.ignore_nan: continue
-            assert np.isfinite(state['fit_cov_mat'][idx]), ("invalid cov matrix "
-                f"element encountered at {param_kw} in loc {idx}")
-        # check covariance matrices for symmetry, positive semi-definiteness
-        for bin_idx in np.ndindex(state['fit_cov_mat'].shape[:-2]):
-            m = state['fit_cov_mat'][bin_idx]
-            if self.ignore_nan and np.any(~np.isfinite(m)):
-                state['fit_cov_mat'][bin_idx] = np.identity(m.shape[0])
-                m = state['fit_cov_mat'][bin_idx]
-            assert np.allclose(
-                m, m.T, rtol=ALLCLOSE_KW['rtol']*10.), f'cov matrix not symmetric in bin {bin_idx}'
-            if not matrix.is_psd(m):
-                state['fit_cov_mat'][bin_idx] = matrix.fronebius_nearest_psd(m)
-                if not bin_idx in self.covar_bins_warning_issued:
-                    logging.warn(
-                        f'Invalid covariance matrix fixed in bin: {bin_idx}')
-                    self.covar_bins_warning_issued.append(bin_idx)
-        hypersurface = Hypersurface.from_state(state)
-        coeffts = np.squeeze(self.coefficients(x))  # calls interpolator
-        assert coeffts.shape == self.coeff_shape
-        # check that coefficients exist and if not replace with default values
-        for idx in np.ndindex(self.coeff_shape):
-            if self.ignore_nan and ~np.isfinite(coeffts[idx]):
-                coeffts[idx] = 1 if idx[-1] == 0 else 0  # set intercept to 1, slopes 0
-            assert np.isfinite(coeffts[idx]), ("invalid coeff encountered at "
-                f"{param_kw} in loc {idx}")
-        # the setter method defined in the Hypersurface class takes care of
-        # putting the coefficients in the right place in their respective parameters
-        hypersurface.fit_coeffts = coeffts
-        return hypersurface
+    def evaluate(self, interp_param_values, param_values, return_uncertainty=False):
+        """
+        Evaluate the hypersurface interpolated at `interp_param_values`.
+
+        This is equivalent to, but much faster than,
+        ``get_hypersurface(**interp_param_values).evaluate(param_values)``, because
+        the coefficients are interpolated into preallocated arrays (and only if
+        the interpolation parameters have changed since the last call) instead of
+        producing a new Hypersurface object every time.
+
+        Parameters
+        ----------
+        interp_param_values : dict
+            Values of the parameters over which the hypersurfaces are interpolated,
+            given as :obj:`Quantity` objects with units.
+
+        param_values : dict
+            Values of the systematic parameters, see `Hypersurface.evaluate`.
+
+        return_uncertainty : bool, optional
+            return the uncertainty on the output (default: False)
+        """
+        hypersurface = self._update_hypersurface(
+            interp_param_values, covars=return_uncertainty
+        )
+        return hypersurface.evaluate(param_values, return_uncertainty=return_uncertainty)
 
     def _make_slices(self, *xi):
         """Make slices of hypersurfaces for plotting.
@@ -1037,3 +1110,81 @@ def load_interpolated_hypersurfaces(input_file, expected_binning=None):
         output[m] = HypersurfaceInterpolator(input_data['interpolation_param_spec'], hs_fits)
 
     return output
+
+
+def test_hypersurface_interpolator():
+    '''
+    Test that the interpolated hypersurface agrees with scipy's
+    `RegularGridInterpolator` and that the fast evaluation path gives the same
+    result as evaluating a generated hypersurface
+    '''
+    from scipy.interpolate import RegularGridInterpolator
+    from pisa.core.binning import OneDimBinning
+
+    random_state = np.random.RandomState(0)
+    binning = MultiDimBinning([OneDimBinning(name="reco_energy", domain=[1., 10.],
+                                             num_bins=5, units=ureg.GeV, is_lin=True)])
+    interp_param_spec = collections.OrderedDict()
+    interp_param_spec["deltam31"] = {
+        "values": [v * ureg["eV^2"] for v in [1e-3, 2e-3, 4e-3]], "scales_log": False
+    }
+    interp_param_spec["theta23"] = {
+        "values": [v * ureg.deg for v in [35., 45., 55.]], "scales_log": True
+    }
+    hs_fits = []
+    for idx in np.ndindex(3, 3):
+        params = [HypersurfaceParam(name="foo", func_name="linear",
+                                    initial_fit_coeffts=[1.]),
+                  HypersurfaceParam(name="bar", func_name="quadratic",
+                                    initial_fit_coeffts=[.1, .1])]
+        hypersurface = Hypersurface(params=params, initial_intercept=1.)
+        hypersurface._init(binning=binning,
+                           nominal_param_values={"foo": 0., "bar": 10.})
+        coeffts = 1. + 0.1 * random_state.randn(*hypersurface.fit_coeffts.shape)
+        a = 0.01 * random_state.randn(*(binning.shape + (4, 4)))
+        cov = a @ np.swapaxes(a, -1, -2) + 1e-4 * np.identity(4)
+        # one empty bin at one grid point
+        coeffts[0, 1] = np.nan
+        cov[0] = np.nan
+        hypersurface.fit_coeffts = coeffts
+        hypersurface.fit_cov_mat = cov
+        hs_fits.append({
+            "param_values": dict((n, v["values"][idx[i]]) for i, (n, v)
+                                 in enumerate(interp_param_spec.items())),
+            "hs_fit": hypersurface,
+        })
+    interpolator = HypersurfaceInterpolator(interp_param_spec, hs_fits)
+
+    grid_coords = [np.array([1e-3, 2e-3, 4e-3]), np.log10([35., 45., 55.])]
+    ref_coeffts = RegularGridInterpolator(grid_coords, interpolator._coeff_z)
+    ref_covars = RegularGridInterpolator(grid_coords, interpolator._covar_z)
+
+    param_values = {"foo": 0.3, "bar": 11.}
+    for dm31, th23 in [(1.5e-3, 40.), (3e-3, 52.), (2e-3, 45.), (8e-3, 20.)]:
+        interp_params = {"deltam31": dm31 * ureg["eV^2"], "theta23": th23 * ureg.deg}
+        x = [np.clip(dm31, 1e-3, 4e-3), np.log10(np.clip(th23, 35., 55.))]
+        hypersurface = interpolator.get_hypersurface(**interp_params)
+        coeffts = ref_coeffts(x)[0]
+        # missing coefficient (NaN at any grid point involved) gets default value
+        coeffts[0, 1] = 0.
+        assert np.allclose(hypersurface.fit_coeffts, coeffts, rtol=1e-12)
+        covars = ref_covars(x)[0]
+        covars[0] = np.identity(4)
+        assert np.allclose(hypersurface.fit_cov_mat, covars, rtol=1e-12)
+
+        scales, uncertainties = hypersurface.evaluate(
+            param_values, return_uncertainty=True
+        )
+        fast_scales, fast_uncertainties = interpolator.evaluate(
+            interp_params, param_values, return_uncertainty=True
+        )
+        assert np.array_equal(scales, fast_scales)
+        assert np.array_equal(uncertainties, fast_uncertainties)
+        assert np.array_equal(scales, interpolator.evaluate(interp_params, param_values))
+
+    logging.info('<< PASS : test_hypersurface_interpolator >>')
+
+
+if __name__ == "__main__":
+    set_verbosity(2)
+    test_hypersurface_interpolator()
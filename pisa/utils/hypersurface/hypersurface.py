@@ -45,6 +45,7 @@ from pisa.core.param import Param, ParamSet
 from pisa.utils.resources import find_resource
 from pisa.utils.fileio import mkdir
 from pisa.utils.log import logging, set_verbosity
+from pisa.utils.parallel import map_in_process_pool
 from pisa.utils.comparisons import ALLCLOSE_KW
 from uncertainties import ufloat, correlated_values
 from uncertainties import unumpy as unp
@@ -474,7 +475,8 @@ class Hypersurface(object):
     def fit(self, nominal_map, nominal_param_values, sys_maps, sys_param_values,
             norm=True, method="L-BFGS-B", fix_intercept=False, intercept_bounds=None,
             intercept_sigma=None, include_empty=False, keep_maps=True, ref_bin_idx=None,
-            smooth_method=None, smooth_kw=None):
+            smooth_method=None, smooth_kw=None, linear_least_squares=True,
+            num_workers=None):
         '''
         Fit the hypersurface coefficients (in every bin) to best match the provided
         nominal and systematic datasets.
@@ -525,6 +527,17 @@ class Hypersurface(object):
 
         ref_bin_idx : tuple
             An index specifying a reference bin that will be used for logging
+
+        linear_least_squares : bool
+            If the hypersurface is linear in its coefficients (only linear and
+            quadratic functional forms, not in log mode), solve the weighted least
+            squares problem of all bins at once instead of running a numerical fit
+            per bin. Bins for which the solution is ill-defined or violates the fit
+            bounds are still fit numerically. Default: True
+
+        num_workers : int, optional
+            Number of worker processes to distribute the numerical per-bin fits
+            over. Default is None (fit all bins in the current process).
         '''
 
         #
@@ -690,10 +703,97 @@ class Hypersurface(object):
                           >= 0.), "Found negative bin counts"
 
         #
-        # Loop over bins
+        # Fit settings common to all bins
         #
 
-        for bin_idx in np.ndindex(self.binning.shape):  # TODO grab from input map
+        inv_param_sigma = []
+        if intercept_sigma is not None:
+            inv_param_sigma.append(1./intercept_sigma)
+        else:
+            inv_param_sigma.append(0.)
+        for param in list(self.params.values()):
+            if param.coeff_prior_sigma is not None:
+                for j in range(param.num_fit_coeffts):
+                    inv_param_sigma.append(
+                        1./param.coeff_prior_sigma[j])
+            else:
+                for j in range(param.num_fit_coeffts):
+                    inv_param_sigma.append(0.)
+        inv_param_sigma = np.array(inv_param_sigma)
+        assert np.all(np.isfinite(
+            inv_param_sigma)), "invalid values found in prior sigma. They must not be zero."
+        # The intercept is not a fit parameter if it is fixed
+        if fix_intercept:
+            inv_param_sigma = inv_param_sigma[1:]
+
+        # coefficient names to pass to Minuit. Not strictly necessary
+        coeff_names = [] if fix_intercept else ['intercept']
+        for name, param in self.params.items():
+            for j in range(param.num_fit_coeffts):
+                coeff_names.append(name + '_p{:d}'.format(j))
+
+        # Define fit bounds for `minimize`. Bounds are pairs of (min, max)
+        # values for each parameter in the fit. Use 'None' in place of min/max
+        # if there is
+        # no bound in that direction.
+        fit_bounds = []
+        if fix_intercept:
+            logging.debug("fixed intercept needs no bounds")
+        elif intercept_bounds is None:
+            fit_bounds.append(tuple([None, None]))
+        else:
+            assert (len(intercept_bounds) == 2) and (
+                np.ndim(intercept_bounds) == 1), "intercept bounds must be given as 2-tuple"
+            fit_bounds.append(intercept_bounds)
+
+        for param in self.params.values():
+            if param.bounds is None:
+                fit_bounds.extend(
+                    ((None, None),)*param.num_fit_coeffts)
+            else:
+                if np.ndim(param.bounds) == 1:
+                    assert len(
+                        param.bounds) == 2, "bounds on single coefficients must be given as 2-tuples"
+                    fit_bounds.append(param.bounds)
+                elif np.ndim(param.bounds) == 2:
+                    assert np.all([len(t) == 2 for t in param.bounds]
+                                  ), "bounds must be given as a tuple of 2-tuples"
+                    fit_bounds.extend(param.bounds)
+
+        # The bins to fit
+        bin_indices = list(np.ndindex(self.binning.shape))  # TODO grab from input map
+
+        # If no reference bin index was specified, used the first unmasked bin
+        if ref_bin_idx is None:
+            for bin_idx in bin_indices:
+                if (self.binning.mask is None) or self.binning.mask[bin_idx]:
+                    ref_bin_idx = bin_idx
+                    break
+
+        #
+        # Solve linear least squares problems for all bins at once
+        #
+
+        fit_results = {}
+
+        is_linear = (not self.log) and all(
+            param.func_name in ("linear", "quadratic") for param in self.params.values()
+        )
+        if linear_least_squares and is_linear:
+            fit_results.update(self._fit_linear_least_squares(
+                x=x, fix_intercept=fix_intercept, include_empty=include_empty,
+                inv_param_sigma=inv_param_sigma, fit_bounds=fit_bounds,
+            ))
+            logging.debug(
+                "Solved %i of %i bins as linear least squares problems",
+                len(fit_results), len(bin_indices)
+            )
+
+        #
+        # Fit the remaining bins numerically
+        #
+
+        def fit_bin(bin_idx):
 
             # Check if this bin is masked
             if (self.binning.mask is not None) and (self.binning.mask[bin_idx] == False) :
@@ -818,29 +918,6 @@ class Hypersurface(object):
 
                         return self.evaluate(params_unflattened, bin_idx=bin_idx)
 
-                    inv_param_sigma = []
-                    if intercept_sigma is not None:
-                        inv_param_sigma.append(1./intercept_sigma)
-                    else:
-                        inv_param_sigma.append(0.)
-                    for param in list(self.params.values()):
-                        if param.coeff_prior_sigma is not None:
-                            for j in range(param.num_fit_coeffts):
-                                inv_param_sigma.append(
-                                    1./param.coeff_prior_sigma[j])
-                        else:
-                            for j in range(param.num_fit_coeffts):
-                                inv_param_sigma.append(0.)
-                    inv_param_sigma = np.array(inv_param_sigma)
-                    assert np.all(np.isfinite(
-                        inv_param_sigma)), "invalid values found in prior sigma. They must not be zero."
-
-                    # coefficient names to pass to Minuit. Not strictly necessary
-                    coeff_names = [] if fix_intercept else ['intercept']
-                    for name, param in self.params.items():
-                        for j in range(param.num_fit_coeffts):
-                            coeff_names.append(name + '_p{:d}'.format(j))
-
                     def loss(p):
                         '''
                         Loss to be minimized during the fit.
@@ -848,43 +925,11 @@ class Hypersurface(object):
                         fvals = callback(x_to_use, *p)
                         return np.sum(((fvals - y_to_use)/y_sigma_to_use)**2) + np.sum((inv_param_sigma*p)**2)
 
-                    # Define fit bounds for `minimize`. Bounds are pairs of (min, max)
-                    # values for each parameter in the fit. Use 'None' in place of min/max
-                    # if there is
-                    # no bound in that direction.
-                    fit_bounds = []
-                    if fix_intercept:
-                        logging.debug("fixed intercept needs no bounds")
-                    elif intercept_bounds is None:
-                        fit_bounds.append(tuple([None, None]))
-                    else:
-                        assert (len(intercept_bounds) == 2) and (
-                            np.ndim(intercept_bounds) == 1), "intercept bounds must be given as 2-tuple"
-                        fit_bounds.append(intercept_bounds)
-                    
-                    for param in self.params.values():
-                        if param.bounds is None:
-                            fit_bounds.extend(
-                                ((None, None),)*param.num_fit_coeffts)
-                        else:
-                            if np.ndim(param.bounds) == 1:
-                                assert len(
-                                    param.bounds) == 2, "bounds on single coefficients must be given as 2-tuples"
-                                fit_bounds.append(param.bounds)
-                            elif np.ndim(param.bounds) == 2:
-                                assert np.all([len(t) == 2 for t in param.bounds]
-                                              ), "bounds must be given as a tuple of 2-tuples"
-                                fit_bounds.extend(param.bounds)
-
                     # Define the EPS (step length) used by the fitter Need to take care with
                     # floating type precision, don't want to go smaller than the FTYPE being
                     # used by PISA can handle
                     eps = np.finfo(FTYPE).eps
 
-                    # If no reference bin index was specified, used the first bin index to be fitted
-                    if ref_bin_idx is None :
-                        ref_bin_idx = bin_idx
-
                     # Debug logging
                     if bin_idx == ref_bin_idx:
                         msg = ">>>>>>>>>>>>>>>>>>>>>>>\n"
@@ -924,6 +969,24 @@ class Hypersurface(object):
                         logging.debug(m.fmin)
                         logging.debug(m.params)
                         logging.debug(m.covariance)
+
+            return popt, pcov
+
+        remaining_bin_indices = [
+            bin_idx for bin_idx in bin_indices if bin_idx not in fit_results
+        ]
+        bin_fits = map_in_process_pool(
+            task=lambda i: fit_bin(remaining_bin_indices[i]),
+            num_tasks=len(remaining_bin_indices),
+            num_workers=num_workers,
+        )
+        for bin_idx, result in zip(remaining_bin_indices, bin_fits):
+            fit_results[bin_idx] = result
+
+        for bin_idx in bin_indices:
+
+            popt, pcov = fit_results[bin_idx]
+
             #
             # Re-format fit results
             #
@@ -1001,6 +1064,105 @@ class Hypersurface(object):
         # Record some provenance info about the fits
         self.fit_complete = True
 
+    def _fit_linear_least_squares(self, x, fix_intercept, include_empty,
+                                  inv_param_sigma, fit_bounds):
+        '''
+        Fit all bins at once, for a hypersurface that is linear in its coefficients.
+
+        In this case the loss minimized by the numerical per-bin fit is a quadratic
+        form in the coefficients, and its minimum and covariance follow from the
+        (regularised) normal equations of a weighted least squares problem. These are
+        set up and solved for all bins simultaneously.
+
+        Returns a dict mapping bin indices to `(popt, pcov)`, with the same format as
+        the results of the numerical fit. Masked bins, bins where the system is
+        ill-conditioned and bins where the solution is outside the fit bounds are
+        not included, and need to be fit numerically.
+
+        Internal function, not to be called by a user.
+        '''
+
+        # Must have at least as many sets as free params in fit
+        num_coeffts = self.num_fit_coeffts - int(fix_intercept)
+        assert self.num_fit_sets >= num_coeffts, "Number of datasets used for fitting (%i) must be >= num free params (%i)" % (
+            self.num_fit_sets, num_coeffts)
+
+        # Can only handle one (min, max) pair per coefficient
+        if len(fit_bounds) != num_coeffts:
+            return {}
+        lower_bounds = np.array([-np.inf if b[0] is None else b[0] for b in fit_bounds])
+        upper_bounds = np.array([np.inf if b[1] is None else b[1] for b in fit_bounds])
+
+        # Design matrix, common to all bins : [ [dataset 0 terms], [dataset 1 terms], ... ]
+        # The column order must match the coefficient order of the numerical fit
+        design = [] if fix_intercept else [np.ones(self.num_fit_sets)]
+        for param, param_x in zip(self.params.values(), x):
+            dx = param_x if self.using_legacy_data else param_x - param.nominal_value
+            design.append(dx)
+            if param.func_name == "quadratic":
+                design.append(dx**2)
+        design = np.stack(design, axis=-1).astype(np.float64)
+
+        # Bin values and uncertainties, shape : [ flat bin index, dataset ]
+        y = np.stack([m.nominal_values.ravel() for m in self.fit_maps], axis=-1).astype(np.float64)
+        y_sigma = np.stack([m.std_devs.ravel() for m in self.fit_maps], axis=-1).astype(np.float64)
+        if fix_intercept:
+            y = y - self.initial_intercept
+
+        # Treat empty bins the same way as the numerical fit
+        bad_sigma_mask = y_sigma == 0.
+        if include_empty:
+            y_sigma[bad_sigma_mask] = 1.
+            point_mask = np.ones_like(bad_sigma_mask)
+        else:
+            point_mask = ~bad_sigma_mask
+
+        # Bins with NaNs/Infs cannot be fit, bins with invalid sigmas are left to the
+        # numerical fit
+        nan_bins = np.any(point_mask & ~np.isfinite(y), axis=-1)
+        valid_bins = ~nan_bins & ~np.any(point_mask & ~np.isfinite(y_sigma), axis=-1)
+        if self.binning.mask is not None:
+            valid_bins &= self.binning.mask.ravel()
+            nan_bins &= self.binning.mask.ravel()
+
+        # Weights are the inverse variances, with unused points getting zero weight
+        point_mask &= valid_bins[:, np.newaxis]
+        weights = np.zeros_like(y)
+        weights[point_mask] = 1. / y_sigma[point_mask]**2
+        y = np.where(point_mask, y, 0.)
+
+        # Normal equations, including the coefficient priors
+        lhs = np.einsum("sk,bs,sl->bkl", design, weights, design) + np.diag(inv_param_sigma**2)
+        rhs = np.einsum("sk,bs->bk", design, weights * y)
+
+        # Rescale to unit diagonal before checking the condition number, since the
+        # coefficients can differ by orders of magnitude
+        diag = np.sqrt(np.einsum("bkk->bk", lhs))
+        valid_bins &= np.all(diag > 0., axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scaled_lhs = lhs / (diag[:, :, np.newaxis] * diag[:, np.newaxis, :])
+        scaled_lhs[~valid_bins] = np.eye(num_coeffts)
+        valid_bins &= np.linalg.cond(scaled_lhs) < 1. / np.sqrt(np.finfo(np.float64).eps)
+
+        # Solve, the covariance matrix is the inverse of the (half) Hessian of the loss
+        pcov = np.linalg.inv(scaled_lhs[valid_bins])
+        pcov /= diag[valid_bins][:, :, np.newaxis] * diag[valid_bins][:, np.newaxis, :]
+        popt = np.einsum("bkl,bl->bk", pcov, rhs[valid_bins])
+
+        # Leave solutions outside of the bounds to the numerical fit
+        in_bounds = np.all((popt >= lower_bounds) & (popt <= upper_bounds), axis=-1)
+
+        bin_indices = list(np.ndindex(self.binning.shape))
+        fit_results = {}
+        for i_bin in np.flatnonzero(nan_bins):
+            fit_results[bin_indices[i_bin]] = (np.full(num_coeffts, np.NaN), np.NaN)
+        for i_bin, bin_popt, bin_pcov in zip(
+            np.flatnonzero(valid_bins)[in_bounds], popt[in_bounds], pcov[in_bounds]
+        ):
+            fit_results[bin_indices[i_bin]] = (bin_popt, bin_pcov)
+
+        return fit_results
+
     @property
     def nominal_values(self):
         '''
@@ -2507,8 +2669,78 @@ def test_hypersurface_basics():
     logging.info('<< PASS : test_hypersurface_basics >>')
 
 
+def test_hypersurface_linear_least_squares():
+    '''
+    Check that solving the fits of a hypersurface that is linear in its coefficients
+    as (batched) weighted least squares problems yields the same results as the
+    numerical per-bin fits
+    '''
+
+    binning = MultiDimBinning([OneDimBinning(name="reco_energy",
+                                             domain=[0., 10.],
+                                             num_bins=3,
+                                             units=ureg.GeV,
+                                             is_lin=True
+                                             ),
+                               OneDimBinning(name="reco_coszen",
+                                             domain=[-1., 1.],
+                                             num_bins=4,
+                                             is_lin=True
+                                             )])
+    params = [
+        HypersurfaceParam(name="foo", func_name="linear"),
+        HypersurfaceParam(name="bar", func_name="quadratic"),
+    ]
+    true_coeffs = {'foo': [0.1], 'bar': [-0.2, 0.3]}
+    nominal_param_values = {'foo': 1., 'bar': 0.}
+    sys_param_values = [{'foo': f, 'bar': b} for f in np.linspace(-1., 3., 4)
+                        for b in np.linspace(-0.5, 0.5, 4)]
+    nom_map, sys_maps = generate_asimov_testdata(binning,
+                                                 params,
+                                                 true_coeffs,
+                                                 nominal_param_values,
+                                                 sys_param_values,
+                                                 intercept=10.,
+                                                 error_scale=0.1,
+                                                 )
+
+    # Fluctuate the data such that the fits are not trivial, and add an empty bin
+    random_state = np.random.RandomState(0)
+    maps = []
+    for m in [nom_map] + sys_maps:
+        hist = m.nominal_values * (1. + 0.05*random_state.normal(size=m.shape))
+        hist[0, 0] = 0.
+        maps.append(Map(name=m.name, hist=hist, error_hist=0.1*np.sqrt(hist),
+                        binning=binning))
+
+    fitted_hypersurfaces = []
+    for linear_least_squares in [True, False]:
+        hypersurface = Hypersurface(params=copy.deepcopy(params))
+        hypersurface.fit(
+            nominal_map=maps[0],
+            nominal_param_values=nominal_param_values,
+            sys_maps=maps[1:],
+            sys_param_values=sys_param_values,
+            linear_least_squares=linear_least_squares,
+        )
+        fitted_hypersurfaces.append(hypersurface)
+    lsq_hypersurface, minuit_hypersurface = fitted_hypersurfaces
+
+    # The least squares solution is the exact minimum
+    assert np.array_equal(np.isfinite(lsq_hypersurface.fit_coeffts),
+                          np.isfinite(minuit_hypersurface.fit_coeffts))
+    assert np.all(np.nansum(lsq_hypersurface.fit_chi2, axis=-1)
+                  <= np.nansum(minuit_hypersurface.fit_chi2, axis=-1) + 1e-8)
+    assert np.allclose(lsq_hypersurface.fit_coeffts, minuit_hypersurface.fit_coeffts,
+                       rtol=1e-2, atol=1e-3, equal_nan=True)
+    assert np.allclose(lsq_hypersurface.fit_cov_mat, minuit_hypersurface.fit_cov_mat,
+                       rtol=1e-2, equal_nan=True)
+    logging.info('<< PASS : test_hypersurface_linear_least_squares >>')
+
+
 # Run the examp'es/tests
 if __name__ == "__main__":
     set_verbosity(2)
     test_hypersurface_basics()
     test_hypersurface_uncertainty()
+    test_hypersurface_linear_least_squares()
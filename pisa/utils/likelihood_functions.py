@@ -13,7 +13,6 @@ from __future__ import print_function
 
 import numpy as np
 from scipy import special
-from scipy import optimize
 
 __author__ = "Ahnaf Tahmid"
 __email__ = "tahmid@ualberta.ca"
@@ -108,29 +107,17 @@ def barlowLLH(data, unweighted_mc, weights):
         # The loggamma() terms takes care of the log(value!) for non-integer values
         return -1.*(k*np.log(f) - f + a*np.log(A_) - A_ - special.loggamma(k+1) - special.loggamma(a+1))
 
-    A = np.array(unweighted_mc) # Expected unweighted counts in a bin
-    # For each bin the appropriate 'A' will now be found using the current counts as a seed
-    # This will be done by using a minimiser to ensure that the value of 'A' found minimises the -LLH
-
-    # Find values of A such that llh in each bin is a maximum
-    for i, val in enumerate(A):
-        # If the unweighted MC counts in the bin is 0, A = 0
-        if val == 0:
-            continue
-        # Otherwise, find the value of A
-        arg = (data[i], weights[i], unweighted_mc[i])
-        # Powell works fast and is fine for our purposes
-        result = optimize.minimize(fun=llh, x0=val, args=arg, method='Powell')
-
-        # Check that the minimisation ran properly
-        if result.success:
-            A[i] = result.x
-        else:
-            print("Something went wrong...")
-            print("Minimiser message: ")
-            print("------------------")
-            print(result.message)
-            return -np.inf
+    A = np.array(unweighted_mc, dtype=float) # Expected unweighted counts in a bin
+    # For each bin, the 'A' that maximises the LLH is where its derivative
+    # (k + a)/A - (w + 1) vanishes, which can be solved for directly
+    # (if the unweighted MC counts in the bin is 0, A = 0)
+    nonzero = A != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        A_best = (np.asarray(data) + A) / (1. + np.asarray(weights))
+    if not np.all(np.isfinite(A_best[nonzero])):
+        # No best fit for invalid (e.g. nan or infinite) inputs
+        return -np.inf
+    A[nonzero] = A_best[nonzero]
 
     LLH = llh(A, data, weights, unweighted_mc)
 
@@ -2,10 +2,16 @@
 
 """
 EMCEE-callable cleints for making parallel llh requests to a set of
-`simpler_server`s; each client passes free param values to an available server,
+`llh_server`s; each client passes free param values to an available server,
 server sets these on its DistributionMaker, generates outputs, compares the
 resulting distributions against a reference template, and returns the llh value.
 
+A `ClientPool` keeps persistent connections to all servers and distributes a
+batch of free param values (e.g. the positions of all walkers of an ensemble
+sampler) among them, such that the servers process their share concurrently.
+Since a server serves one connected client at a time, the pool should only be
+connected while it is needed (e.g. for the duration of `run_mcmc`).
+
 `Cleint` code borrowed from Dan Krause
   https://gist.github.com/dankrause/9607475
 see `__license__`.
@@ -32,15 +38,11 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License."""
 
-__all__ = ["Client", "get_llh", "setup_sampler", "main"]
+__all__ = ["Client", "ClientPool", "get_llh", "setup_sampler", "main"]
 
 
 from argparse import ArgumentParser
-from collections.abc import Mapping
-from itertools import cycle
-from multiprocessing import Manager
 import socket
-import time
 
 import emcee
 import numpy as np
@@ -51,18 +53,25 @@ from pisa.utils.llh_server import send_obj, receive_obj
 class Client(object):
     def __init__(self, server_address):
         self.addr = server_address
+        self.sock = None
+
+    def connect(self):
+        # a new socket per connection, such that a client can be re-connected
         if isinstance(self.addr, str):
             address_family = socket.AF_UNIX
         else:
             address_family = socket.AF_INET
         self.sock = socket.socket(address_family, socket.SOCK_STREAM)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-    def connect(self):
+        if address_family == socket.AF_INET:
+            # requests are small, so don't wait to fill up packets
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.sock.connect(self.addr)
 
     def close(self):
-        self.sock.close()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
 
     def __enter__(self):
         self.connect()
@@ -71,57 +80,114 @@ class Client(object):
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
-    def get_llh(self, x):
+    def send(self, x):
+        """Send a request (free param values or a batch thereof)"""
         send_obj(x, self.sock)
-        llh = receive_obj(self.sock)
+
+    def receive(self):
+        """Receive the response to a request"""
+        return receive_obj(self.sock)
+
+    def get_llh(self, x):
+        self.send(x)
+        llh = self.receive()
         return llh
 
 
-def get_llh(x, server_infos):
+class ClientPool(object):
+    """Persistent connections to a set of `pisa.utils.llh_server`s, among
+    which batches of requests are distributed.
+
+    The connections are opened by `connect` and closed by `close`, or for the
+    duration of a `with` block. Each server serves one connected client at a
+    time, so other clients wait until the pool is closed.
+
+    Parameters
+    ----------
+    server_addresses : iterable
+        (host, port) tuple or UNIX socket path for each server
+
+    """
+    def __init__(self, server_addresses):
+        self.clients = [Client(addr) for addr in server_addresses]
+        if len(self.clients) == 0:
+            raise ValueError("No servers?")
+
+    def connect(self):
+        for client in self.clients:
+            client.connect()
+
+    def close(self):
+        for client in self.clients:
+            client.close()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_llhs(self, xs):
+        """Get the llh for each vector of free param values in `xs`.
+
+        The batch is split into (nearly) equal, contiguous chunks, one per
+        server; all chunks are sent before any result is received, such that
+        the servers evaluate them concurrently.
+
+        Parameters
+        ----------
+        xs : 2d array of shape (num_points, num_free_params)
+
+        Returns
+        -------
+        llhs : array of shape (num_points,)
+
+        """
+        xs = np.atleast_2d(xs)
+        busy_clients = []
+        for client, chunk in zip(self.clients, np.array_split(xs, len(self.clients))):
+            if len(chunk) > 0:
+                client.send(chunk)
+                busy_clients.append(client)
+        return np.concatenate([client.receive() for client in busy_clients])
+
+
+def get_llh(x, client_pool):
     """Get llh given free param values `x` (name chosen for compatibility with
-    EMCEE) from a `pisa.utils.llh_server` running somewhere, via TCP-based IPC.
+    EMCEE) from `pisa.utils.llh_server`s running somewhere, via TCP-based IPC.
 
     Parameters
     ----------
-    x : sequence
+    x : sequence or 2d array
         Free param values to set on the DistributionMaker, at which we wich to
-        find llh
+        find llh; or a batch thereof (one row per point)
 
-    server_infos : dict or iterable thereof
-        Each dict must have fields "host", "port", and "lock"
+    client_pool : ClientPool
+        Connected pool of clients
 
     Returns
     -------
-    llh
+    llh : float or array
+        One llh value per point if `x` is a batch
 
     """
-    if isinstance(server_infos, Mapping):
-        server_infos = [server_infos]
-
-    # Cycle through all servers/ports forever
-    for server_info in cycle(server_infos):
-        if "lock" in server_info:
-            if server_info["lock"].acquire(blocking=False):
-                try:
-                    with Client((server_info["host"], server_info["port"])) as client:
-                        llh = client.get_llh(x)
-                    print(server_info)
-                    return llh
-                finally:
-                    server_info["lock"].release()
-            else:
-                # don't hammer ports too hard (not sure about sleep time, though)
-                time.sleep(0.1)  # sec
-        else:
-            with Client((server_info["host"], server_info["port"])) as client:
-                llh = client.get_llh(x)
-            return llh
-
-    raise ValueError("No hosts?")
+    llhs = client_pool.get_llhs(x)
+    return llhs if np.ndim(x) == 2 else llhs[0]
 
 
 def setup_sampler(nwalkers, ndim, host_port_num, **kwargs):
-    """Setup/instantiate an `emcee.EnsembleSampler`.
+    """Setup/instantiate an `emcee.EnsembleSampler`, which evaluates the llh
+    for all walkers at once with a `ClientPool` connected to the servers.
+
+    The pool is returned unconnected; sample within its context, e.g. ::
+
+        sampler, client_pool = setup_sampler(nwalkers, ndim, host_port_num)
+        with client_pool:
+            sampler.run_mcmc(p0, nsteps)
+
+    Each server serves one connected client at a time, so while the pool is
+    connected, other clients of the same servers wait.
 
     Parameters
     ----------
@@ -130,8 +196,8 @@ def setup_sampler(nwalkers, ndim, host_port_num, **kwargs):
     nwalkers, ndim, *args, **kwargs
         Passed onto `emcee.EnsembleSampler`; note that fields
 
-            kwargs["threads"]
-            kwargs["kwargs"]["server_infos"]
+            kwargs["vectorize"]
+            kwargs["kwargs"]["client_pool"]
 
         are overwritten by values derived here (if any of these already exist
         in `kwargs`).
@@ -140,29 +206,33 @@ def setup_sampler(nwalkers, ndim, host_port_num, **kwargs):
     -------
     sampler : emcee.EnsembleSampler
 
+    client_pool : ClientPool
+        Unconnected pool used by `sampler`
+
     """
     host_port_num = tuple(host_port_num)
     if isinstance(host_port_num[0], str):
         host_port_num = (host_port_num,)
 
-    # Construct (lock, host, port) dict per port per host, each with a unique lock
-    manager = Manager()
-    server_infos = []
+    # Construct (host, port) address per port per host
+    server_addresses = []
     for hpn in host_port_num:
         host = str(hpn[0])
         port0 = int(hpn[1])
         num = int(hpn[2])
         for port in range(port0, port0 + num):
-            server_infos.append(dict(lock=manager.Lock(), host=host, port=port))
-    threads = len(server_infos)
+            server_addresses.append((host, port))
+
+    client_pool = ClientPool(server_addresses)
 
     sub_kwargs = kwargs.get("kwargs", {})
-    sub_kwargs["server_infos"] = server_infos
+    sub_kwargs["client_pool"] = client_pool
     kwargs["kwargs"] = sub_kwargs
+    kwargs["vectorize"] = True
 
-    sampler = emcee.EnsembleSampler(nwalkers, ndim, get_llh, threads=threads, **kwargs)
+    sampler = emcee.EnsembleSampler(nwalkers, ndim, get_llh, **kwargs)
 
-    return sampler
+    return sampler, client_pool
 
 
 def main(description=__doc__):
@@ -180,12 +250,13 @@ def main(description=__doc__):
     kwargs = vars(parser.parse_args())
     ndim = 3
     nwalkers = 100
-    sampler = setup_sampler(nwalkers=nwalkers, ndim=ndim, **kwargs)
+    sampler, client_pool = setup_sampler(nwalkers=nwalkers, ndim=ndim, **kwargs)
 
     rand = np.random.RandomState(0)
     p0 = rand.rand(ndim * nwalkers).reshape((nwalkers, ndim))
 
-    sampler.run_mcmc(p0, nwalkers)
+    with client_pool:
+        sampler.run_mcmc(p0, nwalkers)
 
 
 if  __name__ == "__main__":
@@ -6,6 +6,12 @@ values, server sets these on its DistributionMaker, generates outputs, and
 compares the resulting distributions against a reference template, returning
 the llh value.
 
+Connections are persistent, i.e. a client can send any number of requests over
+the same connection. A request can also be a batch of free param value
+vectors (e.g., the positions of a whole ensemble of MCMC walkers), for which a
+server returns the array of llh values. A server serves one connected client
+at a time; further clients wait until that client disconnects.
+
 Code adapted from Dan Krause
   https://gist.github.com/dankrause/9607475
 see `__license__`.
@@ -34,22 +40,28 @@ __all__ = [
     "DFLT_HOST",
     "DFLT_PORT",
     "DFLT_NUM_SERVERS",
+    "ConnectionClosed",
     "send_obj",
     "receive_obj",
     "serve",
     "fork_servers",
     "main",
+    "test_send_receive_obj",
 ]
 
 
 from argparse import ArgumentParser
 from multiprocessing import cpu_count, Process
 import pickle
+import socket
 import socketserver
 import struct
 
+import numpy as np
+
 from pisa.core.distribution_maker import DistributionMaker
 from pisa.core.map import MapSet
+from pisa.utils.log import logging
 
 
 DFLT_HOST = "localhost"
@@ -57,13 +69,17 @@ DFLT_PORT = "9000"
 DFLT_NUM_SERVERS = cpu_count()
 
 
+HEADER = struct.Struct('!Q')
+"""Header preceding each message, holding the number of bytes of the payload"""
+
+
 class ConnectionClosed(Exception):
     """Connection closed"""
 
 
 def send_obj(obj, sock):
     """Send a Python object over a socket. Object is pickle-encoded as the
-    payload and sent preceded by a 4-byte header which indicates the number of
+    payload and sent preceded by an 8-byte header which indicates the number of
     bytes of the payload.
 
     Parameters
@@ -73,22 +89,30 @@ def send_obj(obj, sock):
         Object to send
 
     """
-    # Turn object into a string
-    payload = pickle.dumps(obj)
+    # Turn object into bytes
+    payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
 
-    # Create a header that says how large the payload is
-    header = struct.pack('!i', len(payload))
+    # Send header (which says how large the payload is) and payload at once
+    sock.sendall(HEADER.pack(len(payload)) + payload)
 
-    # Send header
-    sock.sendall(header)
 
-    # Send payload
-    sock.sendall(payload)
+def _receive_exactly(sock, num_bytes):
+    """Receive exactly `num_bytes` from a socket, which may take several
+    `recv` calls for large messages"""
+    buf = bytearray(num_bytes)
+    view = memoryview(buf)
+    num_received = 0
+    while num_received < num_bytes:
+        n = sock.recv_into(view[num_received:], num_bytes - num_received)
+        if n == 0:
+            raise ConnectionClosed()
+        num_received += n
+    return buf
 
 
 def receive_obj(sock):
     """Receive an object from a socket. Payload is a pickle-encoded object, and
-    header (prefixing payload) is 4-byte int indicating length of the payload.
+    header (prefixing payload) is 8-byte int indicating length of the payload.
 
     Parameters
     ----------
@@ -99,17 +123,17 @@ def receive_obj(sock):
     obj
         Unpickled Python object
 
+    Raises
+    ------
+    ConnectionClosed
+        If the connection is closed by the other end
+
     """
-    # Get 4-byte header which tells how large the subsequent payload will be
-    header = sock.recv(4)
-    if len(header) == 0:
-        raise ConnectionClosed()
-    payload_size = struct.unpack('!i', header)[0]
+    # Get header which tells how large the subsequent payload will be
+    payload_size = HEADER.unpack(_receive_exactly(sock, HEADER.size))[0]
 
     # Receive the payload
-    payload = sock.recv(payload_size)
-    if len(payload) == 0:
-        raise ConnectionClosed()
+    payload = _receive_exactly(sock, payload_size)
 
     # Payload was pickled; unpickle to recreate original Python object
     obj = pickle.loads(payload)
@@ -120,6 +144,9 @@ def receive_obj(sock):
 def serve(config, ref, port=DFLT_PORT):
     """Instantiate PISA objects and run server for processing requests.
 
+    The server serves one connected client at a time, handling all of its
+    requests until it disconnects; clients connecting in the meantime wait.
+
     Parameters
     ----------
     config : str or iterable thereof
@@ -135,28 +162,38 @@ def serve(config, ref, port=DFLT_PORT):
     dist_maker = DistributionMaker(config)
     ref = MapSet.from_json(ref)
 
+    def get_llh(param_values):
+        dist_maker._set_rescaled_free_params(param_values)  # pylint: disable=protected-access
+        test_map = dist_maker.get_outputs(return_sum=True)[0]
+        return test_map.llh(
+            expected_values=ref,
+            binned=False,  # return sum over llh from all bins (not per-bin llh's)
+        )
+
     # Define server as a closure such that it captures the above-instantiated objects
     class MyTCPHandler(socketserver.BaseRequestHandler):
         """
         The request handler class for our server.
 
         It is instantiated once per connection to the server, and must override
-        the handle() method to implement communication to the client.
+        the handle() method to implement communication to the client. Requests
+        are handled until the client closes the connection.
 
         See socketserver.BaseRequestHandler for documentation of args.
         """
         def handle(self):
-            try:
-                param_values = receive_obj(self.request)
-            except ConnectionClosed:
-                return
-            dist_maker._set_rescaled_free_params(param_values)  # pylint: disable=protected-access
-            test_map = dist_maker.get_outputs(return_sum=True)[0]
-            llh = test_map.llh(
-                expected_values=ref,
-                binned=False,  # return sum over llh from all bins (not per-bin llh's)
-            )
-            send_obj(llh, self.request)
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            while True:
+                try:
+                    param_values = receive_obj(self.request)
+                except ConnectionClosed:
+                    return
+                if np.ndim(param_values) == 2:
+                    # batch of param value vectors
+                    llh = np.array([get_llh(x) for x in param_values])
+                else:
+                    llh = get_llh(param_values)
+                send_obj(llh, self.request)
 
     server = socketserver.TCPServer((DFLT_HOST, int(port)), MyTCPHandler)
     print("llh server started on {}:{}".format(DFLT_HOST, port))
@@ -221,5 +258,36 @@ def main(description=__doc__):
         fork_servers(num=num, **kwargs)
 
 
+def test_send_receive_obj():
+    """Unit test for the message framing of `send_obj` and `receive_obj`"""
+    sock_a, sock_b = socket.socketpair()
+    try:
+        # large enough to not fit in a single socket buffer
+        objs = [1.5, np.arange(10**6, dtype=np.float64), {'x': [1, 2, 3]}]
+        for obj in objs:
+            # send from a separate process, as a single thread would block
+            process = Process(target=send_obj, args=(obj, sock_a))
+            process.start()
+            received = receive_obj(sock_b)
+            process.join()
+            if isinstance(obj, np.ndarray):
+                assert np.array_equal(received, obj)
+            else:
+                assert received == obj
+
+        sock_a.close()
+        try:
+            receive_obj(sock_b)
+        except ConnectionClosed:
+            pass
+        else:
+            assert False
+    finally:
+        sock_a.close()
+        sock_b.close()
+
+    logging.info('<< PASS : test_send_receive_obj >>')
+
+
 if __name__ == "__main__":
     main()
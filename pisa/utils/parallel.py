@@ -0,0 +1,218 @@
+"""
+Utilities for distributing independent tasks over worker processes.
+"""
+
+import multiprocessing
+import os
+
+import numba
+
+from pisa import PISA_NUM_THREADS
+from pisa.utils.log import logging, set_verbosity
+
+__all__ = ['map_in_process_pool', 'ReplicaPool', 'test_replica_pool']
+
+__license__ = '''Copyright (c) 2014-2024, The IceCube Collaboration
+
+ Licensed under the Apache License, Version 2.0 (the "License");
+ you may not use this file except in compliance with the License.
+ You may obtain a copy of the License at
+
+   http://www.apache.org/licenses/LICENSE-2.0
+
+ Unless required by applicable law or agreed to in writing, software
+ distributed under the License is distributed on an "AS IS" BASIS,
+ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ See the License for the specific language governing permissions and
+ limitations under the License.'''
+
+
+_POOL_TASK = None
+"""Task executed by process-pool workers; inherited by the forked workers"""
+
+_IN_POOL_WORKER = False
+"""Whether the current process is a process-pool worker (disables nesting)"""
+
+
+def _pool_worker_init(num_threads):
+    """Limit the number of threads used by numba in a process-pool worker."""
+    global _IN_POOL_WORKER # pylint: disable=global-statement
+    _IN_POOL_WORKER = True
+    os.environ['PISA_NUM_THREADS'] = str(num_threads)
+    numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+
+
+def _pool_worker_run(task_arg):
+    return _POOL_TASK(task_arg)
+
+
+def map_in_process_pool(task, num_tasks, num_workers=None, num_threads=None):
+    """Evaluate `task(i)` for `i` in ``range(num_tasks)``, optionally spread
+    over a pool of forked worker processes, and yield the results in order.
+
+    The pool is started with the `fork` method, such that every worker holds a
+    replica of whatever objects (e.g. an already set up `DistributionMaker`) the
+    `task` closure refers to, without the need to pickle them or to run any
+    setup again. Only task indices are sent to the workers and only the return
+    values of `task` (e.g. `HypoFitResult` objects) are sent back, so these
+    must be picklable.
+    Since a worker may execute several tasks in a row, `task` must not depend
+    on the state left behind by a previous task, i.e., it should bring the
+    replica into a well-defined state first.
+
+    Parameters
+    ----------
+    task : callable
+        Takes the task index as its only argument.
+
+    num_tasks : int
+        Number of tasks.
+
+    num_workers : int or None
+        Number of worker processes. If None or <= 1, if there are fewer than
+        two tasks, or if called from within a pool worker, the tasks are run
+        sequentially in the current process.
+
+    num_threads : int or None
+        Number of threads each worker is allowed to use for numba-parallelized
+        code. Defaults to `PISA_NUM_THREADS`.
+
+    Yields
+    ------
+    Return value of `task` for each task index, in the order of the indices
+
+    """
+    global _POOL_TASK # pylint: disable=global-statement
+    if (num_workers is None or num_workers <= 1 or num_tasks < 2
+            or _IN_POOL_WORKER):
+        for task_idx in range(num_tasks):
+            yield task(task_idx)
+        return
+
+    if num_threads is None:
+        num_threads = PISA_NUM_THREADS
+    num_workers = min(num_workers, num_tasks)
+    logging.info(f"Distributing {num_tasks} tasks over {num_workers} worker "
+                 f"processes with {num_threads} thread(s) each")
+
+    ctx = multiprocessing.get_context('fork')
+    _POOL_TASK = task
+    try:
+        # workers are forked here, after which the global can be released
+        pool = ctx.Pool(num_workers, _pool_worker_init, (num_threads,))
+    finally:
+        _POOL_TASK = None
+    with pool:
+        # `imap` returns the results in order of submission, independent of
+        # which worker finished first
+        for result in pool.imap(_pool_worker_run, range(num_tasks), chunksize=1):
+            yield result
+
+
+class ReplicaPool(object):
+    """Pool of forked worker processes that evaluate the same `task` for many
+    arguments, across any number of `map` calls.
+
+    Like for `map_in_process_pool`, every worker holds a replica of the objects
+    `task` refers to as of the creation of the pool. However, the workers are
+    only forked once and then re-used until the pool is closed, which avoids
+    the start-up cost for tasks that are issued in many small batches, e.g.
+    the evaluations of an ensemble of MCMC walkers at every step.
+
+    Parameters
+    ----------
+    task : callable
+        Takes a single (picklable) argument and returns a picklable result.
+        As for `map_in_process_pool`, it must bring the replica into a
+        well-defined state first.
+
+    num_workers : int or None
+        Number of worker processes. If None or <= 1, or if created within a
+        pool worker, `task` is evaluated sequentially in the current process.
+
+    num_threads : int or None
+        Number of threads each worker is allowed to use for numba-parallelized
+        code. Defaults to `PISA_NUM_THREADS`.
+
+    """
+    def __init__(self, task, num_workers=None, num_threads=None):
+        global _POOL_TASK # pylint: disable=global-statement
+        self.task = task
+        self._pool = None
+        self.num_workers = 1
+        if num_workers is None or num_workers <= 1 or _IN_POOL_WORKER:
+            return
+
+        if num_threads is None:
+            num_threads = PISA_NUM_THREADS
+        logging.info(f"Starting {num_workers} replica worker processes with "
+                     f"{num_threads} thread(s) each")
+
+        ctx = multiprocessing.get_context('fork')
+        _POOL_TASK = task
+        try:
+            self._pool = ctx.Pool(num_workers, _pool_worker_init, (num_threads,))
+        finally:
+            _POOL_TASK = None
+        self.num_workers = num_workers
+
+    def map(self, task_args):
+        """Evaluate `task` for every element of `task_args`.
+
+        Returns
+        -------
+        results : list
+            Return value of `task` for each argument, in order
+
+        """
+        if self._pool is None:
+            return [self.task(task_arg) for task_arg in task_args]
+        return self._pool.map(_pool_worker_run, task_args, chunksize=1)
+
+    def close(self):
+        """Shut down the worker processes"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def test_replica_pool():
+    """Unit test for `ReplicaPool`"""
+    replica = {'offset': 10}
+
+    def task(x):
+        return x + replica['offset'], os.getpid()
+
+    for num_workers in (None, 2):
+        replica['offset'] = 10
+        with ReplicaPool(task, num_workers=num_workers) as pool:
+            # workers hold the replica as of the creation of the pool
+            replica['offset'] = 100
+            all_pids = []
+            for _ in range(2):
+                results = pool.map(range(6))
+                values = [value for value, _ in results]
+                all_pids.append({pid for _, pid in results})
+                if num_workers is None:
+                    assert values == list(range(100, 106))
+                    assert all_pids[-1] == {os.getpid()}
+                else:
+                    assert values == list(range(10, 16))
+                    assert os.getpid() not in all_pids[-1]
+            # ... and are re-used for every `map` call
+            assert len(set.union(*all_pids)) <= (num_workers or 1)
+        assert pool._pool is None # pylint: disable=protected-access
+
+    logging.info('<< PASS : test_replica_pool >>')
+
+
+if __name__ == '__main__':
+    set_verbosity(1)
+    test_replica_pool()
@@ -8,6 +8,7 @@ from __future__ import absolute_import, division
 import numpy as np
 
 from pisa.utils.log import logging, set_verbosity
+from pisa.utils.parallel import map_in_process_pool
 
 __all__ = []
 
@@ -86,7 +87,52 @@ def get_derivative_map(hypo_maps):
     return derivative_map
 
 
-def get_gradients(param, hypo_maker, test_vals):
+def get_templates(hypo_maker, param_values, num_workers=None):
+    """Generate the templates for a set of variations, each of a single
+    parameter w.r.t. the current (fiducial) parameter values.
+
+    The templates are independent of each other and are optionally generated
+    concurrently, by worker processes that each hold a replica of
+    `hypo_maker` (see `pisa.utils.parallel.map_in_process_pool`).
+
+    Parameters
+    ----------
+    hypo_maker : DistributionMaker
+    param_values : sequence of (str, value with units) tuples
+        Name and value of the varied parameter for each template
+    num_workers : None or int
+        Number of worker processes; sequential generation if None or <= 1
+
+    Returns
+    -------
+    templates : list
+        Resulting templates' 'total' nominal values, in the order of
+        `param_values`. Upon return, all varied parameters are back at their
+        fiducial values.
+
+    """
+    fiducial_values = {
+        pname: hypo_maker.params[pname].value for pname, _ in param_values
+    }
+
+    def reset():
+        for pname, value in fiducial_values.items():
+            hypo_maker.params[pname].value = value
+
+    def make_template(i):
+        pname, value = param_values[i]
+        reset()
+        hypo_maker.params[pname].value = value
+        return hypo_maker.get_outputs(return_sum=True).nominal_values['total']
+
+    templates = list(map_in_process_pool(
+        make_template, len(param_values), num_workers=num_workers
+    ))
+    reset()
+    return templates
+
+
+def get_gradients(param, hypo_maker, test_vals, num_workers=None):
     """Use the template maker to create all the templates needed
     to obtain the gradients in a given parameter.
 
@@ -99,6 +145,9 @@ def get_gradients(param, hypo_maker, test_vals):
         Needs to hold the parameter `param` in its `ParamSet`
     test_vals :  sequence with units
         Values of the parameter `param` to probe, i.e., generate templates for
+    num_workers : None or int
+        Number of worker processes generating the templates (see
+        `get_templates`)
 
     Returns
     -------
@@ -111,15 +160,14 @@ def get_gradients(param, hypo_maker, test_vals):
     """
     logging.trace("Working on parameter %s."%param)
 
-    pmaps = {}
-
     # generate one template for each value of the parameter in question
     # and store in pmaps
-    for param_value in test_vals:
-        hypo_maker.params[param].value = param_value
-        # make the template corresponding to the current value of the parameter
-        hypo_asimov_dist = hypo_maker.get_outputs(return_sum=True)
-        pmaps[param_value] = hypo_asimov_dist.nominal_values['total']
+    templates = get_templates(
+        hypo_maker=hypo_maker,
+        param_values=[(param, param_value) for param_value in test_vals],
+        num_workers=num_workers,
+    )
+    pmaps = dict(zip(test_vals, templates))
 
     gradient_map = get_derivative_map(
         hypo_maps=pmaps,
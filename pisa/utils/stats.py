@@ -5,8 +5,11 @@ Statistical functions
 
 from __future__ import absolute_import, division
 
+import math
+
+from numba import njit
 import numpy as np
-from scipy.special import gammaln
+from scipy.special import gammaln, xlogy
 from uncertainties import unumpy as unp
 
 from pisa import FTYPE
@@ -18,7 +21,9 @@ __all__ = ['SMALL_POS', 'CHI2_METRICS', 'LLH_METRICS', 'ALL_METRICS',
            'maperror_logmsg',
            'chi2', 'llh', 'log_poisson', 'log_smear', 'conv_poisson',
            'norm_conv_poisson', 'conv_llh', 'barlow_llh', 'mod_chi2', 'correct_chi2',
-           'mcllh_mean', 'mcllh_eff', 'signed_sqrt_mod_chi2', 'generalized_poisson_llh']
+           'mcllh_mean', 'mcllh_eff', 'signed_sqrt_mod_chi2', 'generalized_poisson_llh',
+           'FUSED_METRICS', 'metric_total', 'test_metric_total',
+           'test_generalized_poisson_llh', 'test_barlow_llh']
 
 __author__ = 'P. Eller, T. Ehrhardt, J.L. Lanfranchi, E. Bourbeau'
 
@@ -56,10 +61,42 @@ METRICS_TO_MAXIMIZE = LLH_METRICS
 METRICS_TO_MINIMIZE = CHI2_METRICS
 """Metrics that must be minimized to obtain a better fit"""
 
+FUSED_METRICS = ['chi2', 'llh', 'mcllh_mean', 'mcllh_eff', 'mod_chi2',
+                 'correct_chi2']
+"""Metrics whose sum over bins `metric_total` computes in a single compiled
+pass"""
+
 
 # TODO(philippeller):
 # * unit tests to ensure these don't break
 
+
+def _nominal_values(values):
+    """Nominal values of `values`, which can be an array (with or without
+    uncertainties) or a fast `pisa.core.map.Map`, whose values are read
+    without creating a uarray"""
+    if getattr(values, 'fast', False):
+        return values.nominal_values
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values
+    return unp.nominal_values(values)
+
+
+def _std_devs(values):
+    """Standard deviations of `values` (see `_nominal_values`)"""
+    if getattr(values, 'fast', False):
+        return values.std_devs
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return np.zeros_like(values, dtype=np.float64)
+    return unp.std_devs(values)
+
+
+def _variances(values):
+    """Variances of `values` (see `_nominal_values`)"""
+    if getattr(values, 'fast', False):
+        return values.variances
+    return np.square(_std_devs(values))
+
 def it_got_better(new_metric_val, old_metric_val, metric):
     """Compare metric values and report whether improvement found.
     """
@@ -128,9 +165,9 @@ def chi2(actual_values, expected_values):
 
     # Convert to simple numpy arrays containing floats
     if not isbarenumeric(actual_values):
-        actual_values = unp.nominal_values(actual_values)
+        actual_values = _nominal_values(actual_values)
     if not isbarenumeric(expected_values):
-        expected_values = unp.nominal_values(expected_values)
+        expected_values = _nominal_values(expected_values)
 
     with np.errstate(invalid='ignore'):
         # Mask off any nan expected values (these are assumed to be ok)
@@ -199,9 +236,9 @@ def llh(actual_values, expected_values):
 
     # Convert to simple numpy arrays containing floats
     if not isbarenumeric(actual_values):
-        actual_values = unp.nominal_values(actual_values)
+        actual_values = _nominal_values(actual_values)
     if not isbarenumeric(expected_values):
-        expected_values = unp.nominal_values(expected_values)
+        expected_values = _nominal_values(expected_values)
 
     with np.errstate(invalid='ignore'):
 
@@ -257,9 +294,9 @@ def mcllh_mean(actual_values, expected_values):
     assert actual_values.shape == expected_values.shape
 
     # Convert to simple numpy arrays containing floats
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
 
     with np.errstate(invalid='ignore'):
 
@@ -314,9 +351,9 @@ def mcllh_eff(actual_values, expected_values):
     assert actual_values.shape == expected_values.shape
 
     # Convert to simple numpy arrays containing floats
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
 
     with np.errstate(invalid='ignore'):
 
@@ -497,9 +534,9 @@ def conv_llh(actual_values, expected_values):
 
     """
     in_array_shape = np.shape(actual_values)
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
     triplets = np.array([actual_values, expected_values, sigma]).T
     norm_triplets = np.array([actual_values, actual_values, sigma]).T
     total = 0
@@ -528,9 +565,9 @@ def barlow_llh(actual_values, expected_values):
 
     """
 
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigmas = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigmas = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
 
     with np.errstate(invalid='ignore'):
         # Mask off any nan expected values (these are assumed to be ok)
@@ -561,8 +598,10 @@ def barlow_llh(actual_values, expected_values):
 
     # TODO(tahmid): Run checks in case expected_values and/or corresponding sigma == 0
     # and handle these appropriately. If sigma/ev == 0 the code below will fail.
-    unweighted = np.array([(ev/s)**2 for ev, s in zip(expected_values, sigmas)])
-    weights = np.array([s**2/ev for ev, s in zip(expected_values, sigmas)])
+    expected_values = np.ma.filled(expected_values, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unweighted = (expected_values / sigmas)**2
+        weights = sigmas**2 / expected_values
 
     llh_val = likelihood_functions.barlowLLH(actual_values, unweighted, weights)
     return llh_val
@@ -591,9 +630,9 @@ def mod_chi2(actual_values, expected_values):
     * `actual_values` = 0 are allowed (appear only in numerator)
     """
     in_array_shape = np.shape(actual_values)
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
 
     with np.errstate(invalid='ignore'):
 
@@ -636,12 +675,15 @@ def correct_chi2(actual_values, expected_values):
         the inputs
 
     """
-    # Replace 0's with small positive numbers to avoid inf in log
-    np.clip(expected_values, a_min=SMALL_POS, a_max=np.inf,
-            out=expected_values)
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
+    # Replace 0's with small positive numbers to avoid inf in log (without
+    # uncertainty, as clipping a uarray would do)
+    clip = expected_values < SMALL_POS
+    if np.any(clip):
+        expected_values = np.where(clip, SMALL_POS, expected_values)
+        sigma = np.where(clip, 0., sigma)
     total_variance = sigma**2 + expected_values
     m_chi2 = (
         (actual_values - expected_values)**2 / total_variance + np.log(total_variance)
@@ -667,9 +709,9 @@ def weighted_chi2(actual_values, expected_values, bin_unc2):
     np.clip(expected_values, a_min=SMALL_POS, a_max=np.inf, out=expected_values)
     np.clip(bin_unc2, a_min=SMALL_POS, a_max=np.inf, out=bin_unc2)
 
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
     bin_unc2 = unp.nominal_values(bin_unc2).ravel()
     total_variance = sigma**2 + bin_unc2
 
@@ -694,27 +736,269 @@ def signed_sqrt_mod_chi2(actual_values, expected_values):
         the inputs
 
     """
-    # Replace 0's with small positive numbers to avoid inf in log
-    np.clip(expected_values, a_min=SMALL_POS, a_max=np.inf,
-            out=expected_values)
-    actual_values = unp.nominal_values(actual_values).ravel()
-    sigma = unp.std_devs(expected_values).ravel()
-    expected_values = unp.nominal_values(expected_values).ravel()
+    actual_values = _nominal_values(actual_values).ravel()
+    sigma = _std_devs(expected_values).ravel()
+    expected_values = _nominal_values(expected_values).ravel()
+    # Replace 0's with small positive numbers to avoid inf in log (without
+    # uncertainty, as clipping a uarray would do)
+    clip = expected_values < SMALL_POS
+    if np.any(clip):
+        expected_values = np.where(clip, SMALL_POS, expected_values)
+        sigma = np.where(clip, 0., sigma)
     m_pull = (
         (actual_values - expected_values) / np.sqrt(sigma**2 + expected_values)
     )
     return m_pull
 
+
+#
+# Fused metric kernels: sum of a metric over all bins in a single pass,
+# without masked arrays or temporary copies. Each returns the total and a
+# status (0: ok, 1: invalid actual value, 2: invalid expected value); bins
+# masked off by the corresponding array functions above are skipped.
+#
+
+@njit
+def _chi2_total(actual, expected, variance, check): # pylint: disable=unused-argument
+    total = 0.
+    max_delta = 0.
+    for i in range(actual.size):
+        a, e = actual[i], expected[i]
+        a_ok, e_ok = math.isfinite(a), math.isfinite(e)
+        if check and a_ok and a < 0:
+            return np.nan, 1
+        if check and e_ok and e < 0:
+            return np.nan, 2
+        if not (a_ok and e_ok):
+            continue
+        e = max(e, SMALL_POS)
+        delta = a - e
+        max_delta = max(max_delta, abs(delta))
+        total += delta * delta / e
+    if max_delta < 5*FTYPE_PREC:
+        return 0., 0
+    return total, 0
+
+
+@njit
+def _llh_total(actual, expected, variance, check): # pylint: disable=unused-argument
+    total = 0.
+    for i in range(actual.size):
+        a, e = actual[i], expected[i]
+        a_ok, e_ok = math.isfinite(a), math.isfinite(e)
+        if check and a_ok and a < 0:
+            return np.nan, 1
+        if check and e_ok and e < 0:
+            return np.nan, 2
+        # `llh` masks bins with zero actual counts via the log
+        if not (a_ok and e_ok) or a == 0:
+            continue
+        e = max(e, SMALL_POS)
+        total += a*math.log(e) - e - (a*math.log(a) - a)
+    return total, 0
+
+
+@njit
+def _mcllh_total(actual, expected, variance, check, prior_a):
+    total = 0.
+    for i in range(actual.size):
+        a, e, v = actual[i], expected[i], variance[i]
+        a_ok, e_ok = math.isfinite(a), math.isfinite(e)
+        if check and a_ok and a < 0:
+            return np.nan, 1
+        if check and e_ok and e < 0:
+            return np.nan, 2
+        if not (a_ok and e_ok and math.isfinite(v)):
+            continue
+        e = max(e, SMALL_POS)
+        if v == 0:
+            # Poisson limit, cf. `likelihood_functions.poisson_gamma`
+            total += a*math.log(e) - e - math.lgamma(a + 1)
+            continue
+        alpha = e*e/v + prior_a
+        beta = e/v
+        total += (
+            alpha*math.log(beta) + math.lgamma(a + alpha) - math.lgamma(a + 1)
+            - (a + alpha)*math.log1p(beta) - math.lgamma(alpha)
+        )
+    return total, 0
+
+
+@njit
+def _mod_chi2_total(actual, expected, variance, check): # pylint: disable=unused-argument
+    total = 0.
+    for i in range(actual.size):
+        a, e, v = actual[i], expected[i], variance[i]
+        if not (math.isfinite(a) and math.isfinite(e) and math.isfinite(v)):
+            continue
+        e = max(e, SMALL_POS)
+        total += (a - e)**2 / (v + e)
+    return total, 0
+
+
+@njit
+def _correct_chi2_total(actual, expected, variance, check): # pylint: disable=unused-argument
+    total = 0.
+    for i in range(actual.size):
+        a, e, v = actual[i], expected[i], variance[i]
+        if e < SMALL_POS:
+            e, v = SMALL_POS, 0.
+        total_variance = v + e
+        total += (a - e)**2 / total_variance + math.log(total_variance)
+    return total, 0
+
+
+def _flat_float64(values):
+    """View (if possible) of `values` as contiguous 1D float64 array"""
+    return np.ascontiguousarray(values, dtype=np.float64).ravel()
+
+
+def metric_total(actual_values, expected_values, metric, validate=True):
+    """Compute the sum over all bins of one of the `FUSED_METRICS`.
+
+    This gives the same result as summing the output of the corresponding
+    bin-wise function (e.g. `llh`), but runs as a single compiled loop
+    without creating masked arrays or other temporaries. Validity checks on
+    the inputs are done within the same loop.
+
+    Parameters
+    ----------
+    actual_values, expected_values : numpy.ndarrays of same shape or fast Maps
+        Uncertainties of `expected_values` are used by the metrics that
+        account for them (see the corresponding bin-wise functions)
+
+    metric : str
+        One of `FUSED_METRICS`
+
+    validate : bool
+        Whether to raise a ValueError for negative values where the bin-wise
+        function would. Set to False e.g. to skip the checks on
+        `actual_values` that are known to be valid already.
+
+    Returns
+    -------
+    total : float
+
+    """
+    if metric not in FUSED_METRICS:
+        raise ValueError('`metric` "%s" not recognized; use one of %s.'
+                         % (metric, FUSED_METRICS))
+    if np.shape(actual_values) != np.shape(expected_values):
+        raise ValueError(
+            'Shape mismatch: actual_values.shape = %s,'
+            ' expected_values.shape = %s'
+            % (np.shape(actual_values), np.shape(expected_values))
+        )
+
+    actual = _flat_float64(_nominal_values(actual_values))
+    expected = _flat_float64(_nominal_values(expected_values))
+    if metric in ('chi2', 'llh'):
+        variance = expected # not used
+    else:
+        variance = _flat_float64(_variances(expected_values))
+
+    if metric == 'chi2':
+        total, status = _chi2_total(actual, expected, variance, validate)
+    elif metric == 'llh':
+        total, status = _llh_total(actual, expected, variance, validate)
+    elif metric == 'mcllh_mean':
+        total, status = _mcllh_total(actual, expected, variance, validate, 0.)
+    elif metric == 'mcllh_eff':
+        total, status = _mcllh_total(actual, expected, variance, validate, 1.)
+    elif metric == 'mod_chi2':
+        total, status = _mod_chi2_total(actual, expected, variance, validate)
+    else:
+        total, status = _correct_chi2_total(actual, expected, variance,
+                                            validate)
+
+    if status == 1:
+        raise ValueError('`actual_values` must all be >= 0...\n'
+                         + maperror_logmsg(actual))
+    if status == 2:
+        raise ValueError('`expected_values` must all be >= 0...\n'
+                         + maperror_logmsg(expected))
+    return total
+
 #
 # Generalized Poisson-gamma llh from 1902.08831
 #
+
+@njit
+def _generalized_pg_mixture_llh(counts, alphas, betas, out):
+    """Log of the generalized Poisson-gamma mixture (eq. 91 of 1902.08831,
+    cf. `llh_defs.poisson_gamma.c`) in each bin, given the data `counts`
+    and the (maps x bins) arrays of `alphas` and `betas`. Maps with
+    non-finite alpha or beta in a bin are left out for that bin."""
+    num_maps, num_bins = alphas.shape
+    max_count = 0
+    for i in range(num_bins):
+        max_count = max(max_count, counts[i])
+    deltas = np.empty(max_count + 1)
+    sum_terms = np.empty(max_count + 1)
+    bin_alphas = np.empty(num_maps)
+    ratios = np.empty(num_maps)
+    running = np.empty(num_maps)
+    # Probabilities below this are clipped, as in `llh_defs.poisson.fast_pgmix`
+    log_min_prob = math.log(1e-300)
+    log_rescale = math.log(1e250)
+
+    for i in range(num_bins):
+        k = counts[i]
+        log_prefac = 0.
+        n = 0
+        for j in range(num_maps):
+            alpha, beta = alphas[j, i], betas[j, i]
+            if not (math.isfinite(alpha) and math.isfinite(beta)):
+                continue
+            log_prefac -= alpha * math.log1p(1. / beta)
+            bin_alphas[n] = alpha
+            ratios[n] = 1. / (1. + beta)
+            running[n] = 1.
+            n += 1
+
+        # The recursion is linear in the deltas, so these can be rescaled
+        # whenever they would overflow (which the prefactor compensates for)
+        deltas[0] = 1.
+        log_scale = 0.
+        for m in range(1, k + 1):
+            sum_term = 0.
+            for j in range(n):
+                running[j] *= ratios[j]
+                sum_term += bin_alphas[j] * running[j]
+            sum_terms[m] = sum_term
+            delta = 0.
+            for l in range(1, m + 1):
+                delta += sum_terms[l] * deltas[m - l]
+            deltas[m] = delta / m
+            if deltas[m] > 1e250:
+                for l in range(m + 1):
+                    deltas[l] *= 1e-250
+                log_scale += log_rescale
+
+        if deltas[k] > 0:
+            out[i] = max(log_prefac + math.log(deltas[k]) + log_scale,
+                         log_min_prob)
+        else:
+            out[i] = log_min_prob
+
+
+def _stack_hists(mapset):
+    """Nominal values of the hists of all maps in `mapset`, as an array of
+    shape (number of maps, number of bins)"""
+    return np.stack([_flat_float64(_nominal_values(m.hist)) for m in mapset.maps])
+
+
 def generalized_poisson_llh(actual_values, expected_values=None, empty_bins=None):
     '''Compute the generalized Poisson likelihood as formulated in
     https://arxiv.org/abs/1902.08831
 
+    The inputs of all maps are stacked into (maps x bins) arrays once, and
+    the Poisson-gamma mixtures of all bins are evaluated in a single compiled
+    loop.
 
     Note that unlike the other likelihood functions, `expected_values`
-    is expected to be a distribution maker
+    is expected to be the per-dataset output of a distribution maker
+    (see `pisa.stages.likelihood.generalized_llh_params`)
 
     Parameters
     ----------
@@ -738,62 +1022,61 @@ def generalized_poisson_llh(actual_values, expected_values=None, empty_bins=None
     assert 'llh_alphas' in expected_values.keys(), 'ERROR: expected_values need a key named "llh_alphas"'
     assert 'llh_betas' in expected_values.keys(), 'ERROR: expected_values need a key named "llh_betas"'
 
-    num_bins = actual_values.flatten().shape[0]
+    # TODO: sometimes the histogram spits out uncertainty objects, sometimes not.
+    #       Not sure why.
+    actual_values = _nominal_values(actual_values).ravel()
+    num_bins = actual_values.shape[0]
+    data_counts = actual_values.astype(np.int64)
     llh_per_bin = np.zeros(num_bins)
-    actual_values = unp.nominal_values(actual_values).ravel()
-
-    # If no empty bins are specified, we assume that all of them should be included
-    if empty_bins is None:
-        empty_bins = []
-
-    for bin_i in range(num_bins):
 
-        # TODO: sometimes the histogram spits out uncertainty objects, sometimes not.
-        #       Not sure why.
-        data_count = actual_values.astype(np.int64)[bin_i]
+    weights = _stack_hists(expected_values['weights'])
+    n_mc_events = _stack_hists(expected_values['n_mc_events'])
+    alphas = _stack_hists(expected_values['llh_alphas'])
+    betas = _stack_hists(expected_values['llh_betas'])
+    for stacked in (n_mc_events, alphas, betas):
+        assert stacked.shape == weights.shape, 'ERROR: inconsistent maps'
+    assert weights.shape[1] == num_bins, 'ERROR: inconsistent number of bins'
 
-        # Automatically add a huge number if a bin has non zero data count
-        # but completely empty MC
-        if bin_i in empty_bins:
-            if data_count > 0:
-                llh_per_bin[bin_i] = np.log(SMALL_POS)
-            continue
+    # If no empty bins are specified, we assume that all of them should be included
+    empty = np.zeros(num_bins, dtype=bool)
+    if empty_bins is not None:
+        empty[np.asarray(empty_bins, dtype=np.int64)] = True
 
-        # Make sure that no weight sum is negative. Crash if there are
-        weight_sum = np.array([m.hist.flatten()[bin_i] for m in expected_values['weights'].maps])
-        if (weight_sum<0).sum()>0:
-            logging.debug('\n\n\n')
-            logging.debug('weights that are causing problem: ')
-            logging.debug(weight_sum[weight_sum<0])
-            logging.debug((weight_sum<0).sum())
-            logging.debug('\n\n\n')
-        assert np.all(weight_sum >= 0), 'ERROR: negative weights detected'
-
-        #
-        # If the number of MC events is high, compute a normal poisson probability
-        #
-        n_mc_events = np.array([m.hist.flatten()[bin_i] for m in expected_values['n_mc_events'].maps])
-        if np.all(n_mc_events>100):
-
-            logP = data_count*np.log(weight_sum.sum())-weight_sum.sum()-(data_count*np.log(data_count)-data_count)
-            llh_per_bin[bin_i] = logP
+    # Automatically add a huge number if a bin has non zero data count
+    # but completely empty MC
+    llh_per_bin[empty & (data_counts > 0)] = np.log(SMALL_POS)
 
-        else:
-            from pisa.utils.llh_defs.poisson import fast_pgmix
+    # Make sure that no weight sum is negative. Crash if there are
+    negative = (weights < 0) & ~empty
+    if np.any(negative):
+        logging.debug('weights that are causing problem: %s', weights[negative])
+        logging.debug(np.sum(negative))
+    assert not np.any(negative), 'ERROR: negative weights detected'
 
-            alphas = np.array([m.hist.flatten()[bin_i] for m in expected_values['llh_alphas'].maps])
-            betas  = np.array([m.hist.flatten()[bin_i] for m in expected_values['llh_betas'].maps])
-
-            # Remove the NaN's
-            mask = np.isfinite(alphas)*np.isfinite(betas)
+    #
+    # If the number of MC events is high, compute a normal poisson probability
+    #
+    high_stats = ~empty & np.all(n_mc_events > 100, axis=0)
+    weight_sum = np.sum(weights[:, high_stats], axis=0)
+    k = data_counts[high_stats]
+    llh_per_bin[high_stats] = (
+        xlogy(k, weight_sum) - weight_sum - (xlogy(k, k) - k)
+    )
 
-            # Check that the alpha and betas make sense
-            assert np.all(alphas[mask] > 0), 'ERROR: detected alpha values <=0'
-            assert np.all(betas[mask] > 0 ), 'ERROR: detected beta values <=0'
+    low_stats = np.flatnonzero(~empty & ~high_stats)
+    if low_stats.size > 0:
+        alphas = np.ascontiguousarray(alphas[:, low_stats])
+        betas = np.ascontiguousarray(betas[:, low_stats])
 
+        # Check that the alpha and betas make sense (NaN's are left out)
+        finite = np.isfinite(alphas) & np.isfinite(betas)
+        assert np.all(alphas[finite] > 0), 'ERROR: detected alpha values <=0'
+        assert np.all(betas[finite] > 0), 'ERROR: detected beta values <=0'
 
-            llh_of_bin = fast_pgmix(data_count, alphas[mask], betas[mask])
-            llh_per_bin[bin_i] = llh_of_bin
+        llh_low_stats = np.empty(low_stats.size)
+        _generalized_pg_mixture_llh(data_counts[low_stats], alphas, betas,
+                                    llh_low_stats)
+        llh_per_bin[low_stats] = llh_low_stats
 
     return llh_per_bin
 
@@ -862,3 +1145,169 @@ def approximate_poisson_normal_python(lamb, k, A, B):
     normal_poisson = norm.pdf(k, loc=lamb, scale=np.sqrt(lamb))
 
     return normal_term*normal_poisson
+
+
+def test_generalized_poisson_llh():
+    """Unit test for `generalized_poisson_llh`, comparing against the
+    convolution of the individual Poisson-gamma mixtures (i.e., negative
+    binomial distributions) of all maps"""
+    from collections import OrderedDict
+    from scipy.signal import fftconvolve
+    from pisa.core.binning import MultiDimBinning, OneDimBinning
+    from pisa.core.map import Map, MapSet
+
+    rand = np.random.RandomState(0)
+    num_maps, num_bins = 3, 40
+    binning = MultiDimBinning([
+        OneDimBinning(name='x', num_bins=num_bins, is_lin=True, domain=[0, 1])
+    ])
+    n_mc_events = rand.randint(1, 50, size=(num_maps, num_bins)).astype(float)
+    alphas = rand.uniform(0.5, 20, size=(num_maps, num_bins))
+    betas = rand.uniform(0.01, 2, size=(num_maps, num_bins))
+    weights = alphas / betas
+    actual_values = rand.poisson(np.sum(weights, axis=0)).astype(float)
+    # Large counts where the plain recursion would underflow
+    alphas[:, -1] *= 1e3
+    weights[:, -1] *= 1e3
+    actual_values[-1] = np.sum(weights[:, -1])
+    # Ignored map, empty bins and a bin with many MC events
+    alphas[0, 1] = np.nan
+    n_mc_events[:, 2] = 1000
+    empty_bins = [3, 4]
+    actual_values[3] = 0
+
+    def mapset(hists):
+        return MapSet([Map(name='map%d' % i, hist=h, binning=binning)
+                       for i, h in enumerate(hists)])
+    expected_values = OrderedDict([
+        ('weights', mapset(weights)),
+        ('llh_alphas', mapset(alphas)),
+        ('llh_betas', mapset(betas)),
+        ('n_mc_events', mapset(n_mc_events)),
+    ])
+
+    test = generalized_poisson_llh(actual_values, expected_values, empty_bins)
+
+    for i in range(num_bins):
+        k = int(actual_values[i])
+        if i in empty_bins:
+            assert test[i] == (np.log(SMALL_POS) if k > 0 else 0.)
+            continue
+        if i == 2:
+            mu = np.sum(weights[:, i])
+            assert np.isclose(test[i], k*np.log(mu) - mu - k*np.log(k) + k)
+            continue
+        counts = np.arange(k + 1)
+        pmf = np.ones(1)
+        for alpha, beta in zip(alphas[:, i], betas[:, i]):
+            if not np.isfinite(alpha):
+                continue
+            pmf = fftconvolve(pmf, np.exp(
+                gammaln(counts + alpha) - gammaln(counts + 1) - gammaln(alpha)
+                + alpha*np.log(beta) - (alpha + counts)*np.log1p(beta)
+            ))[:k + 1]
+        assert np.isclose(test[i], np.log(pmf[k]), rtol=1e-8), (i, test[i])
+
+    try:
+        weights[1, 5] = -1
+        expected_values['weights'] = mapset(weights)
+        generalized_poisson_llh(actual_values, expected_values, empty_bins)
+    except AssertionError:
+        pass
+    else:
+        raise Exception('negative weights should have raised')
+
+    logging.info('<< PASS : test_generalized_poisson_llh >>')
+
+
+def test_metric_total():
+    """Unit test for `metric_total`, comparing against the sums of the
+    bin-wise metric functions"""
+    from uncertainties import ufloat
+    rand = np.random.RandomState(0)
+    shape = (10, 8, 3)
+    actual_values = rand.poisson(5, size=shape).astype(np.float64)
+    expected_values = unp.uarray(
+        rand.uniform(0, 10, size=shape), rand.uniform(0, 2, size=shape)
+    )
+    # Include bins with zero expectation, zero uncertainty, and a masked bin
+    expected_values[5, 0, 0] = ufloat(0., 0.)
+    expected_values[6, 0, 0] = ufloat(3., 0.)
+    actual_values[6, 1, 0] = 0.
+    actual_values[2, 0, 0] = np.nan
+    expected_values[2, 0, 0] = ufloat(np.nan, np.nan)
+
+    for metric in FUSED_METRICS:
+        if metric in ('chi2', 'llh', 'mod_chi2'):
+            sel = np.s_[:]
+        else:
+            # The bin-wise functions do not handle masked bins correctly
+            sel = np.s_[3:]
+        ref = np.sum(globals()[metric](actual_values[sel],
+                                       expected_values[sel]))
+        test = metric_total(actual_values[sel], expected_values[sel], metric)
+        assert np.isclose(test, ref, rtol=1e-9, atol=0), (metric, test, ref)
+
+    assert metric_total(actual_values + 1, actual_values + 1, 'chi2') == 0
+
+    actual_values[3, 0, 0] = -1
+    for metric in ['chi2', 'llh', 'mcllh_mean', 'mcllh_eff']:
+        try:
+            metric_total(actual_values, expected_values, metric)
+        except ValueError:
+            pass
+        else:
+            raise Exception('negative actual values should have raised')
+        metric_total(actual_values, expected_values, metric, validate=False)
+
+    logging.info('<< PASS : test_metric_total >>')
+
+
+def test_barlow_llh():
+    """Unit test for `barlow_llh` and the underlying closed-form
+    `likelihood_functions.barlowLLH`, comparing against a numerical
+    maximisation of the Barlow LLH over the expected unweighted counts in
+    each bin"""
+    from scipy.optimize import minimize_scalar
+
+    rand = np.random.RandomState(0)
+    num_bins = 50
+    unweighted_mc = rand.randint(1, 200, size=num_bins).astype(float)
+    weights = rand.uniform(0.01, 5, size=num_bins)
+    actual_values = rand.poisson(unweighted_mc * weights).astype(float)
+    # Empty data and a single MC event
+    actual_values[0] = 0
+    unweighted_mc[1] = 1
+
+    def neg_llh(A, k, w, a):
+        return -(xlogy(k, w*A) - w*A + xlogy(a, A) - A
+                 - gammaln(k + 1) - gammaln(a + 1))
+
+    ref = np.empty(num_bins)
+    for i, (k, w, a) in enumerate(zip(actual_values, weights, unweighted_mc)):
+        result = minimize_scalar(
+            neg_llh, bounds=(1e-10, 10*(k + a) + 10), args=(k, w, a),
+            method='bounded', options=dict(xatol=1e-10)
+        )
+        assert result.success
+        ref[i] = -result.fun
+
+    test = likelihood_functions.barlowLLH(actual_values, unweighted_mc, weights)
+    assert np.allclose(test, ref, rtol=1e-8, atol=1e-8)
+    # The closed form is the exact maximum
+    assert np.all(test >= ref - 1e-10)
+
+    expected_values = unp.uarray(unweighted_mc * weights,
+                                 np.sqrt(unweighted_mc) * weights)
+    test = barlow_llh(actual_values, expected_values)
+    assert np.allclose(test, ref, rtol=1e-8, atol=1e-8)
+
+    logging.info('<< PASS : test_barlow_llh >>')
+
+
+if __name__ == '__main__':
+    from pisa.utils.log import set_verbosity
+    set_verbosity(1)
+    test_metric_total()
+    test_generalized_poisson_llh()
+    test_barlow_llh()